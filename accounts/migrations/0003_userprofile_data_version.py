@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_userprofile_avatar_emoji_userprofile_gender'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='data_version',
+            field=models.PositiveIntegerField(default=0, help_text="Bumped whenever the user's tracked data changes"),
+        ),
+    ]
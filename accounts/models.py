@@ -22,12 +22,24 @@ class UserProfile(models.Model):
         ('keto', 'Keto'),
         ('paleo', 'Paleo'),
     ], default='none')
+    data_version = models.PositiveIntegerField(default=0, help_text="Bumped whenever the user's tracked data changes")
+    data_changed_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.user.username}'s Profile"
 
+    def save(self, *args, **kwargs):
+        # The change-marker columns only move forward through bump_data_version(),
+        # so a profile loaded earlier in the request must not write stale copies back.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in ('data_version', 'data_changed_at')
+            ]
+        super().save(*args, **kwargs)
+
     def get_bmi(self):
         if self.height and self.weight:
             height_m = self.height / 100
@@ -2,8 +2,8 @@ from django.shortcuts import render, redirect
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.http import JsonResponse
 from django.views.decorators.http import require_POST
+from core.api import ApiResponse
 from .models import UserProfile
 import random
 import string
@@ -76,7 +76,7 @@ def register_view(request):
 def check_email_view(request):
     email = request.POST.get('email', '')
     exists = User.objects.filter(email=email).exists()
-    return JsonResponse({'exists': exists})
+    return ApiResponse({'exists': exists})
 
 def logout_view(request):
     logout(request)
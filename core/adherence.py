@@ -0,0 +1,136 @@
+"""Vectorised diet-plan adherence scoring.
+
+A day scores 100 when every targeted quantity is hit exactly and loses
+points in proportion to the relative miss, floored at 0 per quantity.
+Calories count for half the score when the user has an active DietPlan
+with macro targets, and for all of it when only
+UserProfile.daily_calorie_goal is known.
+"""
+from datetime import date, timedelta
+
+import numpy as np
+from django.db.models import Sum
+from django.utils import timezone
+
+from accounts.models import UserProfile
+from .caching import bump_data_versions
+from .models import AdherenceScore, DietPlan, MealLog
+
+NUTRIENTS = ('calories', 'protein', 'carbs', 'fats')
+CALORIE_WEIGHT = 0.5
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def targets_for(user_ids):
+    """{user_id: (calories, protein, carbs, fats)} from the newest active plan or the profile goal."""
+    targets = {
+        user_id: (float(goal), 0.0, 0.0, 0.0)
+        for user_id, goal in UserProfile.objects.filter(user_id__in=user_ids).values_list(
+            'user_id', 'daily_calorie_goal')
+    }
+    plans = DietPlan.objects.filter(user_id__in=user_ids, is_active=True).order_by('user_id', 'created_at')
+    for user_id, *values in plans.values_list('user_id', 'target_calories', 'target_protein',
+                                              'target_carbs', 'target_fats'):
+        targets[user_id] = tuple(float(v) for v in values)
+    return targets
+
+
+def nutrient_scores(actual, target):
+    """Per-row score in [0, 1] for one nutrient, NaN where there is no target."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        score = np.clip(1.0 - np.abs(actual - target) / target, 0.0, 1.0)
+    return np.where(target > 0, score, np.nan)
+
+
+def daily_scores(actual, targets):
+    """Score rows of (calories, protein, carbs, fats) against matching target rows, 0-100."""
+    per_nutrient = np.column_stack([nutrient_scores(actual[:, i], targets[:, i]) for i in range(len(NUTRIENTS))])
+    calories = np.nan_to_num(per_nutrient[:, 0])
+    macro_count = np.sum(~np.isnan(per_nutrient[:, 1:]), axis=1)
+    macro_mean = np.divide(
+        np.nansum(per_nutrient[:, 1:], axis=1), macro_count,
+        out=np.zeros(len(actual)), where=macro_count > 0,
+    )
+    score = np.where(macro_count > 0, CALORIE_WEIGHT * calories + (1 - CALORIE_WEIGHT) * macro_mean, calories)
+    return score * 100
+
+
+def score_range(first_user_id, last_user_id, start, end, batch_size=2000):
+    """Score every user in [first_user_id, last_user_id] for each day from start to end.
+
+    start should be a Monday so every weekly row sees its whole week.
+    Returns (daily_rows, weekly_rows) written.
+    """
+    totals = (
+        MealLog.objects
+        .filter(user_id__gte=first_user_id, user_id__lte=last_user_id, date__range=(start, end))
+        .values('user_id', 'date')
+        .annotate(**{name: Sum(name) for name in NUTRIENTS})
+        .order_by('user_id', 'date')
+        .values_list('user_id', 'date', *NUTRIENTS)
+    )
+    rows = list(totals.iterator(chunk_size=batch_size))
+    if not rows:
+        return 0, 0
+
+    user_ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    days = np.fromiter((r[1].toordinal() for r in rows), dtype=np.int64, count=len(rows))
+    actual = np.array([r[2:] for r in rows], dtype=float)
+
+    users, user_index = np.unique(user_ids, return_inverse=True)
+    by_user = targets_for(users.tolist())
+    user_targets = np.array([by_user.get(u, (0.0, 0.0, 0.0, 0.0)) for u in users.tolist()], dtype=float)
+    targets = user_targets[user_index]
+    scores = daily_scores(actual, targets)
+
+    # date.toordinal() is 1 for Monday 0001-01-01, so this is each row's Monday.
+    weeks = days - (days - 1) % 7
+    groups, group_index = np.unique(np.column_stack([user_ids, weeks]), axis=0, return_inverse=True)
+    group_index = group_index.ravel()
+    counts = np.bincount(group_index)
+    week_scores = np.bincount(group_index, weights=scores) / counts
+    week_means = np.column_stack([np.bincount(group_index, weights=actual[:, i]) / counts
+                                  for i in range(len(NUTRIENTS))])
+    week_targets = np.zeros(len(groups))
+    week_targets[group_index] = targets[:, 0]
+
+    daily = [
+        AdherenceScore(
+            user_id=int(u), period='day', start=date.fromordinal(int(d)), days_logged=1,
+            calories=round(a[0], 1), protein=round(a[1], 1), carbs=round(a[2], 1), fats=round(a[3], 1),
+            target_calories=t, score=round(float(s), 1),
+        )
+        for u, d, a, t, s in zip(user_ids.tolist(), days.tolist(), actual.tolist(), targets[:, 0].tolist(),
+                                 scores.tolist())
+    ]
+    weekly = [
+        AdherenceScore(
+            user_id=int(u), period='week', start=date.fromordinal(int(w)), days_logged=int(n),
+            calories=round(a[0], 1), protein=round(a[1], 1), carbs=round(a[2], 1), fats=round(a[3], 1),
+            target_calories=t, score=round(float(s), 1),
+        )
+        for (u, w), n, a, t, s in zip(groups.tolist(), counts.tolist(), week_means.tolist(),
+                                      week_targets.tolist(), week_scores.tolist())
+    ]
+
+    AdherenceScore.objects.bulk_create(
+        daily + weekly,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=['user', 'period', 'start'],
+        update_fields=['days_logged', *NUTRIENTS, 'target_calories', 'score', 'computed_at'],
+    )
+    bump_data_versions(users.tolist())
+    return len(daily), len(weekly)
+
+
+def latest_adherence(user):
+    """The newest daily and weekly rows for a user, in one query."""
+    latest = {}
+    recent = AdherenceScore.objects.filter(user=user, start__gte=timezone.localdate() - timedelta(days=14))
+    for row in recent.order_by('-start'):
+        latest.setdefault(row.period, row)
+    return latest
@@ -0,0 +1,78 @@
+"""Response encoding for the JSON API.
+
+ApiResponse is a drop-in JsonResponse that serializes with orjson.
+ApiResponseMiddleware then re-encodes it as MessagePack for clients whose
+Accept header prefers that, and gzip/brotli-compresses API bodies above
+API_COMPRESS_MIN_BYTES. The two encodings of a URL get distinct ETags
+(see core.caching.user_data_etag).
+"""
+import msgpack
+import orjson
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+JSON_TYPE = 'application/json'
+MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack')
+
+_encoder = DjangoJSONEncoder()
+_ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+def dumps_json(data):
+    # DjangoJSONEncoder covers what orjson has no native form for (Decimal, lazy strings).
+    return orjson.dumps(data, default=_encoder.default, option=_ORJSON_OPTIONS)
+
+
+def dumps_msgpack(data):
+    # Dates and times go out as the same ISO strings the JSON encoding uses.
+    return msgpack.packb(data, default=_encoder.default, use_bin_type=True)
+
+
+def media_quality(header, media_type):
+    """The q-value the Accept header gives media_type (0 when it is not acceptable)."""
+    major = media_type.split('/')[0]
+    best, specificity = 0.0, -1
+    for part in header.split(','):
+        value, *params = part.split(';')
+        value = value.strip().lower()
+        if value == media_type:
+            rank = 2
+        elif value == f'{major}/*':
+            rank = 1
+        elif value == '*/*':
+            rank = 0
+        else:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, number = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(number)
+                except ValueError:
+                    quality = 0.0
+        # The most specific matching range decides, as in RFC 9110.
+        if rank > specificity:
+            best, specificity = quality, rank
+    return best
+
+
+def wants_msgpack(request):
+    header = request.META.get('HTTP_ACCEPT', '')
+    if 'msgpack' not in header:
+        return False
+    quality = max(media_quality(header, media_type) for media_type in MSGPACK_TYPES)
+    return quality > 0 and quality > media_quality(header, JSON_TYPE)
+
+
+class ApiResponse(HttpResponse):
+    """JsonResponse with the fast encoder; keeps `data` so it can be re-encoded."""
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', JSON_TYPE)
+        self.data = data
+        super().__init__(content=dumps_json(data), **kwargs)
+
+    def render_msgpack(self):
+        self.content = dumps_msgpack(self.data)
+        self['Content-Type'] = MSGPACK_TYPES[0]
@@ -0,0 +1,120 @@
+"""Hot/cold tiering of MealLog history.
+
+Whole months older than MEAL_ARCHIVE_AFTER_DAYS are compacted into
+MealMonthlySummary rows and their raw meals moved to ArchivedMealLog (or
+dropped). Reads that can reach that far back merge both tiers: daily
+totals here, meal pages in core.history and lifetime counts in
+core.dashboard.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .caching import bump_data_versions
+from .db import delete_rows
+from .models import ArchivedMealLog, MealLog, MealMonthlySummary
+from .sync import record_changes
+
+NUTRIENTS = ('calories', 'protein', 'carbs', 'fats', 'fiber')
+ARCHIVED_FIELDS = [f.attname for f in ArchivedMealLog._meta.concrete_fields]
+
+
+def archive_cutoff(today=None):
+    """First day of the month containing today - MEAL_ARCHIVE_AFTER_DAYS.
+
+    Aligning to a month boundary means a month is archived in one go and
+    never gains new hot rows afterwards.
+    """
+    horizon = (today or timezone.localdate()) - timedelta(days=settings.MEAL_ARCHIVE_AFTER_DAYS)
+    return horizon.replace(day=1)
+
+
+def next_month(month):
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def pending_groups(cutoff):
+    """(user_id, month, meal count) for every hot user-month before cutoff."""
+    return (
+        MealLog.objects.filter(date__lt=cutoff)
+        .annotate(month=TruncMonth('date'))
+        .values_list('user_id', 'month')
+        .annotate(meals=Count('id'))
+        .order_by('user_id', 'month')
+    )
+
+
+def archive_groups(groups, discard_raw=False):
+    """Compact and move the given (user_id, month) groups in one short transaction.
+
+    Safe to repeat: rows leave MealLog in the same transaction that adds
+    them to the summaries, so an interrupted run just resumes.
+    """
+    match = Q()
+    for user_id, month in groups:
+        match |= Q(user_id=user_id, date__gte=month, date__lt=next_month(month))
+
+    with transaction.atomic():
+        rows = list(MealLog.objects.filter(match).order_by().values(*ARCHIVED_FIELDS))
+        if not rows:
+            return 0
+
+        totals = defaultdict(lambda: {'meals': 0, 'days': set(), **{name: 0.0 for name in NUTRIENTS}})
+        for row in rows:
+            total = totals[row['user_id'], row['date'].replace(day=1)]
+            total['meals'] += 1
+            total['days'].add(row['date'])
+            for name in NUTRIENTS:
+                total[name] += row[name]
+
+        existing = {
+            (s.user_id, s.month): s
+            for s in MealMonthlySummary.objects.filter(
+                user_id__in={user_id for user_id, _ in totals}, month__in={month for _, month in totals})
+        }
+        summaries = []
+        for (user_id, month), total in totals.items():
+            summary = existing.get((user_id, month)) or MealMonthlySummary(user_id=user_id, month=month)
+            summary.meals += total['meals']
+            summary.days_logged += len(total['days'])
+            for name in NUTRIENTS:
+                setattr(summary, name, round(getattr(summary, name) + total[name], 1))
+            summaries.append(summary)
+        MealMonthlySummary.objects.bulk_create(
+            summaries,
+            update_conflicts=True,
+            unique_fields=['user', 'month'],
+            update_fields=['meals', 'days_logged', *NUTRIENTS],
+        )
+
+        if not discard_raw:
+            ArchivedMealLog.objects.bulk_create([ArchivedMealLog(**row) for row in rows], ignore_conflicts=True)
+
+        delete_rows(MealLog, [row['id'] for row in rows])
+        if discard_raw:
+            # Archived meals keep their id and sync entry; dropped ones are gone.
+            record_changes('meal', [(row['user_id'], row['id']) for row in rows], deleted=True)
+        bump_data_versions({row['user_id'] for row in rows})
+    return len(rows)
+
+
+def daily_totals(user, start, end):
+    """{date: {nutrient: total}} for start..end inclusive, across both tiers."""
+    days = defaultdict(lambda: {name: 0.0 for name in NUTRIENTS})
+    sources = [MealLog]
+    if start < archive_cutoff():
+        sources.append(ArchivedMealLog)
+    for model in sources:
+        grouped = (
+            model.objects.filter(user=user, date__range=(start, end))
+            .values('date').annotate(**{name: Sum(name) for name in NUTRIENTS}).order_by()
+        )
+        for row in grouped:
+            for name in NUTRIENTS:
+                days[row['date']][name] += row[name] or 0
+    return days
@@ -0,0 +1,390 @@
+"""Cache backends: a shared SQLite L2 and a two-tier cache in front of it.
+
+SQLiteCache keeps entries in one SQLite file, so every worker process on
+the host shares them without running a cache server. TieredCache puts a
+small in-process LRU (L1) in front of any other configured cache (L2):
+
+- Keys are grouped into namespaces by their first ':' or '.' separated
+  segment ('vt:progress:...' is in 'vt'). Each namespace can set its own
+  timeout and a shorter L1 timeout.
+- invalidate(namespace) bumps a version stamp stored in L2. Every process
+  re-reads the stamps it uses at most every STAMP_INTERVAL seconds and
+  drops L1 entries written under an older stamp, so a namespace flush
+  reaches all workers within that interval. A plain set() or delete() in
+  one process is seen by the others once their L1 copy expires, which is
+  what the per-namespace L1 timeout bounds.
+- get_or_set() with a callable is single-flight: one thread per process
+  and, through an add()-based lease in L2, one process per host recomputes
+  an expired entry while the others wait for its result.
+- Hits in L1 and L2 and misses are counted per namespace in the metrics
+  registry (vitaltrack_cache_requests_total) and by stats().
+"""
+import pickle
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from .metrics import registry
+
+CACHE_REQUESTS = registry.counter(
+    'vitaltrack_cache_requests_total', 'Cache lookups by namespace and the tier that answered', ('namespace', 'result'))
+CACHE_RECOMPUTES = registry.counter(
+    'vitaltrack_cache_recomputes_total', 'Values computed by get_or_set after a miss', ('namespace',))
+CACHE_WAITS = registry.counter(
+    'vitaltrack_cache_singleflight_waits_total', "Misses answered by another process's recompute", ('namespace',))
+
+_MISSING = object()
+_NAMESPACE = re.compile(r'[:.]')
+
+
+class SQLiteCache(BaseCache):
+    """A cache table in its own SQLite file, shared by all local processes.
+
+    LOCATION is the file path. Each thread keeps one connection in WAL
+    mode; values are pickled. Expired rows are removed lazily and by a
+    periodic cull once the table grows past MAX_ENTRIES.
+    """
+
+    CULL_EVERY = 256
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.path = str(location)
+        self._local = threading.local()
+        self._sets = 0
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=20, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache_entries '
+                '(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL) WITHOUT ROWID'
+            )
+            self._local.conn = conn
+        return conn
+
+    def _expiry(self, timeout):
+        timeout = self.get_backend_timeout(timeout)
+        return None if timeout is None else time.time() + timeout
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            'SELECT value, expires FROM cache_entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return default
+        if row[1] is not None and row[1] <= time.time():
+            self._connection().execute('DELETE FROM cache_entries WHERE key = ? AND expires <= ?', (key, time.time()))
+            return default
+        return pickle.loads(zlib.decompress(row[0]))
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._connection().execute(
+            'INSERT OR REPLACE INTO cache_entries (key, value, expires) VALUES (?, ?, ?)',
+            (key, zlib.compress(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)), self._expiry(timeout)),
+        )
+        self._sets += 1
+        if self._sets % self.CULL_EVERY == 0:
+            self._cull()
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        """Store value only if key is absent or expired; True when stored."""
+        key = self.make_and_validate_key(key, version=version)
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM cache_entries WHERE key = ? AND expires <= ?', (key, time.time()))
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO cache_entries (key, value, expires) VALUES (?, ?, ?)',
+                (key, zlib.compress(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)), self._expiry(timeout)),
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        """Atomic across processes, unlike BaseCache.incr."""
+        made_key = self.make_and_validate_key(key, version=version)
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            value = self.get(key, _MISSING, version=version)
+            if value is _MISSING:
+                raise ValueError(f"Key '{made_key}' not found")
+            value += delta
+            conn.execute(
+                'UPDATE cache_entries SET value = ? WHERE key = ?',
+                (zlib.compress(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)), made_key),
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return value
+
+    def update(self, key, func, timeout=DEFAULT_TIMEOUT, version=None):
+        """Atomically store func(current value, or None) and return the new value."""
+        made_key = self.make_and_validate_key(key, version=version)
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            value = func(self.get(key, version=version))
+            conn.execute(
+                'INSERT OR REPLACE INTO cache_entries (key, value, expires) VALUES (?, ?, ?)',
+                (made_key, zlib.compress(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)), self._expiry(timeout)),
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return value
+
+    def delete_if(self, key, value, version=None):
+        """Atomically delete key only while it still holds value; True when deleted."""
+        made_key = self.make_and_validate_key(key, version=version)
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            deleted = self.get(key, _MISSING, version=version) == value
+            if deleted:
+                conn.execute('DELETE FROM cache_entries WHERE key = ?', (made_key,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return deleted
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute(
+            'UPDATE cache_entries SET expires = ? WHERE key = ?', (self._expiry(timeout), key))
+        return cursor.rowcount == 1
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._connection().execute('DELETE FROM cache_entries WHERE key = ?', (key,)).rowcount == 1
+
+    def has_key(self, key, version=None):
+        return self.get(key, _MISSING, version=version) is not _MISSING
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache_entries')
+
+    def _cull(self):
+        conn = self._connection()
+        conn.execute('DELETE FROM cache_entries WHERE expires <= ?', (time.time(),))
+        count = conn.execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0]
+        if count > self._max_entries:
+            # Drop the entries closest to expiry first, 1/CULL_FREQUENCY of them.
+            conn.execute(
+                'DELETE FROM cache_entries WHERE key IN '
+                '(SELECT key FROM cache_entries ORDER BY expires IS NULL, expires LIMIT ?)',
+                (count // self._cull_frequency if self._cull_frequency else count,),
+            )
+
+
+class TieredCache(BaseCache):
+    """Bounded in-process LRU (L1) in front of a shared cache alias (L2).
+
+    OPTIONS:
+        L2: alias of the shared cache in CACHES (default 'shared').
+        L1_MAX_ENTRIES: L1 size before least recently used entries go (1000).
+        L1_TIMEOUT: longest an entry lives in L1, in seconds (60).
+        NAMESPACES: {namespace: {'timeout': s, 'l1_timeout': s}} overrides.
+        STAMP_INTERVAL: seconds between version stamp checks against L2 (1).
+        LOCK_TIMEOUT: longest a single-flight lease is honoured (10).
+    """
+
+    LOCK_STRIPES = 64
+    WAIT_POLL = 0.025
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.l2_alias = options.get('L2', 'shared')
+        self.l1_max_entries = int(options.get('L1_MAX_ENTRIES', 1000))
+        self.l1_timeout = float(options.get('L1_TIMEOUT', 60))
+        self.namespaces = options.get('NAMESPACES', {})
+        self.stamp_interval = float(options.get('STAMP_INTERVAL', 1))
+        self.lock_timeout = float(options.get('LOCK_TIMEOUT', 10))
+        self._l1 = OrderedDict()
+        self._lock = threading.Lock()
+        self._stamps = {}
+        self._flight_locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+
+    @property
+    def l2(self):
+        return caches[self.l2_alias]
+
+    @staticmethod
+    def namespace(key):
+        return _NAMESPACE.split(key, 1)[0]
+
+    def _timeouts(self, namespace, timeout):
+        config = self.namespaces.get(namespace, {})
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = config.get('timeout', self.default_timeout)
+        l1_timeout = config.get('l1_timeout', self.l1_timeout)
+        if timeout is not None:
+            l1_timeout = min(l1_timeout, timeout)
+        return timeout, l1_timeout
+
+    def _stamp(self, namespace):
+        """The namespace's current version stamp, re-read from L2 at most every STAMP_INTERVAL."""
+        now = time.monotonic()
+        cached = self._stamps.get(namespace)
+        if cached is not None and now - cached[1] < self.stamp_interval:
+            return cached[0]
+        stamp = self.l2.get(f'__stamp__:{namespace}', 0)
+        self._stamps[namespace] = (stamp, now)
+        return stamp
+
+    def invalidate(self, namespace):
+        """Make every entry in namespace unreachable, in this and every other process."""
+        key = f'__stamp__:{namespace}'
+        if not self.l2.add(key, 1, None):
+            self.l2.incr(key)
+        self._stamps.pop(namespace, None)
+        with self._lock:
+            prefix = self.make_key(namespace)
+            for made_key in [k for k in self._l1 if k.startswith(prefix)]:
+                del self._l1[made_key]
+
+    def _l1_get(self, made_key, stamp):
+        with self._lock:
+            entry = self._l1.get(made_key)
+            if entry is None:
+                return _MISSING
+            value, expires, entry_stamp = entry
+            if expires <= time.monotonic() or entry_stamp != stamp:
+                del self._l1[made_key]
+                return _MISSING
+            self._l1.move_to_end(made_key)
+            return value
+
+    def _l1_set(self, made_key, value, l1_timeout, stamp):
+        if l1_timeout <= 0:
+            return
+        with self._lock:
+            self._l1[made_key] = (value, time.monotonic() + l1_timeout, stamp)
+            self._l1.move_to_end(made_key)
+            while len(self._l1) > self.l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_delete(self, made_key):
+        with self._lock:
+            self._l1.pop(made_key, None)
+
+    def get(self, key, default=None, version=None):
+        made_key = self.make_and_validate_key(key, version=version)
+        namespace = self.namespace(key)
+        stamp = self._stamp(namespace)
+        value = self._l1_get(made_key, stamp)
+        if value is not _MISSING:
+            CACHE_REQUESTS.inc(namespace, 'l1')
+            return value
+        entry = self.l2.get(key, _MISSING, version=version)
+        if entry is _MISSING or entry[0] != stamp:
+            CACHE_REQUESTS.inc(namespace, 'miss')
+            return default
+        CACHE_REQUESTS.inc(namespace, 'l2')
+        self._l1_set(made_key, entry[1], self._timeouts(namespace, DEFAULT_TIMEOUT)[1], stamp)
+        return entry[1]
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        made_key = self.make_and_validate_key(key, version=version)
+        namespace = self.namespace(key)
+        timeout, l1_timeout = self._timeouts(namespace, timeout)
+        stamp = self._stamp(namespace)
+        self.l2.set(key, (stamp, value), timeout, version=version)
+        self._l1_set(made_key, value, l1_timeout, stamp)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if self.get(key, _MISSING, version=version) is not _MISSING:
+            return False
+        namespace = self.namespace(key)
+        timeout, l1_timeout = self._timeouts(namespace, timeout)
+        stamp = self._stamp(namespace)
+        # An entry left over from an older stamp counts as absent.
+        self.l2.delete(key, version=version)
+        if not self.l2.add(key, (stamp, value), timeout, version=version):
+            return False
+        self._l1_set(self.make_and_validate_key(key, version=version), value, l1_timeout, stamp)
+        return True
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        """Single-flight get_or_set. None is cached like any other result; to
+        skip caching a result, raise from default instead."""
+        value = self.get(key, _MISSING, version=version)
+        if value is not _MISSING:
+            return value
+        if not callable(default):
+            self.add(key, default, timeout, version=version)
+            return self.get(key, default, version=version)
+
+        made_key = self.make_and_validate_key(key, version=version)
+        namespace = self.namespace(key)
+        with self._flight_locks[hash(made_key) % self.LOCK_STRIPES]:
+            # Another thread may have filled it while this one waited.
+            value = self.get(key, _MISSING, version=version)
+            if value is not _MISSING:
+                return value
+            lease_key = f'__lease__:{key}'
+            leased = self.l2.add(lease_key, 1, self.lock_timeout, version=version)
+            if not leased:
+                deadline = time.monotonic() + self.lock_timeout
+                while time.monotonic() < deadline and self.l2.has_key(lease_key, version=version):
+                    time.sleep(self.WAIT_POLL)
+                    value = self.get(key, _MISSING, version=version)
+                    if value is not _MISSING:
+                        CACHE_WAITS.inc(namespace)
+                        return value
+            try:
+                CACHE_RECOMPUTES.inc(namespace)
+                value = default()
+                self.set(key, value, timeout, version=version)
+                return value
+            finally:
+                if leased:
+                    self.l2.delete(lease_key, version=version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeouts(self.namespace(key), timeout)[0]
+        return self.l2.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self._l1_delete(self.make_and_validate_key(key, version=version))
+        return self.l2.delete(key, version=version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, _MISSING, version=version) is not _MISSING
+
+    def clear(self):
+        with self._lock:
+            self._l1.clear()
+        self._stamps.clear()
+        self.l2.clear()
+
+    def stats(self):
+        """{namespace: {'l1': n, 'l2': n, 'miss': n, 'hit_ratio': r}} for this process."""
+        stats = {}
+        for (namespace, result), count in CACHE_REQUESTS.snapshot().items():
+            stats.setdefault(namespace, {'l1': 0, 'l2': 0, 'miss': 0})[result] = count
+        for counts in stats.values():
+            total = counts['l1'] + counts['l2'] + counts['miss']
+            counts['hit_ratio'] = round((counts['l1'] + counts['l2']) / total, 3) if total else 0
+        return stats
@@ -0,0 +1,80 @@
+from datetime import datetime, time, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from accounts.models import UserProfile
+from .api import wants_msgpack
+
+DASHBOARD_CACHE_TIMEOUT = getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 600)
+
+
+def bump_data_version(user_id):
+    """Invalidate every cached page and fragment for a user in one UPDATE."""
+    bump_data_versions([user_id])
+
+
+def bump_data_versions(user_ids):
+    UserProfile.objects.filter(user_id__in=user_ids).update(
+        data_version=F('data_version') + 1,
+        data_changed_at=timezone.now(),
+    )
+
+
+def user_cache_key(profile, name, *parts):
+    bits = ['vt', name, str(profile.user_id), str(profile.data_version)]
+    bits.extend(str(part) for part in parts)
+    return ':'.join(bits)
+
+
+def cached_user_data(profile, name, builder, *parts):
+    """Return builder() for this user, reusing it until their data version changes.
+
+    The key includes profile.data_version, so a bump makes older entries
+    unreachable and they simply age out of the cache. With the tiered
+    cache, concurrent misses for one key run builder() only once.
+    """
+    return cache.get_or_set(user_cache_key(profile, name, *parts), builder, DASHBOARD_CACHE_TIMEOUT)
+
+
+def invalidate_namespace(namespace):
+    """Drop every cached entry whose key starts with namespace, in all workers."""
+    invalidate = getattr(cache, 'invalidate', None)
+    if invalidate is not None:
+        invalidate(namespace)
+    else:
+        cache.clear()
+
+
+def user_change_marker(request):
+    """(data_version, data_changed_at) for request.user, fetched once per request.
+
+    This is the only query conditional GETs need, so an unchanged client can
+    be answered with a 304 before any aggregate runs.
+    """
+    if not hasattr(request, '_user_change_marker'):
+        request._user_change_marker = UserProfile.objects.filter(user=request.user).values_list(
+            'data_version', 'data_changed_at'
+        ).first()
+    return request._user_change_marker
+
+
+def user_data_etag(request, *args, **kwargs):
+    marker = user_change_marker(request)
+    if marker is None:
+        return None
+    today = datetime.now().date()
+    # JSON and MessagePack bodies of one URL differ, so their ETags must too.
+    encoding = '-msgpack' if wants_msgpack(request) else ''
+    return f'"{request.user.pk}-{marker[0]}-{today.isoformat()}{encoding}"'
+
+
+def user_data_last_modified(request, *args, **kwargs):
+    marker = user_change_marker(request)
+    if marker is None or marker[1] is None:
+        return None
+    # Day-scoped payloads change at midnight even when no row does.
+    midnight = datetime.combine(datetime.now().date(), time.min).astimezone(dt_timezone.utc)
+    return max(marker[1], midnight)
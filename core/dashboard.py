@@ -0,0 +1,79 @@
+"""The dashboard bundle: everything the dashboard shows, in one payload.
+
+build_bundle() answers with three queries: one grouped aggregate for the
+7-day series (today's totals are its last day), the latest weights, and
+one row holding both lifetime counts. Archived months count through their
+MealMonthlySummary rows, which survive even when the raw meals were
+discarded. Callers cache it per user and data
+version, so a warm dashboard costs only the profile lookup.
+"""
+from datetime import timedelta
+
+from django.db.models import Count, IntegerField, Subquery, Sum
+
+from accounts.models import UserProfile
+from .archive import daily_totals
+from .models import MealLog, MealMonthlySummary, QuizResult, WeightLog
+
+QUOTES = [
+    {"quote": "Take care of your body. It's the only place you have to live.", "author": "Jim Rohn"},
+    {"quote": "The groundwork for all happiness is good health.", "author": "Leigh Hunt"},
+    {"quote": "Health is not about the weight you lose, but about the life you gain.", "author": "Josh Axe"},
+    {"quote": "Your body hears everything your mind says.", "author": "Naomi Judd"},
+    {"quote": "A healthy outside starts from the inside.", "author": "Robert Urich"},
+]
+WEEK_DAYS = 7
+RECENT_WEIGHTS = 10
+MACROS = ('calories', 'protein', 'carbs', 'fats')
+
+
+def quote_of_the_day(day):
+    # Fixed for the day, so the bundle stays cacheable and ETags stay honest.
+    return QUOTES[day.toordinal() % len(QUOTES)]
+
+
+def _count(model, user_id, aggregate=Count('id')):
+    return Subquery(
+        model.objects.filter(user_id=user_id).order_by().values('user_id')
+        .annotate(n=aggregate).values('n'),
+        output_field=IntegerField(),
+    )
+
+
+def lifetime_counts(profile):
+    """(meals_logged, quizzes_completed) in one query, archived meals included."""
+    meals, archived, quizzes = UserProfile.objects.filter(pk=profile.pk).annotate(
+        meals=_count(MealLog, profile.user_id),
+        archived=_count(MealMonthlySummary, profile.user_id, Sum('meals')),
+        quizzes=_count(QuizResult, profile.user_id),
+    ).values_list('meals', 'archived', 'quizzes').get()
+    return (meals or 0) + (archived or 0), quizzes or 0
+
+
+def build_bundle(user, profile, today):
+    start = today - timedelta(days=WEEK_DAYS - 1)
+    totals = daily_totals(user, start, today)
+    week = []
+    for offset in range(WEEK_DAYS):
+        day = start + timedelta(days=offset)
+        week.append({
+            'date': day.isoformat(),
+            'day': day.strftime('%a'),
+            'calories': round(totals[day]['calories'], 1),
+        })
+
+    today_totals = {name: round(totals[today][name], 1) for name in MACROS}
+    goal = profile.daily_calorie_goal
+    weights = list(WeightLog.objects.filter(user=user).order_by('-date').values_list('date', 'weight')[:RECENT_WEIGHTS])
+    meals_logged, quizzes_completed = lifetime_counts(profile)
+
+    return {
+        'date': today.isoformat(),
+        'today': today_totals,
+        'calorie_goal': goal,
+        'calorie_percentage': min(100, round(today_totals['calories'] / goal * 100)) if goal > 0 else 0,
+        'week': week,
+        'weights': [{'date': day.isoformat(), 'weight': weight} for day, weight in reversed(weights)],
+        'counts': {'meals_logged': meals_logged, 'quizzes_completed': quizzes_completed},
+        'quote': quote_of_the_day(today),
+    }
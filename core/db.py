@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+def delete_rows(model, pks):
+    """DELETE model rows by primary key without the ORM's per-row signals.
+
+    For batch jobs (core.archive, core.purge) that move or remove many rows
+    at once. The post_delete handlers would bump each owner's data version
+    row by row and release stored files before the batch commits, or while
+    an archived copy still uses them; callers do that bookkeeping once per
+    batch instead.
+    """
+    if not pks:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)} '
+            f'WHERE {connection.ops.quote_name(model._meta.pk.column)} IN ({", ".join(["%s"] * len(pks))})',
+            pks,
+        )
+
+
+def apply_sqlite_pragmas(cursor, pragmas):
+    for name, value in pragmas.items():
+        cursor.execute(f'PRAGMA {name}={value}')
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """Apply SQLITE_PRAGMAS to every new SQLite connection.
+
+    With CONN_MAX_AGE set this runs once per worker thread rather than once
+    per request, so the pragmas cost nothing on the hot path.
+    """
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', None)
+    if connection.vendor != 'sqlite' or not pragmas:
+        return
+    with connection.cursor() as cursor:
+        apply_sqlite_pragmas(cursor, pragmas)
@@ -0,0 +1,117 @@
+"""Per-user recent & frequent foods index behind quick-add.
+
+Ranking uses forward decay: a log at time t contributes 2 ** ((t - EPOCH)
+/ half_life), so at any later moment the ratio between two foods' sums is
+exactly the ratio of their exponentially decayed counts. Storing the sum
+in log2 space keeps it small, an update is one logaddexp2, and ranking is
+a plain ORDER BY rank on an index.
+"""
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import ArchivedMealLog, FrequentFood, MealLog
+
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+HALF_LIFE_DAYS = getattr(settings, 'FREQUENT_FOOD_HALF_LIFE_DAYS', 14)
+NUTRITION_FIELDS = ('calories', 'protein', 'carbs', 'fats', 'fiber', 'serving_size')
+
+
+def name_key(food_name):
+    return ' '.join((food_name or '').lower().split())[:200]
+
+
+def log_weight(when):
+    """log2 of one log's forward-decayed weight."""
+    return (when - EPOCH).total_seconds() / (HALF_LIFE_DAYS * 86400)
+
+
+def add_rank(rank, when, first=False):
+    weight = log_weight(when)
+    if first:
+        return weight
+    high, low = max(rank, weight), min(rank, weight)
+    return high + math.log2(1 + 2 ** (low - high))
+
+
+def record_meals(meals):
+    """Fold newly saved MealLog rows into their users' FrequentFood entries."""
+    meals = sorted((m for m in meals if name_key(m.food_name)), key=lambda m: m.logged_at)
+    if not meals:
+        return
+    keys = {(m.user_id, name_key(m.food_name)) for m in meals}
+    with transaction.atomic():
+        existing = {
+            (f.user_id, f.name_key): f
+            for f in FrequentFood.objects.filter(
+                user_id__in={user_id for user_id, _ in keys}, name_key__in={key for _, key in keys})
+        }
+        touched = {}
+        for meal in meals:
+            key = (meal.user_id, name_key(meal.food_name))
+            food = touched.get(key) or existing.get(key)
+            if food is None:
+                food = FrequentFood(user_id=meal.user_id, name_key=key[1])
+            food.rank = add_rank(food.rank, meal.logged_at, first=not food.times_logged)
+            food.times_logged += 1
+            food.food_name = meal.food_name
+            food.meal_type = meal.meal_type
+            food.last_logged_at = meal.logged_at
+            for field in NUTRITION_FIELDS:
+                setattr(food, field, getattr(meal, field))
+            touched[key] = food
+        FrequentFood.objects.bulk_create(
+            list(touched.values()),
+            update_conflicts=True,
+            unique_fields=['user', 'name_key'],
+            update_fields=['food_name', 'meal_type', *NUTRITION_FIELDS, 'times_logged', 'rank', 'last_logged_at'],
+        )
+
+
+def forget_meals(meals):
+    """Rebuild the FrequentFood entries of deleted meals from the logs that remain.
+
+    A forward-decayed sum cannot shed one log exactly once the newest log
+    dominates it, and the entry should fall back to the previous log's
+    values, so each touched entry is recomputed from the user's remaining
+    logs of that food in both tiers, or deleted when there are none. The
+    post_delete handlers call this inside the deleting transaction.
+    """
+    keys = {(m.user_id, name_key(m.food_name)) for m in meals if name_key(m.food_name)}
+    for user_id, key in keys:
+        # icontains narrows the scan; name_key() decides the match.
+        word = max(key.split(), key=len)
+        hot, archived = (
+            model.objects.filter(user_id=user_id, food_name__icontains=word)
+            .values('food_name', 'meal_type', 'logged_at', *NUTRITION_FIELDS).order_by()
+            for model in (MealLog, ArchivedMealLog)
+        )
+        logs = sorted((row for row in hot.union(archived, all=True) if name_key(row['food_name']) == key),
+                      key=lambda row: row['logged_at'])
+        entry = FrequentFood.objects.filter(user_id=user_id, name_key=key)
+        if not logs:
+            entry.delete()
+            continue
+        rank = log_weight(logs[0]['logged_at'])
+        for row in logs[1:]:
+            rank = add_rank(rank, row['logged_at'])
+        latest = logs[-1]
+        entry.update(
+            rank=rank,
+            times_logged=len(logs),
+            food_name=latest['food_name'],
+            meal_type=latest['meal_type'],
+            last_logged_at=latest['logged_at'],
+            **{field: latest[field] for field in NUTRITION_FIELDS},
+        )
+
+
+def top_foods(user, limit=8):
+    return list(FrequentFood.objects.filter(user=user).order_by('-rank')[:limit])
+
+
+def lookup(user, food_name):
+    """The user's last known entry for this food name, or None."""
+    return FrequentFood.objects.filter(user=user, name_key=name_key(food_name)).first()
@@ -0,0 +1,86 @@
+"""Keyset pagination over a user's meal history.
+
+Pages are ordered newest first by (logged_at, id) and continue from an
+opaque cursor holding the last row's pair, so every page is an index
+range scan no matter how deep the user has scrolled. Archived meals are
+all older than hot ones, so a page that runs off the end of MealLog
+carries on into ArchivedMealLog with the same cursor.
+"""
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+from django.utils.dateparse import parse_date
+
+from .models import ArchivedMealLog, MealLog
+
+PAGE_FIELDS = ('id', 'logged_at', 'meal_type', 'food_name', 'serving_size', 'calories', 'protein', 'carbs', 'fats')
+API_FIELDS = PAGE_FIELDS + ('fiber', 'date')
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+class InvalidQuery(ValueError):
+    pass
+
+
+def encode_cursor(row):
+    raw = f"{row['logged_at'].isoformat()}|{row['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        logged_at, pk = raw.split('|')
+        return datetime.fromisoformat(logged_at), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidQuery('Invalid cursor.')
+
+
+def parse_filters(params):
+    """meal_type, date_from, date_to and q (food name) from a QueryDict."""
+    filters = {}
+    meal_type = params.get('meal_type', '')
+    if meal_type:
+        if meal_type not in dict(MealLog.MEAL_TYPES):
+            raise InvalidQuery(f'Unknown meal type {meal_type!r}.')
+        filters['meal_type'] = meal_type
+    for name, lookup in (('date_from', 'date__gte'), ('date_to', 'date__lte')):
+        value = params.get(name, '')
+        if value:
+            try:
+                parsed = parse_date(value)
+            except ValueError:
+                parsed = None
+            if parsed is None:
+                raise InvalidQuery(f'{name} must be YYYY-MM-DD.')
+            filters[lookup] = parsed
+    q = params.get('q', '').strip()
+    if q:
+        filters['food_name__icontains'] = q
+    return filters
+
+
+def meal_page(user, filters, cursor=None, limit=DEFAULT_LIMIT, fields=PAGE_FIELDS):
+    """(rows, next_cursor) for one page; next_cursor is None on the last page."""
+    after = Q()
+    if cursor:
+        logged_at, pk = decode_cursor(cursor)
+        after = Q(logged_at__lt=logged_at) | Q(logged_at=logged_at, id__lt=pk)
+
+    rows = []
+    for model in (MealLog, ArchivedMealLog):
+        wanted = limit + 1 - len(rows)
+        rows.extend(
+            model.objects.filter(after, user=user, **filters)
+            .order_by('-logged_at', '-id')
+            .values(*fields)[:wanted]
+        )
+        if len(rows) > limit:
+            break
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.archive import archive_cutoff, archive_groups, pending_groups
+
+# Keeps the OR-ed (user, month) filter well inside SQLite's expression limits.
+MAX_GROUPS_PER_BATCH = 200
+
+
+class Command(BaseCommand):
+    help = 'Compact meals older than MEAL_ARCHIVE_AFTER_DAYS into monthly summaries and move them out of MealLog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Approximate meals per transaction (whole user-months are never split)')
+        parser.add_argument('--pause-ms', type=int, default=50,
+                            help='Sleep between batches so web writers can take the write lock')
+        parser.add_argument('--discard-raw', action='store_true',
+                            help='Keep only the monthly summaries instead of moving rows to ArchivedMealLog')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be archived')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        cutoff = archive_cutoff()
+        groups = list(pending_groups(cutoff))
+        pending = sum(meals for _, _, meals in groups)
+        if options['dry_run'] or not groups:
+            self.stdout.write(f'{pending} meals in {len(groups)} user-months before {cutoff} to archive.')
+            return
+
+        started = time.perf_counter()
+        archived = batches = 0
+        batch, batch_meals = [], 0
+        for user_id, month, meals in groups:
+            batch.append((user_id, month))
+            batch_meals += meals
+            if batch_meals >= options['batch_size'] or len(batch) >= MAX_GROUPS_PER_BATCH:
+                archived += archive_groups(batch, discard_raw=options['discard_raw'])
+                batches += 1
+                batch, batch_meals = [], 0
+                time.sleep(options['pause_ms'] / 1000)
+        if batch:
+            archived += archive_groups(batch, discard_raw=options['discard_raw'])
+            batches += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {archived} meals from {len(groups)} user-months before {cutoff} '
+            f'in {batches} batches ({time.perf_counter() - started:.1f}s).'
+        ))
@@ -0,0 +1,178 @@
+import logging
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+import requests
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core import throttle
+
+CSRF_TOKEN = 'b' * 32
+
+
+class PooledWSGIServer(WSGIServer):
+    """Handle connections on a fixed pool of threads, like a few sync workers.
+
+    Accepted connections queue for a free thread exactly as they would for
+    a free gunicorn worker, which is what lets one user starve the others.
+    """
+
+    workers = 4
+
+    def server_activate(self):
+        super().server_activate()
+        self.pool = ThreadPoolExecutor(self.workers, thread_name_prefix='bench-worker')
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            connections.close_all()
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=True)
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = ("Saturate analyze_food from one user and measure other users' page latency, "
+            'with and without admission control')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', default='fake_00001', help='User hammering analyze_food')
+        parser.add_argument('--other-user', default='fake_00002', help='User browsing the other pages')
+        parser.add_argument('--pages', nargs='*', default=['dashboard_home', 'progress', 'diet_plan', 'nutrition_data'])
+        parser.add_argument('--workers', type=int, default=4, help='Server threads (sync workers)')
+        parser.add_argument('--clients', type=int, default=8, help='Concurrent analyze_food clients')
+        parser.add_argument('--provider-ms', type=int, default=2000, help='Simulated provider latency')
+        parser.add_argument('--duration', type=float, default=5.0, help='Seconds per run')
+
+    def handle(self, *args, **options):
+        try:
+            attacker = User.objects.get(username=options['user'])
+            other = User.objects.get(username=options['other_user'])
+        except User.DoesNotExist:
+            raise CommandError('Benchmark users not found; run generate_fake_data first.')
+
+        self.stdout.write(
+            f"{options['clients']} clients on analyze_food ({options['provider_ms']}ms provider), "
+            f"{options['workers']} workers, {options['duration']}s per run\n"
+        )
+        self.stdout.write(
+            f"{'admission':<11}{'pages p50':>11}{'pages p95':>11}{'pages':>7}"
+            f"{'analyze ok':>12}{'429s':>7}{'429 p95':>10}"
+        )
+        # Every admitted analyze_food is slow on purpose; don't log each one.
+        logging.getLogger('vitaltrack.slow_requests').disabled = True
+        for enabled in (False, True):
+            throttle.reset('analyze_food', attacker.pk)
+            limits = settings.ADMISSION_CONTROL if enabled else {}
+            with override_settings(ADMISSION_CONTROL=limits):
+                result = self.run(attacker, other, options)
+            self.stdout.write(
+                f"{'on' if enabled else 'off':<11}"
+                f"{result['page_p50'] * 1000:>9.1f}ms{result['page_p95'] * 1000:>9.1f}ms{result['pages']:>7}"
+                f"{result['analyze_ok']:>12}{result['rejected']:>7}{result['rejected_p95'] * 1000:>8.1f}ms"
+            )
+        throttle.reset('analyze_food', attacker.pk)
+
+    def session_cookies(self, user):
+        client = Client()
+        client.force_login(user)
+        return {
+            settings.SESSION_COOKIE_NAME: client.cookies[settings.SESSION_COOKIE_NAME].value,
+            settings.CSRF_COOKIE_NAME: CSRF_TOKEN,
+        }
+
+    def run(self, attacker, other, options):
+        delay = options['provider_ms'] / 1000
+
+        def slow_provider(food_name):
+            time.sleep(delay)
+            return None
+
+        PooledWSGIServer.workers = options['workers']
+        server = make_server('127.0.0.1', 0, WSGIHandler(), server_class=PooledWSGIServer, handler_class=QuietHandler)
+        base = f'http://127.0.0.1:{server.server_port}'
+        serving = threading.Thread(target=server.serve_forever, daemon=True)
+        stop = threading.Event()
+        page_latencies, analyze_ok, rejected = [], [], []
+
+        def hammer(index):
+            session = requests.Session()
+            session.cookies.update(self.session_cookies(attacker))
+            count = 0
+            while not stop.is_set():
+                count += 1
+                started = time.perf_counter()
+                response = session.post(f"{base}{reverse('analyze_food')}",
+                                        data={'food_name': f'load test {index}-{count}'},
+                                        headers={'X-CSRFToken': CSRF_TOKEN}, timeout=120)
+                elapsed = time.perf_counter() - started
+                (rejected if response.status_code == 429 else analyze_ok).append(elapsed)
+                if response.status_code == 429:
+                    # A polite client would honour Retry-After; a hostile one retries at once.
+                    time.sleep(0.05)
+
+        def browse():
+            session = requests.Session()
+            session.cookies.update(self.session_cookies(other))
+            urls = [f'{base}{reverse(name)}' for name in options['pages']]
+            while not stop.is_set():
+                for url in urls:
+                    started = time.perf_counter()
+                    session.get(url, timeout=120).raise_for_status()
+                    page_latencies.append(time.perf_counter() - started)
+
+        with mock.patch('core.views._fetch_nutrition', slow_provider):
+            serving.start()
+            threads = [threading.Thread(target=hammer, args=(i,)) for i in range(options['clients'])]
+            for thread in threads:
+                thread.start()
+            # Let the attack fill the workers before measuring anyone else.
+            time.sleep(min(delay, options['duration'] / 2))
+            browser = threading.Thread(target=browse)
+            browser.start()
+            time.sleep(options['duration'])
+            stop.set()
+            for thread in [browser, *threads]:
+                thread.join()
+            server.shutdown()
+            server.server_close()
+
+        return {
+            'page_p50': statistics.median(page_latencies) if page_latencies else 0.0,
+            'page_p95': _percentile(page_latencies, 95),
+            'pages': len(page_latencies),
+            'analyze_ok': len(analyze_ok),
+            'rejected': len(rejected),
+            'rejected_p95': _percentile(rejected, 95),
+        }
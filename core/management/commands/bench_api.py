@@ -0,0 +1,88 @@
+import gzip
+import json
+import time
+from unittest import mock
+
+import brotli
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core import api
+from core import urls as core_urls
+from core.management.commands.bench_views import SCENARIOS, _offline_provider, _post_data, quiet_provider_warnings
+
+
+def _stdlib_json(data):
+    return json.dumps(data, cls=DjangoJSONEncoder).encode()
+
+
+def _time_per_call(encode, data, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        encode(data)
+    return (time.perf_counter() - started) / iterations
+
+
+class Command(BaseCommand):
+    help = ('Serialize every API response with stdlib json, orjson and MessagePack, and report '
+            'encode time and bytes on the wire with gzip/brotli')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', default='fake_00001', help='Username whose data the endpoints return')
+        parser.add_argument('--iterations', type=int, default=200, help='Encodes timed per endpoint and encoder')
+        parser.add_argument('--only', nargs='*', help='Benchmark only these URL names')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']!r} not found; run generate_fake_data first.")
+
+        encoders = {'json': _stdlib_json, 'orjson': api.dumps_json, 'msgpack': api.dumps_msgpack}
+
+        payloads = self.collect(user, options)
+        self.stdout.write(
+            f"{'endpoint':<18}" + ''.join(f'{name + " µs":>12}' for name in encoders)
+            + f"{'json B':>9}{'gzip B':>9}{'br B':>9}{'msgpack B':>11}"
+        )
+        for name, data in payloads.items():
+            timings = {encoder: _time_per_call(encode, data, options['iterations']) for encoder, encode in encoders.items()}
+            body = api.dumps_json(data)
+            gzipped = len(gzip.compress(body, compresslevel=settings.API_GZIP_LEVEL, mtime=0))
+            brotlied = len(brotli.compress(body, quality=settings.API_BROTLI_QUALITY))
+            packed = len(api.dumps_msgpack(data))
+            # Bodies under the threshold go out as they are.
+            if len(body) < settings.API_COMPRESS_MIN_BYTES:
+                gzipped = brotlied = len(body)
+            self.stdout.write(
+                f'{name:<18}' + ''.join(f'{timings[encoder] * 1e6:>12.1f}' for encoder in encoders)
+                + f'{len(body):>9}{gzipped:>9}{brotlied:>9}{packed:>11}'
+            )
+
+    def collect(self, user, options):
+        """The data each API endpoint returns for this user, from one request apiece."""
+        names = [p.name for p in core_urls.urlpatterns if p.name]
+        if options['only']:
+            names = [name for name in names if name in options['only']]
+        payloads = {}
+        with transaction.atomic(), mock.patch('core.views.call_provider', _offline_provider), \
+                override_settings(ADMISSION_CONTROL={}, RECOGNITION_PROVIDERS={}), quiet_provider_warnings():
+            user.is_staff = True
+            user.save(update_fields=['is_staff'])
+            client = Client()
+            client.force_login(user)
+            for name in names:
+                method, kwarg_resolvers, data = SCENARIOS[name]
+                with transaction.atomic():
+                    url = reverse(name, kwargs={key: resolve(user) for key, resolve in kwarg_resolvers.items()})
+                    response = client.post(url, _post_data(user, data)) if method == 'POST' else client.get(url)
+                    transaction.set_rollback(True)
+                if hasattr(response, 'data'):
+                    payloads[name] = response.data
+            transaction.set_rollback(True)
+        return payloads
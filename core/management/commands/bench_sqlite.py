@@ -0,0 +1,153 @@
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+def _setup_django(db_path, tuned):
+    """Point this spawned process's default database at db_path, then set Django up.
+
+    The untuned profile is Django's stock SQLite setup: no pragmas, a 5 s
+    timeout, deferred transactions and a new connection per request.
+    """
+    import django
+
+    database = settings.DATABASES['default']
+    database['NAME'] = db_path
+    if tuned:
+        settings.SQLITE_PRAGMAS = settings.SQLITE_PERFORMANCE_PRAGMAS
+        database.update(CONN_MAX_AGE=600, CONN_HEALTH_CHECKS=True,
+                        OPTIONS={'timeout': 20, 'transaction_mode': 'IMMEDIATE'})
+    else:
+        settings.SQLITE_PRAGMAS = {}
+        database.update(CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=False, OPTIONS={})
+    django.setup()
+
+
+def _prepare(db_path, rows, users):
+    """Migrate and seed db_path with the untuned profile, leaving it in rollback-journal mode."""
+    _setup_django(db_path, tuned=False)
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.utils import timezone
+
+    from accounts.models import UserProfile
+    from core.models import MealLog
+
+    call_command('migrate', verbosity=0)
+    people = User.objects.bulk_create([User(username=f'bench_{i:04d}') for i in range(users)])
+    UserProfile.objects.bulk_create([UserProfile(user=user) for user in people])
+    rng = random.Random(0)
+    today = timezone.localdate()
+    meals = MealLog.objects.bulk_create(
+        [MealLog(user=rng.choice(people), meal_type='lunch', food_name='Seed', calories=rng.uniform(50, 800))
+         for _ in range(rows)], batch_size=500)
+    # auto_now_add stamps every row with today; spread them over two months.
+    for meal in meals:
+        meal.date = today - timedelta(days=rng.randint(0, 60))
+    MealLog.objects.bulk_update(meals, ['date'], batch_size=500)
+    return [user.pk for user in people]
+
+
+def _worker(db_path, role, tuned, start_at, duration, user_ids):
+    """Run reads or writes through the ORM until the deadline, like one Django worker thread."""
+    _setup_django(db_path, tuned)
+    from django.db import OperationalError, close_old_connections, transaction
+    from django.db.models import Sum
+    from django.utils import timezone
+
+    from core.models import MealLog
+
+    rng = random.Random(os.getpid())
+    time.sleep(max(0, start_at - time.time()))
+    deadline = start_at + duration
+    ops, errors, latencies = 0, 0, []
+    while time.time() < deadline:
+        started = time.perf_counter()
+        try:
+            user_id = rng.choice(user_ids)
+            if role == 'write':
+                # The view's write path, signals included.
+                with transaction.atomic():
+                    MealLog.objects.create(user_id=user_id, meal_type='snack', food_name='Benchmark meal',
+                                           calories=rng.uniform(50, 800))
+            else:
+                MealLog.objects.filter(
+                    user_id=user_id, date__gte=timezone.localdate() - timedelta(days=7)
+                ).aggregate(Sum('calories'))
+            ops += 1
+            latencies.append(time.perf_counter() - started)
+        except OperationalError:
+            errors += 1
+        finally:
+            # The request_finished handler: closes the connection unless CONN_MAX_AGE keeps it.
+            close_old_connections()
+    return role, ops, errors, latencies
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = ('Measure concurrent read/write throughput through the ORM with Django\'s stock SQLite '
+            'setup and with the performance profile (core.db.configure_sqlite)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--duration', type=float, default=5.0, help='Seconds per run')
+        parser.add_argument('--rows', type=int, default=20000, help='Meals seeded before each run')
+        parser.add_argument('--users', type=int, default=200)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{options['readers']} readers, {options['writers']} writers, {options['duration']}s per run\n"
+        )
+        self.stdout.write(f"{'profile':<10}{'reads/s':>10}{'writes/s':>10}{'p95 read':>12}{'p95 write':>12}{'errors':>8}")
+        # Spawned workers each set Django up afresh against the scratch database.
+        ctx = multiprocessing.get_context('spawn')
+        with tempfile.TemporaryDirectory() as tmp:
+            seed_path = os.path.join(tmp, 'seed.sqlite3')
+            with ctx.Pool(1) as pool:
+                user_ids = pool.apply(_prepare, (seed_path, options['rows'], options['users']))
+            for tuned in (False, True):
+                db_path = os.path.join(tmp, f"{'tuned' if tuned else 'default'}.sqlite3")
+                shutil.copyfile(seed_path, db_path)
+                result = self.run(ctx, db_path, tuned, user_ids, options)
+                self.stdout.write(
+                    f"{'tuned' if tuned else 'default':<10}"
+                    f"{result['read_ops'] / options['duration']:>10.0f}"
+                    f"{result['write_ops'] / options['duration']:>10.0f}"
+                    f"{result['read_p95'] * 1000:>10.2f}ms"
+                    f"{result['write_p95'] * 1000:>10.2f}ms"
+                    f"{result['errors']:>8}"
+                )
+
+    def run(self, ctx, db_path, tuned, user_ids, options):
+        roles = ['read'] * options['readers'] + ['write'] * options['writers']
+        # Give spawned workers time to import and set Django up before the shared start.
+        start_at = time.time() + 3
+        with ctx.Pool(len(roles)) as pool:
+            results = pool.starmap(_worker, [
+                (db_path, role, tuned, start_at, options['duration'], user_ids) for role in roles
+            ])
+
+        summary = {'read_ops': 0, 'write_ops': 0, 'errors': 0}
+        latencies = {'read': [], 'write': []}
+        for role, ops, errors, role_latencies in results:
+            summary[f'{role}_ops'] += ops
+            summary['errors'] += errors
+            latencies[role].extend(role_latencies)
+        summary['read_p95'] = _percentile(latencies['read'], 95)
+        summary['write_p95'] = _percentile(latencies['write'], 95)
+        return summary
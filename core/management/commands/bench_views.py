@@ -0,0 +1,273 @@
+import contextlib
+import json
+import logging
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+from unittest import mock
+
+import requests
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import urls as core_urls
+from core.models import FrequentFood, MealLog, Quiz
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'views_baseline.json'
+# p95 differences smaller than this are scheduler noise, not regressions.
+LATENCY_FLOOR_MS = 2.0
+
+
+def _new_meal(user):
+    return MealLog.objects.create(user=user, meal_type='snack', food_name='Benchmark Meal', calories=100).id
+
+
+def _top_food(user):
+    return FrequentFood.objects.filter(user=user).order_by('-rank').values_list('id', flat=True).first()
+
+
+def _weight_export(user):
+    rows = '\n'.join(f'2020-01-{day:02d},{70 + day / 10:.1f}' for day in range(1, 31))
+    return SimpleUploadedFile('scale.csv', f'date,weight\n{rows}\n'.encode(), content_type='text/csv')
+
+
+def _first_quiz(user):
+    return Quiz.objects.values_list('id', flat=True).first()
+
+
+# url name -> (method, {kwarg: resolver(user)}, POST data, whose callable
+# values are resolved per request like kwargs). Every pattern in
+# core/urls.py needs an entry; the runner refuses to start if one is missing.
+SCENARIOS = {
+    'landing': ('GET', {}, None),
+    'dashboard': ('GET', {}, None),
+    'home': ('GET', {}, None),
+    'dashboard_home': ('GET', {}, None),
+    'quiz_list': ('GET', {}, None),
+    'quiz_detail': ('GET', {'quiz_id': _first_quiz}, None),
+    'quiz_submit': ('POST', {'quiz_id': _first_quiz}, {}),
+    'progress': ('GET', {}, None),
+    'ai_cam': ('GET', {}, None),
+    'analyze_food': ('POST', {}, {'food_name': 'banana'}),
+    'diet_plan': ('GET', {}, None),
+    'log_meal': ('POST', {}, {'food_name': 'Apple', 'calories': '95', 'meal_type': 'snack'}),
+    'quick_add': ('POST', {'food_id': _top_food}, {}),
+    'delete_meal': ('POST', {'meal_id': _new_meal}, {}),
+    'meal_history': ('GET', {}, None),
+    'settings': ('GET', {}, None),
+    # A wrong password: the real path would log the benchmark client out.
+    'delete_account': ('POST', {}, {'password': 'not-the-password'}),
+    'log_weight': ('POST', {}, {'weight': '72.5'}),
+    'import_weights': ('POST', {}, {'file': _weight_export}),
+    'nutrition_data': ('GET', {}, None),
+    'progress_data': ('GET', {}, None),
+    'dashboard_api': ('GET', {}, None),
+    'frequent_foods': ('GET', {}, None),
+    'meal_history_api': ('GET', {}, None),
+    'sync': ('GET', {}, None),
+    'weight_trend': ('GET', {}, None),
+    'provider_stats': ('GET', {}, None),
+}
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def _post_data(user, data):
+    if data is None:
+        return None
+    return {key: value(user) if callable(value) else value for key, value in data.items()}
+
+
+def _offline_provider(provider, method, url, **kwargs):
+    raise requests.ConnectionError(f'{provider} is not contacted during benchmarks')
+
+
+def calibrate(rounds=5):
+    """Best-of-rounds milliseconds for a fixed pure-Python workload on this machine.
+
+    Stored with the baseline, so --check can scale latency budgets taken on
+    other hardware by how much slower or faster this machine is.
+    """
+    rows = [{'id': i, 'food_name': f'Food {i % 97}', 'calories': i * 1.5} for i in range(2000)]
+    best = float('inf')
+    for _ in range(rounds):
+        started = time.perf_counter()
+        totals = {}
+        for row in json.loads(json.dumps(rows)):
+            totals[row['food_name']] = totals.get(row['food_name'], 0) + row['calories']
+        sorted(totals.items(), key=lambda item: (-item[1], item[0]))
+        ''.join(f'<li>{name}: {total:.0f}</li>' for name, total in totals.items())
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+@contextlib.contextmanager
+def quiet_provider_warnings():
+    """Hide the warnings offline providers cause on purpose; errors still show."""
+    logger = logging.getLogger('vitaltrack')
+    level = logger.level
+    logger.setLevel(logging.ERROR)
+    try:
+        yield
+    finally:
+        logger.setLevel(level)
+
+
+class Command(BaseCommand):
+    help = 'Drive every core URL through the test client and report latency, queries and peak memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', default='fake_00001', help='Username whose data the views render')
+        parser.add_argument('--iterations', type=int, default=30, help='Timed requests per view')
+        parser.add_argument('--warmup', type=int, default=3, help='Untimed requests per view first')
+        parser.add_argument('--cold', action='store_true', help='Clear the cache before every request')
+        parser.add_argument('--only', nargs='*', help='Benchmark only these URL names')
+        parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE)
+        parser.add_argument('--check', action='store_true', help='Fail if a view exceeds its baseline budget')
+        parser.add_argument('--write-baseline', action='store_true', help='Save this run as the new baseline')
+        parser.add_argument('--latency-tolerance', type=float, default=1.0,
+                            help='Allowed p95 latency growth over the machine-scaled baseline (1.0 = +100%%)')
+        parser.add_argument('--no-latency', action='store_true',
+                            help='Check only query counts and memory, e.g. on shared CI runners')
+        parser.add_argument('--memory-tolerance', type=float, default=0.25,
+                            help='Allowed peak memory growth over the baseline')
+
+    def handle(self, *args, **options):
+        names = [p.name for p in core_urls.urlpatterns if p.name]
+        missing = [name for name in names if name not in SCENARIOS]
+        if missing:
+            raise CommandError(f'No benchmark scenario for: {", ".join(missing)}')
+        if options['only']:
+            names = [name for name in names if name in options['only']]
+
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']!r} not found; run generate_fake_data first.")
+
+        results = self.run(user, names, options)
+        calibration_ms = calibrate()
+        self.report(results)
+
+        if options['write_baseline']:
+            options['baseline'].parent.mkdir(parents=True, exist_ok=True)
+            options['baseline'].write_text(json.dumps({
+                'user': options['user'],
+                'iterations': options['iterations'],
+                'calibration_ms': round(calibration_ms, 3),
+                'views': results,
+            }, indent=2, sort_keys=True) + '\n')
+            self.stdout.write(f"Baseline written to {options['baseline']}")
+        if options['check']:
+            self.check_budget(results, calibration_ms, options)
+
+    def run(self, user, names, options):
+        # Everything, including the writes the POST views make, is rolled back.
+        results = {}
+        # The views print provider errors; keep them out of the report.
+        # Admission control would turn repeated analyze_food calls into 429s;
+        # bench_admission measures it separately.
+        with transaction.atomic(), mock.patch('core.views.call_provider', _offline_provider), \
+                override_settings(ADMISSION_CONTROL={}, RECOGNITION_PROVIDERS={}), quiet_provider_warnings():
+            user.is_staff = True
+            user.save(update_fields=['is_staff'])
+            client = Client()
+            client.force_login(user)
+            for name in names:
+                results[name] = self.bench_view(client, user, name, options)
+            transaction.set_rollback(True)
+        return results
+
+    def request(self, client, user, name, options):
+        method, kwarg_resolvers, data = SCENARIOS[name]
+        # Each request runs in its own savepoint so POSTs see the same starting data.
+        with transaction.atomic():
+            url = reverse(name, kwargs={key: resolve(user) for key, resolve in kwarg_resolvers.items()})
+            if options['cold']:
+                cache.clear()
+            data = _post_data(user, data)
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = client.post(url, data) if method == 'POST' else client.get(url)
+                elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+        if response.status_code >= 400:
+            raise CommandError(f'{name} returned HTTP {response.status_code}')
+        return elapsed, len(queries)
+
+    def bench_view(self, client, user, name, options):
+        for _ in range(options['warmup']):
+            self.request(client, user, name, options)
+
+        latencies, query_counts = [], []
+        for _ in range(max(1, options['iterations'])):
+            elapsed, queries = self.request(client, user, name, options)
+            latencies.append(elapsed)
+            query_counts.append(queries)
+
+        # Memory is traced on one extra request so tracemalloc does not skew the timings.
+        tracemalloc.start()
+        try:
+            self.request(client, user, name, options)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'p50_ms': round(statistics.median(latencies) * 1000, 2),
+            'p95_ms': round(_percentile(latencies, 95) * 1000, 2),
+            'queries': max(query_counts),
+            'peak_kib': round(peak / 1024, 1),
+        }
+
+    def report(self, results):
+        self.stdout.write(f"{'view':<18}{'p50':>10}{'p95':>10}{'queries':>9}{'peak KiB':>11}")
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<18}{result['p50_ms']:>8.2f}ms{result['p95_ms']:>8.2f}ms"
+                f"{result['queries']:>9}{result['peak_kib']:>11.1f}"
+            )
+
+    def check_budget(self, results, calibration_ms, options):
+        """Query counts must not grow at all; latency and memory get headroom.
+
+        Latency budgets are absolute milliseconds from the machine that wrote
+        the baseline, so they are first scaled by this machine's calibration
+        time against the baseline's, and differences under
+        LATENCY_FLOOR_MS are treated as noise.
+        """
+        try:
+            baseline = json.loads(options['baseline'].read_text())
+        except FileNotFoundError:
+            raise CommandError(f"No baseline at {options['baseline']}; run with --write-baseline first.")
+        speed = calibration_ms / baseline['calibration_ms'] if baseline.get('calibration_ms') else 1.0
+
+        failures = []
+        for name, result in results.items():
+            budget = baseline['views'].get(name)
+            if budget is None:
+                failures.append(f'{name}: no baseline budget')
+                continue
+            if result['queries'] > budget['queries']:
+                failures.append(f"{name}: {result['queries']} queries (budget {budget['queries']})")
+            limit = budget['p95_ms'] * speed * (1 + options['latency_tolerance']) + LATENCY_FLOOR_MS
+            if not options['no_latency'] and result['p95_ms'] > limit:
+                failures.append(f"{name}: p95 {result['p95_ms']:.2f}ms (budget {limit:.2f}ms)")
+            limit = budget['peak_kib'] * (1 + options['memory_tolerance'])
+            if result['peak_kib'] > limit:
+                failures.append(f"{name}: peak {result['peak_kib']:.1f}KiB (budget {limit:.1f}KiB)")
+
+        if failures:
+            raise CommandError('Benchmark budget exceeded:\n  ' + '\n  '.join(failures))
+        self.stdout.write(self.style.SUCCESS(f'All {len(results)} views within budget.'))
@@ -0,0 +1,88 @@
+import os
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import models
+
+
+def file_fields():
+    for model in apps.get_models():
+        for field in model._meta.get_fields():
+            if isinstance(field, models.FileField):
+                yield model, field.name
+
+
+def walk_batches(root, batch_size):
+    batch = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            batch.append((os.path.relpath(path, root).replace(os.sep, '/'), path))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+class Command(BaseCommand):
+    help = 'Delete files under MEDIA_ROOT that no model FileField references'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report orphans without deleting them')
+        parser.add_argument('--batch-size', type=int, default=500, help='Files checked per database query')
+        parser.add_argument(
+            '--min-age', type=int, default=3600,
+            help='Skip files modified in the last N seconds (uploads still being committed)'
+        )
+
+    def handle(self, *args, **options):
+        root = str(settings.MEDIA_ROOT)
+        if not os.path.isdir(root):
+            self.stdout.write(f'{root} does not exist, nothing to do.')
+            return
+
+        dry_run = options['dry_run']
+        cutoff = time.time() - options['min_age']
+        fields = list(file_fields())
+        scanned = orphans = reclaimed = 0
+
+        for batch in walk_batches(root, options['batch_size']):
+            scanned += len(batch)
+            names = [name for name, path in batch]
+            referenced = set()
+            for model, field_name in fields:
+                referenced.update(
+                    model.objects.filter(**{f'{field_name}__in': names}).values_list(field_name, flat=True)
+                )
+            for name, path in batch:
+                if name in referenced:
+                    continue
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if stat.st_mtime > cutoff:
+                    continue
+                orphans += 1
+                reclaimed += stat.st_size
+                if dry_run:
+                    self.stdout.write(f'would delete {name} ({stat.st_size} bytes)')
+                else:
+                    os.remove(path)
+
+        if not dry_run:
+            self.remove_empty_dirs(root)
+
+        verb = 'Would reclaim' if dry_run else 'Reclaimed'
+        self.stdout.write(self.style.SUCCESS(
+            f'Scanned {scanned} files, {orphans} unreferenced. {verb} {reclaimed} bytes.'
+        ))
+
+    def remove_empty_dirs(self, root):
+        for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+            if dirpath != root and not os.listdir(dirpath):
+                os.rmdir(dirpath)
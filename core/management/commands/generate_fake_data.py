@@ -0,0 +1,201 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from accounts.models import UserProfile
+from core.foods import record_meals
+from core.models import MealLog, Quiz, QuizResult, WeightLog
+from core.sync import record_instances
+
+FAKE_PASSWORD = 'vitaltrack'
+
+# (name, calories, protein, carbs, fats, fiber) per serving.
+FOODS = [
+    ('Oatmeal', 150, 5, 27, 3, 4),
+    ('Scrambled Eggs', 200, 14, 2, 15, 0),
+    ('Greek Yogurt', 130, 17, 6, 4, 0),
+    ('Banana', 105, 1.3, 27, 0.4, 3.1),
+    ('Apple', 95, 0.5, 25, 0.3, 4.4),
+    ('Chicken Salad', 350, 30, 12, 20, 4),
+    ('Rice And Beans', 420, 15, 78, 4, 12),
+    ('Turkey Sandwich', 380, 25, 40, 12, 5),
+    ('Salmon Fillet', 367, 39, 0, 22, 0),
+    ('Pasta Bolognese', 610, 28, 75, 20, 6),
+    ('Vegetable Curry', 450, 12, 55, 20, 10),
+    ('Protein Shake', 160, 30, 5, 2, 1),
+    ('Almonds', 164, 6, 6, 14, 3.5),
+    ('Pizza Slice', 285, 12, 36, 10, 2.5),
+]
+
+MEAL_HOURS = {'breakfast': 8, 'lunch': 13, 'dinner': 19, 'snack': 16}
+
+
+def bulk_create_backdated(model, objs, field_names, batch_size=None):
+    """bulk_create() objs, then write back the auto_now_add values they were built with.
+
+    auto_now_add stamps every row with now on insert, so the intended
+    timestamps go back in with bulk_update(), which does not touch them.
+    """
+    intended = [[getattr(obj, name) for name in field_names] for obj in objs]
+    created = model.objects.bulk_create(objs, batch_size=batch_size)
+    for obj, values in zip(created, intended):
+        for name, value in zip(field_names, values):
+            setattr(obj, name, value)
+    model.objects.bulk_update(created, field_names, batch_size=batch_size)
+    return created
+
+
+class Command(BaseCommand):
+    help = 'Bulk-create users with days of meals, weights and quiz results for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--days', type=int, default=90, help='Days of history per user, ending today')
+        parser.add_argument('--meals-per-day', type=int, default=4)
+        parser.add_argument('--prefix', default='fake', help='Usernames are <prefix>_00001, <prefix>_00002, ...')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows per INSERT')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['days'] < 1:
+            raise CommandError('--users and --days must be at least 1.')
+        rng = random.Random(options['seed'])
+        started = time.perf_counter()
+
+        if not Quiz.objects.exists():
+            call_command('seed_quizzes', verbosity=0)
+        quizzes = list(Quiz.objects.annotate(question_count=Count('questions')))
+
+        with transaction.atomic():
+            users = self.create_users(options)
+            meals = self.create_meals(users, rng, options)
+            weights = self.create_weights(users, rng, options)
+            results = self.create_quiz_results(users, quizzes, rng, options)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {len(users)} users, {meals} meals, {weights} weights and {results} quiz results '
+            f'in {time.perf_counter() - started:.1f}s. Password for every user: {FAKE_PASSWORD}'
+        ))
+
+    def create_users(self, options):
+        prefix = options['prefix']
+        start = User.objects.filter(username__startswith=f'{prefix}_').count() + 1
+        password = make_password(FAKE_PASSWORD)
+        users = User.objects.bulk_create(
+            [
+                User(username=f'{prefix}_{i:05d}', email=f'{prefix}_{i:05d}@example.com', password=password)
+                for i in range(start, start + options['users'])
+            ],
+            batch_size=options['batch_size'],
+        )
+        rng = random.Random(options['seed'] + start)
+        profiles = []
+        for user in users:
+            height = rng.uniform(155, 195)
+            weight = rng.uniform(55, 110)
+            profiles.append(UserProfile(
+                user=user,
+                gender=rng.choice(['male', 'female', 'other']),
+                height=round(height, 1),
+                weight=round(weight, 1),
+                target_weight=round(weight * rng.uniform(0.85, 1.0), 1),
+                daily_calorie_goal=rng.choice([1600, 1800, 2000, 2200, 2500]),
+                dietary_preference=rng.choice(['none', 'none', 'vegetarian', 'vegan', 'keto', 'paleo']),
+            ))
+        UserProfile.objects.bulk_create(profiles, batch_size=options['batch_size'])
+        for user, profile in zip(users, profiles):
+            user.profile = profile
+        return users
+
+    def days(self, options):
+        today = timezone.localdate()
+        return [today - timedelta(days=i) for i in range(options['days'] - 1, -1, -1)]
+
+    def create_meals(self, users, rng, options):
+        meal_types = list(MEAL_HOURS)
+        tz = timezone.get_current_timezone()
+        batch, created = [], 0
+        for user in users:
+            for day in self.days(options):
+                for n in range(rng.randint(max(1, options['meals_per_day'] - 1), options['meals_per_day'])):
+                    meal_type = meal_types[n % len(meal_types)]
+                    name, calories, protein, carbs, fats, fiber = rng.choice(FOODS)
+                    servings = rng.choice([0.5, 1, 1, 1, 1.5, 2])
+                    logged_at = datetime(day.year, day.month, day.day, MEAL_HOURS[meal_type], rng.randint(0, 59))
+                    batch.append(MealLog(
+                        user=user,
+                        meal_type=meal_type,
+                        food_name=name,
+                        calories=round(calories * servings, 1),
+                        protein=round(protein * servings, 1),
+                        carbs=round(carbs * servings, 1),
+                        fats=round(fats * servings, 1),
+                        fiber=round(fiber * servings, 1),
+                        serving_size=f'{servings:g} serving',
+                        date=day,
+                        logged_at=timezone.make_aware(logged_at, tz),
+                    ))
+                    if len(batch) >= options['batch_size']:
+                        created += self.insert_meals(batch)
+                        batch = []
+        if batch:
+            created += self.insert_meals(batch)
+        return created
+
+    def insert_meals(self, batch):
+        # bulk_create skips post_save, so feed the quick-add index and sync feed directly.
+        bulk_create_backdated(MealLog, batch, ['date', 'logged_at'])
+        record_meals(batch)
+        record_instances(batch)
+        return len(batch)
+
+    def insert_synced(self, model, batch, options, backdated=()):
+        if backdated:
+            created = bulk_create_backdated(model, batch, list(backdated), batch_size=options['batch_size'])
+        else:
+            created = model.objects.bulk_create(batch, batch_size=options['batch_size'])
+        for start in range(0, len(created), options['batch_size']):
+            record_instances(created[start:start + options['batch_size']])
+        return len(created)
+
+    def create_weights(self, users, rng, options):
+        batch = []
+        for user in users:
+            profile = user.profile
+            weight = profile.weight
+            # Drift towards the target with daily noise; some days go unlogged.
+            step = (profile.target_weight - weight) / max(options['days'], 30)
+            for day in self.days(options):
+                weight += step + rng.gauss(0, 0.25)
+                if rng.random() < 0.8:
+                    batch.append(WeightLog(user=user, date=day, weight=round(weight, 1)))
+        return self.insert_synced(WeightLog, batch, options)
+
+    def create_quiz_results(self, users, quizzes, rng, options):
+        if not quizzes:
+            return 0
+        tz = timezone.get_current_timezone()
+        days = self.days(options)
+        batch = []
+        for user in users:
+            for quiz in rng.sample(quizzes, rng.randint(0, len(quizzes))):
+                total = quiz.question_count or 1
+                score = rng.randint(1, total)
+                day = rng.choice(days)
+                batch.append(QuizResult(
+                    user=user,
+                    quiz=quiz,
+                    score=score,
+                    total_questions=total,
+                    percentage=score / total * 100,
+                    completed_at=timezone.make_aware(datetime(day.year, day.month, day.day, 20), tz),
+                ))
+        return self.insert_synced(QuizResult, batch, options, backdated=['completed_at'])
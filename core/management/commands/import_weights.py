@@ -0,0 +1,40 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core import weights
+
+
+class Command(BaseCommand):
+    help = "Bulk-import a smart-scale weight export (CSV, JSON array or JSON Lines) into a user's WeightLog"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('path', help='Export file')
+        parser.add_argument('--format', choices=weights.FORMATS, help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=weights.BATCH_SIZE, help='Readings per upsert')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['username']!r} not found.")
+
+        started = time.perf_counter()
+        try:
+            with open(options['path'], 'rb') as stream:
+                records = weights.read_records(stream, options['format'] or weights.guess_format(options['path']))
+                summary = weights.import_weights(user, records, batch_size=options['batch_size'])
+        except OSError as e:
+            raise CommandError(str(e))
+
+        for error in summary['errors']:
+            self.stderr.write(error)
+        message = (f"Imported {summary['imported']} days from {summary['rows']} rows for {user.username} "
+                   f"({summary['skipped']} skipped) in {time.perf_counter() - started:.1f}s.")
+        if not summary['complete']:
+            raise CommandError(f'{message} The file could not be read to the end.')
+        self.stdout.write(self.style.SUCCESS(message))
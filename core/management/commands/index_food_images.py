@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import ArchivedMealLog, FoodImageFeature, MealLog
+from core.recognizer import index_meal
+
+
+class Command(BaseCommand):
+    help = 'Add photographed meals that are not indexed yet to the local food recognizer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='Index only this user id')
+        parser.add_argument('--rebuild', action='store_true', help='Recompute every photo, not just new ones')
+        parser.add_argument('--batch-size', type=int, default=200, help='Meals read per query')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        started = time.perf_counter()
+        indexed = failed = 0
+        for model in (MealLog, ArchivedMealLog):
+            meals = model.objects.exclude(food_image='').exclude(food_image__isnull=True).order_by('pk')
+            if options['user'] is not None:
+                meals = meals.filter(user_id=options['user'])
+            if not options['rebuild']:
+                meals = meals.exclude(pk__in=FoodImageFeature.objects.values('meal_id'))
+            last_pk = 0
+            while True:
+                batch = list(meals.filter(pk__gt=last_pk).only('pk', 'user_id', 'food_name', 'food_image')[:options['batch_size']])
+                if not batch:
+                    break
+                for meal in batch:
+                    if index_meal(meal):
+                        indexed += 1
+                    else:
+                        failed += 1
+                last_pk = batch[-1].pk
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {indexed} photos ({failed} unreadable) in {time.perf_counter() - started:.1f}s.'
+        ))
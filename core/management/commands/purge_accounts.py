@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import AccountDeletion
+from core.purge import purge_batch
+
+
+class Command(BaseCommand):
+    help = 'Purge the rows and files of accounts queued for deletion, in small resumable batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows per transaction')
+        parser.add_argument('--pause-ms', type=int, default=50,
+                            help='Sleep between batches so web writers can take the write lock')
+        parser.add_argument('--account', type=int, help='Purge only this account id')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        pending = AccountDeletion.objects.filter(finished_at__isnull=True)
+        if options['account'] is not None:
+            pending = pending.filter(account_id=options['account'])
+        pending = list(pending)
+        if not pending:
+            self.stdout.write('No accounts waiting to be purged.')
+            return
+
+        for deletion in pending:
+            started = time.perf_counter()
+            if deletion.stage:
+                self.stdout.write(f'Resuming {deletion.username} at {deletion.stage} ({deletion.deleted_rows} rows done).')
+            batches = 0
+            while purge_batch(deletion, options['batch_size']):
+                batches += 1
+                time.sleep(options['pause_ms'] / 1000)
+            self.stdout.write(self.style.SUCCESS(
+                f'Purged {deletion.username}: {deletion.deleted_rows} rows and {deletion.deleted_files} files '
+                f'in {batches} batches ({time.perf_counter() - started:.1f}s).'
+            ))
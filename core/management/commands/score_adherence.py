@@ -0,0 +1,71 @@
+import multiprocessing
+import os
+import time
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from core.adherence import score_range, week_start
+
+
+def _score_chunk(first_user_id, last_user_id, start, end):
+    try:
+        return score_range(first_user_id, last_user_id, start, end)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Score diet-plan adherence per user for recent days and their ISO weeks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Last day to score, YYYY-MM-DD (default: yesterday)')
+        parser.add_argument('--days', type=int, default=1, help='Days to score, ending at --date')
+        parser.add_argument('--chunk-size', type=int, default=500, help='User ids per work unit')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes to score chunks in; 1 runs inline')
+
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                end = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--date must be YYYY-MM-DD.')
+        else:
+            end = timezone.localdate() - timedelta(days=1)
+        if options['days'] < 1 or options['chunk_size'] < 1:
+            raise CommandError('--days and --chunk-size must be at least 1.')
+        # Rescore from the Monday before so each touched week is complete.
+        start = week_start(end - timedelta(days=options['days'] - 1))
+
+        bounds = User.objects.aggregate(first=Min('id'), last=Max('id'))
+        if bounds['first'] is None:
+            self.stdout.write('No users to score.')
+            return
+        size = options['chunk_size']
+        chunks = [
+            (first, min(first + size - 1, bounds['last']), start, end)
+            for first in range(bounds['first'], bounds['last'] + 1, size)
+        ]
+
+        started = time.perf_counter()
+        workers = min(options['workers'], len(chunks))
+        if workers <= 1:
+            results = [score_range(*chunk) for chunk in chunks]
+        else:
+            # Forked workers inherit the configured app; they must not inherit open connections.
+            connections.close_all()
+            ctx = multiprocessing.get_context('fork')
+            with ctx.Pool(workers) as pool:
+                results = pool.starmap(_score_chunk, chunks)
+
+        daily = sum(r[0] for r in results)
+        weekly = sum(r[1] for r in results)
+        self.stdout.write(self.style.SUCCESS(
+            f'Scored {daily} user-days and {weekly} user-weeks from {start} to {end} '
+            f'in {len(chunks)} chunks across {max(workers, 1)} workers ({time.perf_counter() - started:.1f}s).'
+        ))
@@ -0,0 +1,228 @@
+import mimetypes
+import os
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+
+from accounts.models import UserProfile
+from .models import ArchivedMealLog, MealLog
+
+THUMBNAIL_ROOT = getattr(settings, 'MEDIA_THUMBNAIL_ROOT', settings.BASE_DIR / 'media_cache')
+THUMBNAIL_WIDTHS = getattr(settings, 'MEDIA_THUMBNAIL_WIDTHS', (160, 320, 640))
+THUMBNAIL_CACHE_MAX_BYTES = getattr(settings, 'MEDIA_THUMBNAIL_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+# Thumbnails written since the last walk are counted in memory; the cache
+# directory is only walked when that estimate crosses the budget or this
+# many seconds have passed (other workers' thumbnails are not counted).
+THUMBNAIL_EVICT_INTERVAL = getattr(settings, 'MEDIA_THUMBNAIL_EVICT_INTERVAL', 300)
+MEDIA_MAX_AGE = getattr(settings, 'MEDIA_MAX_AGE', 86400)
+
+# Every (model, field) that stores a user's files; a user may only fetch
+# files one of their own rows points at.
+OWNED_FILES = [(MealLog, 'food_image'), (ArchivedMealLog, 'food_image'), (UserProfile, 'avatar')]
+
+STREAM_CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+_eviction_lock = threading.Lock()
+_cache_estimate = {'bytes': None, 'walked_at': 0.0}
+
+
+def file_etag(stat):
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def parse_range(header, size):
+    """Return (start, end) inclusive for a single byte range, or None.
+
+    Multi-range requests are answered with the whole file, which RFC 9110
+    allows servers to do.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or size == 0:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        raise ValueError('unsatisfiable range')
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(STREAM_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def thumbnail_path(relative_path, width, stat):
+    # The source validator is part of the name, so replacing the original
+    # never serves a stale thumbnail.
+    tag = f'{stat.st_mtime_ns:x}-{stat.st_size:x}'
+    return os.path.join(str(THUMBNAIL_ROOT), str(width), f'{relative_path}.{tag}.jpg')
+
+
+def get_thumbnail(source_path, relative_path, width):
+    stat = os.stat(source_path)
+    path = thumbnail_path(relative_path, width, stat)
+    if os.path.exists(path):
+        # mtime doubles as the LRU clock; atime is unreliable on noatime mounts.
+        os.utime(path)
+        return path
+
+    from PIL import Image
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with Image.open(source_path) as image:
+        image.thumbnail((width, width * 4))
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        image.save(tmp_path, 'JPEG', quality=82, optimize=True, progressive=True)
+    os.replace(tmp_path, path)
+    _thumbnail_written(path)
+    return path
+
+
+def _thumbnail_written(path):
+    size = os.path.getsize(path)
+    estimate = _cache_estimate['bytes']
+    if estimate is not None:
+        _cache_estimate['bytes'] = estimate + size
+    if (estimate is None or estimate + size > THUMBNAIL_CACHE_MAX_BYTES
+            or time.monotonic() - _cache_estimate['walked_at'] > THUMBNAIL_EVICT_INTERVAL):
+        # Never the thumbnail about to be served, however small the budget.
+        evict_thumbnails(keep=path)
+
+
+def evict_thumbnails(max_bytes=None, keep=None):
+    """Delete least recently used thumbnails (except keep) until the cache fits max_bytes."""
+    max_bytes = THUMBNAIL_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    if not _eviction_lock.acquire(blocking=False):
+        return 0
+    try:
+        entries, total = [], 0
+        for dirpath, dirnames, filenames in os.walk(str(THUMBNAIL_ROOT)):
+            for filename in filenames:
+                if filename.endswith('.tmp'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        reclaimed = 0
+        if total > max_bytes:
+            entries.sort()
+            for mtime, size, path in entries:
+                if total <= max_bytes:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                reclaimed += size
+        _cache_estimate.update(bytes=total, walked_at=time.monotonic())
+        return reclaimed
+    finally:
+        _eviction_lock.release()
+
+
+def user_owns(user, name):
+    return any(model.objects.filter(user=user, **{field: name}).exists() for model, field in OWNED_FILES)
+
+
+@login_required
+def serve_media(request, path):
+    """Serve one of the user's own files from MEDIA_ROOT with conditional GET, Range and thumbnails.
+
+    Files no row of request.user references are a 404, as if missing.
+    ``?w=<width>`` returns a JPEG thumbnail from MEDIA_THUMBNAIL_WIDTHS,
+    rendered on first request and cached on disk. Full files go through
+    FileResponse so WSGI servers can use wsgi.file_wrapper / sendfile().
+    Responses may only be cached privately.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponse(status=405)
+    try:
+        full_path = safe_join(str(settings.MEDIA_ROOT), path)
+    except SuspiciousFileOperation:
+        raise Http404('Invalid path')
+    if not os.path.isfile(full_path) or not user_owns(request.user, path):
+        raise Http404('File not found')
+
+    # Validators always come from the original: thumbnail mtimes move with
+    # every LRU touch.
+    source_stat = os.stat(full_path)
+    etag = file_etag(source_stat)
+    last_modified = int(source_stat.st_mtime)
+
+    width = request.GET.get('w')
+    if width:
+        if not width.isdigit() or int(width) not in THUMBNAIL_WIDTHS:
+            raise Http404('Unsupported thumbnail width')
+        try:
+            full_path = get_thumbnail(full_path, path, int(width))
+        except OSError:
+            raise Http404('Not an image')
+        etag = f'{etag[:-1]}-w{width}"'
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    size = os.path.getsize(full_path)
+
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if range_header and (not if_range or if_range == etag or parse_http_date_safe(if_range) == last_modified):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    if byte_range is not None:
+        start, end = byte_range
+        length = end - start + 1
+        if request.method == 'HEAD':
+            response = HttpResponse(status=206, content_type=content_type)
+        else:
+            response = StreamingHttpResponse(_read_range(full_path, start, length), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = length
+    elif request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+        response['Content-Length'] = size
+    else:
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, max_age=MEDIA_MAX_AGE)
+    return response
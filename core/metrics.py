@@ -0,0 +1,252 @@
+"""Tiny in-process metrics registry rendered in Prometheus text format.
+
+Each worker process keeps its own counters. The gunicorn workers share one
+port, so a scrape lands on whichever worker accepts it; with METRICS_DIR set
+(production sets it), every worker writes its counters to its own file there
+about once a second and /metrics renders the sum over all files, like the
+Prometheus client's multiprocess mode. Files of exited workers are kept so
+totals never go backwards; main.py clears the directory before forking.
+"""
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger('vitaltrack.metrics')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield self.name, labels, None, value
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def state(self):
+        return [[list(labels), value] for labels, value in self.snapshot().items()]
+
+    def merge(self, state):
+        with self._lock:
+            for labels, value in state:
+                labels = tuple(labels)
+                self._values[labels] = self._values.get(labels, 0) + value
+
+    def empty(self):
+        return Counter(self.name, self.documentation, self.labelnames)
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+            state[0][index] += 1
+            state[1] += 1
+            state[2] += value
+
+    def samples(self):
+        with self._lock:
+            items = sorted((labels, ([*s[0]], s[1], s[2])) for labels, s in self._values.items())
+        for labels, (counts, count, total) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield self.name + '_bucket', labels, ('le', _format_value(float(bound))), cumulative
+            yield self.name + '_bucket', labels, ('le', '+Inf'), count
+            yield self.name + '_count', labels, None, count
+            yield self.name + '_sum', labels, None, total
+
+    def snapshot(self):
+        """{labels: (count, sum)} for JSON summaries."""
+        with self._lock:
+            return {labels: (s[1], s[2]) for labels, s in self._values.items()}
+
+    def state(self):
+        with self._lock:
+            return [[list(labels), [[*s[0]], s[1], s[2]]] for labels, s in self._values.items()]
+
+    def merge(self, state):
+        with self._lock:
+            for labels, (counts, count, total) in state:
+                current = self._values.setdefault(tuple(labels), [[0] * (len(self.buckets) + 1), 0, 0.0])
+                current[0] = [a + b for a, b in zip(current[0], counts)]
+                current[1] += count
+                current[2] += total
+
+    def empty(self):
+        return Histogram(self.name, self.documentation, self.labelnames, self.buckets)
+
+
+def metrics_dir():
+    return getattr(settings, 'METRICS_DIR', '')
+
+
+def clear_dir():
+    """Drop the files of a previous run; call once in the master, before forking."""
+    directory = metrics_dir()
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    for path in Path(directory).glob('*.json'):
+        path.unlink(missing_ok=True)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._path = None
+        self._path_pid = None
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def write(self):
+        """Write this process's metrics to its own file in METRICS_DIR."""
+        directory = metrics_dir()
+        if not directory:
+            return
+        if self._path_pid != os.getpid():
+            # A new file per process: a recycled pid must not overwrite the
+            # totals of the worker that had it before.
+            self._path = os.path.join(directory, f'{os.getpid()}-{uuid.uuid4().hex[:8]}.json')
+            self._path_pid = os.getpid()
+        with self._lock:
+            metrics = list(self._metrics.values())
+        data = {metric.name: metric.state() for metric in metrics}
+        os.makedirs(directory, exist_ok=True)
+        temporary = f'{self._path}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(data, f)
+        os.replace(temporary, self._path)
+
+    def start_flushing(self, interval=1.0):
+        """Write this process's metrics every interval seconds; call in each worker after the fork."""
+        if not metrics_dir():
+            return
+
+        def flush():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.write()
+                except OSError:
+                    logger.warning('Could not write metrics to %s', metrics_dir(), exc_info=True)
+
+        threading.Thread(target=flush, name='metrics-flush', daemon=True).start()
+
+    def collect(self):
+        """{name: metric} summed over every worker's file, or this process's own metrics."""
+        with self._lock:
+            metrics = dict(self._metrics)
+        if not metrics_dir():
+            return metrics
+        self.write()
+        merged = {name: metric.empty() for name, metric in metrics.items()}
+        for path in Path(metrics_dir()).glob('*.json'):
+            try:
+                data = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            for name, state in data.items():
+                if name in merged:
+                    merged[name].merge(state)
+        return merged
+
+    def render(self):
+        lines = []
+        metrics = sorted(self.collect().values(), key=lambda m: m.name)
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, extra, value in metric.samples():
+                lines.append(f'{name}{_format_labels(metric.labelnames, labels, extra)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.histogram(
+    'vitaltrack_http_request_duration_seconds', 'Total request latency', ('view', 'method'))
+REQUEST_QUERIES = registry.histogram(
+    'vitaltrack_http_request_db_queries', 'SQL queries per request', ('view',), buckets=COUNT_BUCKETS)
+REQUEST_DB_TIME = registry.histogram(
+    'vitaltrack_http_request_db_seconds', 'Time spent in SQL per request', ('view',))
+RESPONSE_SIZE = registry.histogram(
+    'vitaltrack_http_response_size_bytes', 'Response body size', ('view',), buckets=SIZE_BUCKETS)
+REQUESTS_TOTAL = registry.counter(
+    'vitaltrack_http_requests_total', 'Requests by view and status', ('view', 'method', 'status'))
+
+
+def metrics_view(request):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and request.META.get('HTTP_AUTHORIZATION') != f'Bearer {token}':
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
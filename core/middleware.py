@@ -0,0 +1,230 @@
+import gzip
+import logging
+import mimetypes
+import os
+import time
+
+import brotli
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+
+from .api import MSGPACK_TYPES, JSON_TYPE, wants_msgpack
+from .metrics import REQUEST_DB_TIME, REQUEST_LATENCY, REQUEST_QUERIES, REQUESTS_TOTAL, RESPONSE_SIZE
+
+slow_request_logger = logging.getLogger('vitaltrack.slow_requests')
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+DEFAULT_CACHE_CONTROL = 'public, max-age=60'
+
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+API_CONTENT_TYPES = (JSON_TYPE, *MSGPACK_TYPES)
+
+
+def accepted_encodings(header):
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        params = params.replace(' ', '')
+        try:
+            quality = float(params[2:]) if params.startswith('q=') else 1.0
+        except ValueError:
+            quality = 0.0
+        if quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticFilesMiddleware:
+    """Serve collected static files straight from STATIC_ROOT.
+
+    Only active with DEBUG off, where runserver's static handler is gone. The
+    file index is built once at startup, since STATIC_ROOT only changes on
+    deploy. Hashed names get a one-year immutable Cache-Control; precompressed
+    .br/.gz siblings are chosen from Accept-Encoding.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        static_root = getattr(settings, 'STATIC_ROOT', None)
+        if settings.DEBUG or not static_root or not os.path.isdir(static_root):
+            raise MiddlewareNotUsed
+        self.prefix = settings.STATIC_URL if settings.STATIC_URL.startswith('/') else '/' + settings.STATIC_URL
+        self.files = self.build_index(str(static_root))
+        if not self.files:
+            raise MiddlewareNotUsed
+        hashed_files = getattr(staticfiles_storage, 'hashed_files', {}) or {}
+        self.immutable = set(hashed_files.values())
+
+    def build_index(self, root):
+        files = {}
+        for dirpath, dirnames, filenames in os.walk(root):
+            for filename in filenames:
+                if filename.endswith(('.br', '.gz')):
+                    continue
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, root).replace(os.sep, '/')
+                stat = os.stat(path)
+                variants = {}
+                for encoding, suffix in ENCODINGS:
+                    if os.path.exists(path + suffix):
+                        variants[encoding] = (path + suffix, os.path.getsize(path + suffix))
+                files[name] = {
+                    'path': path,
+                    'size': stat.st_size,
+                    'mtime': stat.st_mtime,
+                    'etag': f'"{int(stat.st_mtime):x}-{stat.st_size:x}"',
+                    'content_type': mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                    'variants': variants,
+                }
+        return files
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and request.path_info.startswith(self.prefix):
+            entry = self.files.get(request.path_info[len(self.prefix):])
+            if entry is not None:
+                return self.serve(request, request.path_info[len(self.prefix):], entry)
+        return self.get_response(request)
+
+    def serve(self, request, name, entry):
+        path, size, encoding = entry['path'], entry['size'], None
+        accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        for candidate, _ in ENCODINGS:
+            if candidate in entry['variants'] and candidate in accepted:
+                path, size = entry['variants'][candidate]
+                encoding = candidate
+                break
+        # Each encoded representation needs its own strong validator.
+        etag = entry['etag'] if encoding is None else f'{entry["etag"][:-1]}-{encoding}"'
+
+        if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+            response = HttpResponseNotModified()
+        else:
+            if request.method == 'HEAD':
+                response = HttpResponse(content_type=entry['content_type'])
+            else:
+                response = FileResponse(open(path, 'rb'), content_type=entry['content_type'])
+            response['Content-Length'] = size
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(entry['mtime'])
+        if entry['variants']:
+            response['Vary'] = 'Accept-Encoding'
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if name in self.immutable else DEFAULT_CACHE_CONTROL
+        return response
+
+
+class QueryRecorder:
+    """connection.execute_wrapper hook that counts and times every query."""
+
+    def __init__(self, keep_sql):
+        self.count = 0
+        self.duration = 0.0
+        self.keep_sql = keep_sql
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            if self.keep_sql and len(self.statements) < 100:
+                self.statements.append((elapsed, sql))
+
+
+class RequestMetricsMiddleware:
+    """Record latency, SQL count/time and response size per view.
+
+    Query timing uses execute_wrapper, so it works with DEBUG off and costs a
+    perf_counter() pair per query. Requests slower than SLOW_REQUEST_MS are
+    logged to ``vitaltrack.slow_requests`` with their SQL.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'SLOW_REQUEST_MS', None)
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        recorder = QueryRecorder(keep_sql=bool(self.slow_ms))
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        if view == 'metrics':
+            return response
+
+        REQUEST_LATENCY.observe(elapsed, view, request.method)
+        REQUEST_QUERIES.observe(recorder.count, view)
+        REQUEST_DB_TIME.observe(recorder.duration, view)
+        REQUESTS_TOTAL.inc(view, request.method, str(response.status_code))
+        if response.streaming:
+            size = int(response.get('Content-Length') or 0)
+        else:
+            size = len(response.content)
+        RESPONSE_SIZE.observe(size, view)
+
+        if self.slow_ms and elapsed * 1000 >= self.slow_ms:
+            slow_request_logger.warning(
+                'Slow request %s %s (view=%s): %.0f ms, %d queries, %.0f ms in SQL\n%s',
+                request.method, request.path, view, elapsed * 1000, recorder.count, recorder.duration * 1000,
+                '\n'.join(f'  {t * 1000:7.2f} ms  {sql}' for t, sql in recorder.statements),
+            )
+        return response
+
+
+class ApiResponseMiddleware:
+    """Negotiate the format of ApiResponses and compress API bodies.
+
+    Views return core.api.ApiResponse; a client preferring MessagePack in
+    Accept gets it re-encoded here. JSON and MessagePack bodies of at least
+    API_COMPRESS_MIN_BYTES are then brotli- or gzip-compressed at fast
+    settings (these are compressed per request, unlike static files).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_bytes = getattr(settings, 'API_COMPRESS_MIN_BYTES', 1024)
+        self.gzip_level = getattr(settings, 'API_GZIP_LEVEL', 6)
+        self.brotli_quality = getattr(settings, 'API_BROTLI_QUALITY', 4)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if hasattr(response, 'render_msgpack'):
+            patch_vary_headers(response, ('Accept',))
+            if wants_msgpack(request):
+                response.render_msgpack()
+        return self.compress(request, response)
+
+    def compress(self, request, response):
+        content_type = response.get('Content-Type', '').split(';')[0]
+        if (response.streaming or content_type not in API_CONTENT_TYPES
+                or response.has_header('Content-Encoding') or len(response.content) < self.min_bytes):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if 'br' in accepted:
+            encoding, body = 'br', brotli.compress(response.content, quality=self.brotli_quality)
+        elif 'gzip' in accepted:
+            encoding, body = 'gzip', gzip.compress(response.content, compresslevel=self.gzip_level, mtime=0)
+        else:
+            return response
+
+        response.content = body
+        response['Content-Length'] = str(len(body))
+        response['Content-Encoding'] = encoding
+        # Compressed bytes differ from the ones a strong ETag promised.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:54
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='meallog',
+            name='food_image',
+            field=models.ImageField(blank=True, db_index=True, null=True, storage=core.storage.ContentAddressedStorage(), upload_to='food_images/'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_meallog_food_image_content_addressed'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdherenceScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('week', 'Week')], max_length=4)),
+                ('start', models.DateField(help_text='The day, or the Monday the week starts on')),
+                ('days_logged', models.PositiveSmallIntegerField(default=1)),
+                ('calories', models.FloatField(default=0, help_text='Average daily calories over logged days')),
+                ('protein', models.FloatField(default=0)),
+                ('carbs', models.FloatField(default=0)),
+                ('fats', models.FloatField(default=0)),
+                ('target_calories', models.FloatField(default=0)),
+                ('score', models.FloatField(help_text='0-100, average of the daily scores for weeks')),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='adherence_scores', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-start'],
+                'unique_together': {('user', 'period', 'start')},
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:08
+
+import core.storage
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_adherencescore'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedMealLog',
+            fields=[
+                ('id', models.BigIntegerField(help_text='The original MealLog id', primary_key=True, serialize=False)),
+                ('meal_type', models.CharField(choices=[('breakfast', 'Breakfast'), ('lunch', 'Lunch'), ('dinner', 'Dinner'), ('snack', 'Snack')], max_length=20)),
+                ('food_name', models.CharField(max_length=200)),
+                ('food_image', models.ImageField(blank=True, db_index=True, null=True, storage=core.storage.ContentAddressedStorage(), upload_to='food_images/')),
+                ('calories', models.FloatField(default=0)),
+                ('protein', models.FloatField(default=0)),
+                ('carbs', models.FloatField(default=0)),
+                ('fats', models.FloatField(default=0)),
+                ('fiber', models.FloatField(default=0)),
+                ('serving_size', models.CharField(default='1 serving', max_length=100)),
+                ('notes', models.TextField(blank=True)),
+                ('logged_at', models.DateTimeField()),
+                ('date', models.DateField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_meal_logs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-logged_at'],
+                'indexes': [models.Index(fields=['user', 'date'], name='core_archiv_user_id_bcbf4c_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MealMonthlySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('meals', models.PositiveIntegerField(default=0)),
+                ('days_logged', models.PositiveSmallIntegerField(default=0)),
+                ('calories', models.FloatField(default=0)),
+                ('protein', models.FloatField(default=0)),
+                ('carbs', models.FloatField(default=0)),
+                ('fats', models.FloatField(default=0)),
+                ('fiber', models.FloatField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='meal_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-month'],
+                'unique_together': {('user', 'month')},
+            },
+        ),
+    ]
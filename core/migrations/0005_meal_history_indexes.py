@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_meal_archive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='archivedmeallog',
+            index=models.Index(fields=['user', '-logged_at', '-id'], name='archivedmeal_user_history'),
+        ),
+        migrations.AddIndex(
+            model_name='meallog',
+            index=models.Index(fields=['user', '-logged_at', '-id'], name='meallog_user_history'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_meal_history_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FrequentFood',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name_key', models.CharField(help_text='Case- and space-normalised food name', max_length=200)),
+                ('food_name', models.CharField(max_length=200)),
+                ('meal_type', models.CharField(choices=[('breakfast', 'Breakfast'), ('lunch', 'Lunch'), ('dinner', 'Dinner'), ('snack', 'Snack')], max_length=20)),
+                ('calories', models.FloatField(default=0)),
+                ('protein', models.FloatField(default=0)),
+                ('carbs', models.FloatField(default=0)),
+                ('fats', models.FloatField(default=0)),
+                ('fiber', models.FloatField(default=0)),
+                ('serving_size', models.CharField(default='1 serving', max_length=100)),
+                ('times_logged', models.PositiveIntegerField(default=0)),
+                ('rank', models.FloatField(default=0)),
+                ('last_logged_at', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='frequent_foods', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-rank'],
+                'indexes': [models.Index(fields=['user', '-rank'], name='frequentfood_user_rank')],
+                'unique_together': {('user', 'name_key')},
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_frequentfood'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountDeletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account_id', models.BigIntegerField(unique=True)),
+                ('username', models.CharField(max_length=150)),
+                ('stage', models.CharField(blank=True, help_text='Model currently being purged', max_length=50)),
+                ('deleted_rows', models.PositiveIntegerField(default=0)),
+                ('deleted_files', models.PositiveIntegerField(default=0)),
+                ('requested_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['requested_at'],
+            },
+        ),
+    ]
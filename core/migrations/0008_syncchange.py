@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:31
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+BACKFILL_BATCH = 2000
+
+
+def backfill_changes(apps, schema_editor):
+    """Give every existing row an entry, so a client with no token gets everything."""
+    SyncChange = apps.get_model('core', 'SyncChange')
+    sources = [('meal', 'ArchivedMealLog'), ('meal', 'MealLog'), ('weight', 'WeightLog'), ('quiz_result', 'QuizResult')]
+    for kind, model_name in sources:
+        rows = apps.get_model('core', model_name).objects.order_by('id').values_list('id', 'user_id')
+        batch = []
+        for object_id, user_id in rows.iterator(chunk_size=BACKFILL_BATCH):
+            batch.append(SyncChange(user_id=user_id, kind=kind, object_id=object_id))
+            if len(batch) >= BACKFILL_BATCH:
+                SyncChange.objects.bulk_create(batch)
+                batch = []
+        SyncChange.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_accountdeletion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('meal', 'Meal'), ('weight', 'Weight'), ('quiz_result', 'Quiz result')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sync_changes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'id'], name='syncchange_user_seq')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='syncchange_object')],
+            },
+        ),
+        migrations.RunPython(backfill_changes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_syncchange'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FoodImageFeature',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('meal_id', models.BigIntegerField(unique=True)),
+                ('food_name', models.CharField(max_length=200)),
+                ('vector', models.BinaryField(help_text='float32 feature vector, L2-normalised')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='food_image_features', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'id'], name='foodfeature_user_seq')],
+            },
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
+from .storage import food_image_storage
 
 class MealLog(models.Model):
     MEAL_TYPES = [
@@ -12,7 +14,7 @@ class MealLog(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='meal_logs')
     meal_type = models.CharField(max_length=20, choices=MEAL_TYPES)
     food_name = models.CharField(max_length=200)
-    food_image = models.ImageField(upload_to='food_images/', null=True, blank=True)
+    food_image = models.ImageField(upload_to='food_images/', storage=food_image_storage, null=True, blank=True, db_index=True)
     calories = models.FloatField(default=0)
     protein = models.FloatField(default=0, help_text="Protein in grams")
     carbs = models.FloatField(default=0, help_text="Carbohydrates in grams")
@@ -25,10 +27,86 @@ class MealLog(models.Model):
 
     class Meta:
         ordering = ['-logged_at']
+        indexes = [models.Index(fields=['user', '-logged_at', '-id'], name='meallog_user_history')]
 
     def __str__(self):
         return f"{self.food_name} - {self.user.username}"
 
+class ArchivedMealLog(models.Model):
+    """A MealLog row moved out of the hot table by the archive_meals command."""
+    id = models.BigIntegerField(primary_key=True, help_text="The original MealLog id")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_meal_logs')
+    meal_type = models.CharField(max_length=20, choices=MealLog.MEAL_TYPES)
+    food_name = models.CharField(max_length=200)
+    food_image = models.ImageField(upload_to='food_images/', storage=food_image_storage, null=True, blank=True, db_index=True)
+    calories = models.FloatField(default=0)
+    protein = models.FloatField(default=0)
+    carbs = models.FloatField(default=0)
+    fats = models.FloatField(default=0)
+    fiber = models.FloatField(default=0)
+    serving_size = models.CharField(max_length=100, default="1 serving")
+    notes = models.TextField(blank=True)
+    logged_at = models.DateTimeField()
+    date = models.DateField()
+
+    class Meta:
+        ordering = ['-logged_at']
+        indexes = [
+            models.Index(fields=['user', 'date']),
+            models.Index(fields=['user', '-logged_at', '-id'], name='archivedmeal_user_history'),
+        ]
+
+    def __str__(self):
+        return f"{self.food_name} - {self.user.username} (archived)"
+
+class MealMonthlySummary(models.Model):
+    """Per-user monthly totals for meals older than the archive horizon."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='meal_summaries')
+    month = models.DateField(help_text="First day of the month")
+    meals = models.PositiveIntegerField(default=0)
+    days_logged = models.PositiveSmallIntegerField(default=0)
+    calories = models.FloatField(default=0)
+    protein = models.FloatField(default=0)
+    carbs = models.FloatField(default=0)
+    fats = models.FloatField(default=0)
+    fiber = models.FloatField(default=0)
+
+    class Meta:
+        ordering = ['-month']
+        unique_together = ['user', 'month']
+
+    def __str__(self):
+        return f"{self.user.username} - {self.month:%Y-%m}: {self.meals} meals"
+
+class FrequentFood(models.Model):
+    """A food the user has logged before, with its last nutrition values.
+
+    rank is a forward-decayed frequency: every log adds 2 ** (t / half_life)
+    in log2 space (see core.foods), so ordering by rank alone orders by
+    recency-weighted frequency without rescoring old rows.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='frequent_foods')
+    name_key = models.CharField(max_length=200, help_text="Case- and space-normalised food name")
+    food_name = models.CharField(max_length=200)
+    meal_type = models.CharField(max_length=20, choices=MealLog.MEAL_TYPES)
+    calories = models.FloatField(default=0)
+    protein = models.FloatField(default=0)
+    carbs = models.FloatField(default=0)
+    fats = models.FloatField(default=0)
+    fiber = models.FloatField(default=0)
+    serving_size = models.CharField(max_length=100, default="1 serving")
+    times_logged = models.PositiveIntegerField(default=0)
+    rank = models.FloatField(default=0)
+    last_logged_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-rank']
+        unique_together = ['user', 'name_key']
+        indexes = [models.Index(fields=['user', '-rank'], name='frequentfood_user_rank')]
+
+    def __str__(self):
+        return f"{self.food_name} - {self.user.username} x{self.times_logged}"
+
 class WeightLog(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='weight_logs')
     weight = models.FloatField(help_text="Weight in kg")
@@ -56,6 +134,32 @@ class DietPlan(models.Model):
     def __str__(self):
         return f"{self.name} - {self.user.username}"
 
+class AdherenceScore(models.Model):
+    """Nightly-computed diet adherence for one user and one day or ISO week."""
+    PERIODS = [
+        ('day', 'Day'),
+        ('week', 'Week'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='adherence_scores')
+    period = models.CharField(max_length=4, choices=PERIODS)
+    start = models.DateField(help_text="The day, or the Monday the week starts on")
+    days_logged = models.PositiveSmallIntegerField(default=1)
+    calories = models.FloatField(default=0, help_text="Average daily calories over logged days")
+    protein = models.FloatField(default=0)
+    carbs = models.FloatField(default=0)
+    fats = models.FloatField(default=0)
+    target_calories = models.FloatField(default=0)
+    score = models.FloatField(help_text="0-100, average of the daily scores for weeks")
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-start']
+        unique_together = ['user', 'period', 'start']
+
+    def __str__(self):
+        return f"{self.user.username} - {self.period} of {self.start}: {self.score:.0f}%"
+
 class Quiz(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField()
@@ -114,3 +218,73 @@ class HealthQuote(models.Model):
 
     def __str__(self):
         return f'"{self.quote[:50]}..." - {self.author}'
+
+class AccountDeletion(models.Model):
+    """A disabled account whose rows and files purge_accounts removes in batches.
+
+    Not a foreign key: the record outlives the User row it tracks, so a
+    crashed purge can resume and a finished one leaves an audit trail.
+    """
+    account_id = models.BigIntegerField(unique=True)
+    username = models.CharField(max_length=150)
+    stage = models.CharField(max_length=50, blank=True, help_text='Model currently being purged')
+    deleted_rows = models.PositiveIntegerField(default=0)
+    deleted_files = models.PositiveIntegerField(default=0)
+    requested_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['requested_at']
+
+    def __str__(self):
+        state = 'purged' if self.finished_at else (self.stage or 'pending')
+        return f'{self.username} ({state})'
+
+class SyncChange(models.Model):
+    """The latest change to one synced row, for delta sync clients.
+
+    Each object keeps a single row that is replaced on every change, so
+    the auto-increment id doubles as the change sequence number and a
+    sync returns each changed object once however often it changed.
+    """
+    KINDS = [
+        ('meal', 'Meal'),
+        ('weight', 'Weight'),
+        ('quiz_result', 'Quiz result'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sync_changes')
+    kind = models.CharField(max_length=20, choices=KINDS)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='syncchange_object'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'id'], name='syncchange_user_seq'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} {'deleted' if self.deleted else 'changed'} (#{self.id})"
+
+class FoodImageFeature(models.Model):
+    """Colour/texture features of a labeled meal photo, for the local recognizer.
+
+    meal_id is not a foreign key: archived meals keep their photos and
+    labels, so their features stay in the index (see core.recognizer).
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='food_image_features')
+    meal_id = models.BigIntegerField(unique=True)
+    food_name = models.CharField(max_length=200)
+    vector = models.BinaryField(help_text="float32 feature vector, L2-normalised")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'id'], name='foodfeature_user_seq')]
+
+    def __str__(self):
+        return f"{self.food_name} (meal {self.meal_id})"
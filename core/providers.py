@@ -0,0 +1,237 @@
+"""External providers that name the food in a photo.
+
+settings.RECOGNITION_PROVIDERS lists them in the order analyze_food tries
+them after the local recognizer; one without an API key is left out.
+Each worker builds its clients once (gunicorn's post_fork hook calls
+warm(); the dev server builds them on first use) and reuses them, so calls
+ride the client's pooled keep-alive connections instead of paying a new
+TLS handshake per photo. An SDK is imported only when its provider is
+configured.
+"""
+import base64
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .telemetry import record_call, record_sizes
+
+logger = logging.getLogger('vitaltrack.providers')
+
+PROMPT = ('Name the main food or dish in this photo in a few words, for example "chicken caesar salad". '
+          'Reply with the name only, or "unknown" if there is no food in it.')
+MAX_OUTPUT_TOKENS = 20
+UNKNOWN_ANSWERS = {'', 'unknown', 'none', 'n/a', 'no food'}
+
+
+class ProviderError(Exception):
+    def __init__(self, status, message=''):
+        super().__init__(message or f'HTTP {status}')
+        self.status = status
+
+
+def clean_answer(text):
+    """The food name in a model's reply, or None when it saw no food."""
+    lines = (text or '').strip().splitlines()
+    name = lines[0].strip().strip('"\'.*').strip() if lines else ''
+    return None if name.lower() in UNKNOWN_ANSWERS else name[:100]
+
+
+def _status(exc):
+    status = getattr(exc, 'status', None) or getattr(exc, 'status_code', None) or getattr(exc, 'code', None)
+    return str(status) if isinstance(status, int) else 'error'
+
+
+def _timed_out(exc):
+    # Every SDK has its own timeout class; they all say so in the name.
+    while exc is not None:
+        if isinstance(exc, TimeoutError) or 'Timeout' in type(exc).__name__:
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+class Provider:
+    """One configured provider. Subclasses build a client and make one call."""
+
+    def __init__(self, name, api_key, model='', base_url=None, timeout=10.0, max_retries=0, pool_size=4,
+                 input_cost_per_mtok=0.0, output_cost_per_mtok=0.0, cost_per_call=0.0):
+        self.name = name
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.pool_size = pool_size
+        self.input_cost_per_mtok = input_cost_per_mtok
+        self.output_cost_per_mtok = output_cost_per_mtok
+        self.cost_per_call = cost_per_call
+        self.client = None
+        self._lock = threading.Lock()
+
+    def connect(self):
+        """The provider's client, built on first use and then reused."""
+        if self.client is None:
+            with self._lock:
+                if self.client is None:
+                    self.client = self.build_client()
+        return self.client
+
+    def http_options(self):
+        """httpx.Client options for SDK clients: the pool size, plus a hook recording payload sizes."""
+        import httpx
+
+        limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+        return {'limits': limits, 'event_hooks': {'response': [self._record_sizes]}}
+
+    def _record_sizes(self, response):
+        # Response hooks run before the body is read; the SDKs read it right after anyway.
+        response.read()
+        record_sizes(self.name, response.request.content, response.content)
+
+    def cost(self, input_tokens, output_tokens):
+        return (self.cost_per_call + input_tokens * self.input_cost_per_mtok / 1e6
+                + output_tokens * self.output_cost_per_mtok / 1e6)
+
+    def recognize(self, image, mime_type='image/jpeg'):
+        """The food name in image bytes, or None. Records latency, status and cost."""
+        client = self.connect()
+        started = time.perf_counter()
+        try:
+            text, input_tokens, output_tokens = self.call(client, image, mime_type)
+        except Exception as exc:
+            record_call(self.name, time.perf_counter() - started, 'timeout' if _timed_out(exc) else _status(exc))
+            raise
+        record_call(self.name, time.perf_counter() - started, '200', self.cost(input_tokens, output_tokens))
+        return clean_answer(text)
+
+    def build_client(self):
+        raise NotImplementedError
+
+    def call(self, client, image, mime_type):
+        """(answer text, input tokens, output tokens) for one photo."""
+        raise NotImplementedError
+
+
+class ClarifaiProvider(Provider):
+    def build_client(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size))
+        session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size))
+        session.headers['Authorization'] = f'Key {self.api_key}'
+        return session
+
+    def call(self, client, image, mime_type):
+        url = f"{(self.base_url or 'https://api.clarifai.com').rstrip('/')}/v2/models/{self.model}/outputs"
+        payload = {'inputs': [{'data': {'image': {'base64': base64.b64encode(image).decode()}}}]}
+        response = client.post(url, json=payload, timeout=self.timeout)
+        record_sizes(self.name, response.request.body, response.content)
+        if response.status_code != 200:
+            raise ProviderError(response.status_code)
+        outputs = response.json().get('outputs') or [{}]
+        concepts = outputs[0].get('data', {}).get('concepts') or [{}]
+        return concepts[0].get('name', ''), 0, 0
+
+
+class OpenAIProvider(Provider):
+    def build_client(self):
+        import openai
+
+        return openai.OpenAI(api_key=self.api_key, base_url=self.base_url, timeout=self.timeout,
+                             max_retries=self.max_retries, http_client=openai.DefaultHttpxClient(**self.http_options()))
+
+    def call(self, client, image, mime_type):
+        data_url = f'data:{mime_type};base64,{base64.b64encode(image).decode()}'
+        response = client.chat.completions.create(
+            model=self.model,
+            messages=[{'role': 'user', 'content': [
+                {'type': 'text', 'text': PROMPT},
+                {'type': 'image_url', 'image_url': {'url': data_url, 'detail': 'low'}},
+            ]}],
+            max_completion_tokens=MAX_OUTPUT_TOKENS,
+        )
+        usage = response.usage
+        return (response.choices[0].message.content if response.choices else '',
+                usage.prompt_tokens if usage else 0, usage.completion_tokens if usage else 0)
+
+
+class GeminiProvider(Provider):
+    def build_client(self):
+        import httpx
+        from google import genai
+        from google.genai import types
+
+        options = types.HttpOptions(base_url=self.base_url, timeout=int(self.timeout * 1000),
+                                    httpx_client=httpx.Client(**self.http_options()))
+        return genai.Client(api_key=self.api_key, http_options=options)
+
+    def call(self, client, image, mime_type):
+        from google.genai import types
+
+        response = client.models.generate_content(
+            model=self.model,
+            contents=[types.Part.from_bytes(data=image, mime_type=mime_type), PROMPT],
+            config=types.GenerateContentConfig(max_output_tokens=MAX_OUTPUT_TOKENS),
+        )
+        usage = response.usage_metadata
+        return (response.text or '', (usage.prompt_token_count or 0) if usage else 0,
+                (usage.candidates_token_count or 0) if usage else 0)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def registry():
+    """This process's enabled providers, in the order they are tried."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                providers = []
+                for name, options in getattr(settings, 'RECOGNITION_PROVIDERS', {}).items():
+                    options = dict(options)
+                    if not options.get('api_key'):
+                        continue
+                    backend = import_string(options.pop('backend'))
+                    providers.append(backend(name, **options))
+                _registry = providers
+    return _registry
+
+
+def warm():
+    """Build every enabled provider's client now rather than on the first photo."""
+    for provider in registry():
+        try:
+            provider.connect()
+        except Exception:
+            logger.warning('Recognition provider %s could not start', provider.name, exc_info=True)
+    return registry()
+
+
+@receiver(setting_changed)
+def reset(setting=None, **kwargs):
+    global _registry
+    if setting in (None, 'RECOGNITION_PROVIDERS'):
+        with _registry_lock:
+            _registry = None
+
+
+def recognize(image, mime_type='image/jpeg'):
+    """(food name, provider name) from the first provider that names the photo, else (None, None)."""
+    for provider in registry():
+        try:
+            name = provider.recognize(image, mime_type)
+        except Exception:
+            logger.warning('%s recognition failed', provider.name, exc_info=True)
+            continue
+        if name:
+            return name, provider.name
+    return None, None
@@ -0,0 +1,95 @@
+"""Disable now, purge later: account deletion without a long write lock.
+
+Deleting a User cascades through every tracked row in one transaction,
+which for a long-time user holds SQLite's write lock for seconds.
+request_deletion() instead disables the account in one short update and
+queues an AccountDeletion; purge_accounts then removes the rows table by
+table in small batches. Each batch is its own transaction and records
+its progress on the AccountDeletion row, so an interrupted purge resumes
+exactly where it stopped. Stored files are released after the batch that
+dropped their last reference commits; anything a crash leaves behind is
+an orphan for gc_media.
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from accounts.models import UserProfile
+from .db import delete_rows
+from .models import (
+    AccountDeletion, AdherenceScore, ArchivedMealLog, DietPlan, FoodImageFeature, FrequentFood, MealLog,
+    MealMonthlySummary, QuizResult, SyncChange, WeightLog,
+)
+from .signals import FOOD_IMAGE_REFERENCES, release_file
+
+# (model, file fields) in purge order. Every model with a user foreign key
+# belongs here; the profile goes last because cached views key off it.
+PURGE_ORDER = [
+    (MealLog, ('food_image',)),
+    (ArchivedMealLog, ('food_image',)),
+    (MealMonthlySummary, ()),
+    (FrequentFood, ()),
+    (FoodImageFeature, ()),
+    (AdherenceScore, ()),
+    (WeightLog, ()),
+    (QuizResult, ()),
+    (DietPlan, ()),
+    (SyncChange, ()),
+    (UserProfile, ('avatar',)),
+]
+FILE_REFERENCES = {
+    'food_image': FOOD_IMAGE_REFERENCES,
+    'avatar': [(UserProfile, 'avatar')],
+}
+USER_STAGE = 'auth.user'
+STAGES = [model._meta.label_lower for model, _ in PURGE_ORDER] + [USER_STAGE]
+
+
+def request_deletion(user):
+    """Disable the account at once and queue its data for purge_accounts."""
+    with transaction.atomic():
+        user.is_active = False
+        # Frees the address for a new sign-up straight away.
+        user.email = ''
+        user.set_unusable_password()
+        user.save(update_fields=['is_active', 'email', 'password'])
+        deletion, _ = AccountDeletion.objects.get_or_create(
+            account_id=user.pk, defaults={'username': user.username})
+    return deletion
+
+
+def purge_batch(deletion, batch_size):
+    """Remove up to batch_size rows of the current stage; False once the account is gone."""
+    stage = deletion.stage or STAGES[0]
+    released = []
+    with transaction.atomic():
+        if stage == USER_STAGE:
+            # Only admin log entries and group memberships are left to cascade.
+            User.objects.filter(pk=deletion.account_id).delete()
+            deletion.stage = ''
+            deletion.finished_at = timezone.now()
+            deletion.save(update_fields=['stage', 'finished_at', 'updated_at'])
+            return False
+
+        model, file_fields = PURGE_ORDER[STAGES.index(stage)]
+        rows = list(
+            model.objects.filter(user_id=deletion.account_id)
+            .order_by('pk').values_list('pk', *file_fields)[:batch_size]
+        )
+        if rows:
+            delete_rows(model, [row[0] for row in rows])
+            for row in rows:
+                for field_name, name in zip(file_fields, row[1:]):
+                    if name:
+                        released.append((model._meta.get_field(field_name).storage, name, field_name))
+        deletion.deleted_rows += len(rows)
+        deletion.stage = stage if len(rows) == batch_size else STAGES[STAGES.index(stage) + 1]
+        deletion.save(update_fields=['stage', 'deleted_rows', 'updated_at'])
+
+    # Shared content-addressed files survive while another row points at them.
+    files = sum(release_file(storage, name, FILE_REFERENCES[field]) for storage, name, field in set(released))
+    if files:
+        AccountDeletion.objects.filter(pk=deletion.pk).update(deleted_files=F('deleted_files') + files)
+        deletion.deleted_files += files
+    return True
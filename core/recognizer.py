@@ -0,0 +1,194 @@
+"""Offline food recognition from the user's own labeled meal photos.
+
+Every meal saved with a photo gets a compact feature vector: a joint
+hue/saturation/value histogram, a coarse colour layout and gradient
+(texture) histograms, 256 float32 values in all. A new photo is matched
+against the user's vectors with one matrix-vector product. Only a close
+nearest neighbour that also clearly beats every differently-labeled one
+is trusted; anything else falls through to the external provider.
+
+Each worker caches a user's index in memory and refreshes it
+incrementally. One aggregate query per lookup reveals new or deleted
+features, and only rows newer than the cached ones are read.
+"""
+import io
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+
+from .foods import name_key
+from .models import FoodImageFeature
+from .telemetry import RECOGNIZER_LATENCY
+
+logger = logging.getLogger('vitaltrack.recognizer')
+
+SIZE = 64
+HUE_BINS, SAT_BINS, VAL_BINS = 12, 4, 4
+GRID = 4
+GREY_SATURATION, GREY_WEIGHT = 40, 0.1
+TEXTURE_BINS = 8
+# Relative weight of each block in the final vector.
+BLOCK_WEIGHTS = {'colour': 1.0, 'layout': 0.5, 'texture': 0.7}
+DIMENSIONS = HUE_BINS * SAT_BINS * VAL_BINS + GRID * GRID * 3 + TEXTURE_BINS * 2
+
+DEFAULTS = {
+    'min_similarity': 0.95,   # cosine similarity to the nearest labeled photo
+    'min_margin': 0.02,       # lead over the nearest photo with another label
+    'max_per_user': 2000,     # newest photos kept in a user's index
+    'cached_users': 256,      # user indexes kept in each worker
+}
+_MAGNITUDE_EDGES = np.array([0, 0.02, 0.04, 0.07, 0.1, 0.15, 0.22, 0.35, np.inf], dtype=np.float32)
+
+
+def config(name):
+    return getattr(settings, 'LOCAL_RECOGNIZER', {}).get(name, DEFAULTS[name])
+
+
+def _unit(block, weight):
+    norm = np.linalg.norm(block)
+    return block * (weight / norm) if norm else block
+
+
+def extract_features(source):
+    """The feature vector of an image file or file-like object."""
+    from PIL import Image
+
+    with Image.open(source) as image:
+        # JPEGs decode straight at a fraction of their size.
+        image.draft('RGB', (SIZE * 2, SIZE * 2))
+        image = image.convert('RGB').resize((SIZE, SIZE), Image.Resampling.BILINEAR)
+        hsv = np.asarray(image.convert('HSV'), dtype=np.int32)
+    rgb = np.asarray(image, dtype=np.float32) / 255
+
+    # Square roots turn histogram dot products into Hellinger similarity.
+    bins = (hsv[..., 0] * HUE_BINS // 256) * SAT_BINS * VAL_BINS \
+        + (hsv[..., 1] * SAT_BINS // 256) * VAL_BINS + hsv[..., 2] * VAL_BINS // 256
+    # Plates, tables and glare are unsaturated; let the food's colours dominate.
+    weights = np.where(hsv[..., 1] < GREY_SATURATION, GREY_WEIGHT, 1.0).ravel()
+    colour = np.sqrt(np.bincount(bins.ravel(), weights=weights, minlength=HUE_BINS * SAT_BINS * VAL_BINS)
+                     .astype(np.float32))
+
+    cell = SIZE // GRID
+    layout = rgb.reshape(GRID, cell, GRID, cell, 3).mean(axis=(1, 3)).ravel()
+
+    grey = rgb @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    dx, dy = grey[:-1, 1:] - grey[:-1, :-1], grey[1:, :-1] - grey[:-1, :-1]
+    magnitude = np.hypot(dx, dy).ravel()
+    strength = np.histogram(magnitude, bins=_MAGNITUDE_EDGES)[0].astype(np.float32)
+    angle = (np.arctan2(dy, dx).ravel() % np.pi) / np.pi
+    orientation = np.bincount(np.minimum((angle * TEXTURE_BINS).astype(np.int32), TEXTURE_BINS - 1),
+                              weights=magnitude, minlength=TEXTURE_BINS).astype(np.float32)
+    texture = np.concatenate([np.sqrt(strength), np.sqrt(orientation)])
+
+    vector = np.concatenate([
+        _unit(colour, BLOCK_WEIGHTS['colour']),
+        _unit(layout, BLOCK_WEIGHTS['layout']),
+        _unit(texture, BLOCK_WEIGHTS['texture']),
+    ]).astype(np.float32)
+    return _unit(vector, 1.0)
+
+
+def index_meal(meal):
+    """Add or refresh one photographed meal in its owner's index."""
+    if not meal.food_image or not name_key(meal.food_name):
+        return False
+    try:
+        with meal.food_image.open('rb') as image:
+            vector = extract_features(image)
+    except Exception:
+        # Unreadable photos are simply not indexed.
+        logger.warning('Could not index the photo for meal %s', meal.pk, exc_info=True)
+        return False
+    # A fresh row (and id) rather than an update, so cached indexes notice relabels.
+    with transaction.atomic():
+        FoodImageFeature.objects.filter(meal_id=meal.pk).delete()
+        FoodImageFeature.objects.create(
+            user_id=meal.user_id, meal_id=meal.pk, food_name=meal.food_name, vector=vector.tobytes())
+    return True
+
+
+def _matrix(rows):
+    return np.frombuffer(b''.join(bytes(vector) for _, _, vector in rows), dtype=np.float32).reshape(-1, DIMENSIONS)
+
+
+class UserIndex:
+    __slots__ = ('last_id', 'total', 'names', 'labels', 'matrix')
+
+    def __init__(self, last_id, total, names, matrix):
+        self.last_id, self.total = last_id, total
+        self.names = names
+        self.labels = np.array([name_key(name) for name in names], dtype=object)
+        self.matrix = matrix
+
+    def extended(self, last_id, total, rows, limit):
+        names = self.names + [name for _, name, _ in rows]
+        return UserIndex(last_id, total, names[-limit:], np.concatenate([self.matrix, _matrix(rows)])[-limit:])
+
+
+_indexes = OrderedDict()
+_lock = threading.Lock()
+
+
+def _rows(queryset):
+    return list(queryset.values_list('id', 'food_name', 'vector'))
+
+
+def user_index(user_id):
+    """The user's index, read from the database only where it changed."""
+    stats = FoodImageFeature.objects.filter(user_id=user_id).aggregate(last_id=Max('id'), total=Count('id'))
+    last_id, total = stats['last_id'] or 0, stats['total']
+    limit = config('max_per_user')
+    with _lock:
+        cached = _indexes.get(user_id)
+        if cached is not None:
+            _indexes.move_to_end(user_id)
+    if cached is not None and (cached.last_id, cached.total) == (last_id, total):
+        return cached
+
+    features = FoodImageFeature.objects.filter(user_id=user_id)
+    new = _rows(features.filter(id__gt=cached.last_id).order_by('id')) if cached is not None else None
+    if new is not None and cached.total + len(new) == total:
+        index = cached.extended(last_id, total, new, limit)
+    else:
+        # Something was deleted or relabeled in place; start over.
+        rows = _rows(features.order_by('-id')[:limit])[::-1]
+        index = UserIndex(last_id, total, [name for _, name, _ in rows], _matrix(rows))
+
+    with _lock:
+        _indexes[user_id] = index
+        _indexes.move_to_end(user_id)
+        while len(_indexes) > config('cached_users'):
+            _indexes.popitem(last=False)
+    return index
+
+
+def recognize(user, image):
+    """{'food_name', 'similarity', 'margin', 'confident'} for image bytes, or None."""
+    started = time.perf_counter()
+    try:
+        index = user_index(user.pk)
+        if not index.names:
+            return None
+        try:
+            vector = extract_features(io.BytesIO(image))
+        except Exception:
+            return None
+        similarities = index.matrix @ vector
+        best = int(np.argmax(similarities))
+        others = similarities[index.labels != index.labels[best]]
+        similarity = float(similarities[best])
+        margin = similarity - (float(others.max()) if others.size else 0.0)
+        return {
+            'food_name': index.names[best],
+            'similarity': round(similarity, 4),
+            'margin': round(margin, 4),
+            'confident': similarity >= config('min_similarity') and margin >= config('min_margin'),
+        }
+    finally:
+        RECOGNIZER_LATENCY.observe(time.perf_counter() - started)
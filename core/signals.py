@@ -0,0 +1,119 @@
+import os
+import time
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from accounts.models import UserProfile
+from .caching import bump_data_version, invalidate_namespace
+from .foods import forget_meals, record_meals
+from .models import ArchivedMealLog, FoodImageFeature, MealLog, WeightLog, Quiz, QuizQuestion, QuizResult
+from .recognizer import index_meal
+from .sync import record_instances
+
+# Files touched this recently may belong to an upload that is deduping onto
+# them right now; gc_media collects them later instead.
+RELEASE_GRACE_SECONDS = 60
+
+
+@receiver(post_save, sender=MealLog)
+@receiver(post_delete, sender=MealLog)
+@receiver(post_save, sender=WeightLog)
+@receiver(post_delete, sender=WeightLog)
+@receiver(post_save, sender=QuizResult)
+@receiver(post_delete, sender=QuizResult)
+def user_data_changed(sender, instance, **kwargs):
+    bump_data_version(instance.user_id)
+
+
+@receiver(post_save, sender=MealLog)
+@receiver(post_save, sender=WeightLog)
+@receiver(post_save, sender=QuizResult)
+def sync_changed(sender, instance, **kwargs):
+    record_instances([instance])
+
+
+@receiver(post_delete, sender=MealLog)
+@receiver(post_delete, sender=WeightLog)
+@receiver(post_delete, sender=QuizResult)
+def sync_deleted(sender, instance, origin=None, **kwargs):
+    # A deleted user takes their change feed with them; no tombstones needed.
+    if not _deleting_user(origin):
+        record_instances([instance], deleted=True)
+
+
+def _deleting_user(origin):
+    deleting = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return deleting is User
+
+
+@receiver(post_save, sender=MealLog)
+def index_food(sender, instance, created, **kwargs):
+    if created:
+        record_meals([instance])
+
+
+@receiver(post_delete, sender=MealLog)
+@receiver(post_delete, sender=ArchivedMealLog)
+def unindex_food(sender, instance, origin=None, **kwargs):
+    # A deleted user's FrequentFood rows cascade away with them.
+    if not _deleting_user(origin):
+        forget_meals([instance])
+
+
+@receiver(post_save, sender=MealLog)
+def index_food_image(sender, instance, **kwargs):
+    # Decoding the photo waits until the row (and its file) is committed.
+    if instance.food_image:
+        transaction.on_commit(lambda: index_meal(instance))
+
+
+@receiver(post_delete, sender=MealLog)
+def forget_food_image(sender, instance, **kwargs):
+    if instance.food_image:
+        FoodImageFeature.objects.filter(meal_id=instance.pk).delete()
+
+
+@receiver(post_save, sender=Quiz)
+@receiver(post_delete, sender=Quiz)
+@receiver(post_save, sender=QuizQuestion)
+@receiver(post_delete, sender=QuizQuestion)
+def quiz_content_changed(sender, instance, **kwargs):
+    invalidate_namespace('quiz')
+
+
+@receiver(post_save, sender=UserProfile)
+def profile_changed(sender, instance, **kwargs):
+    bump_data_version(instance.user_id)
+    # Keep the in-memory instance in step with the row we just bumped.
+    instance.data_version += 1
+
+
+# Every (model, field) that may point at a stored food image.
+FOOD_IMAGE_REFERENCES = [(MealLog, 'food_image'), (ArchivedMealLog, 'food_image')]
+
+
+def release_file(storage, name, references):
+    """Delete a content-addressed file once no row in `references` points at it."""
+    for model, field_name in references:
+        if model.objects.filter(**{field_name: name}).exists():
+            return False
+    try:
+        if time.time() - os.path.getmtime(storage.path(name)) < RELEASE_GRACE_SECONDS:
+            return False
+    except FileNotFoundError:
+        return False
+    storage.delete(name)
+    return True
+
+
+@receiver(post_delete, sender=MealLog)
+@receiver(post_delete, sender=ArchivedMealLog)
+def release_food_image(sender, instance, **kwargs):
+    name = instance.food_image.name
+    if name:
+        storage = instance.food_image.storage
+        transaction.on_commit(lambda: release_file(storage, name, FOOD_IMAGE_REFERENCES))
@@ -0,0 +1,258 @@
+import gzip
+import hashlib
+import os
+import posixpath
+import re
+import uuid
+
+import brotli
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.map')
+COMPRESS_MIN_SIZE = 256
+
+# Comments and quoted strings; strings are copied verbatim, comments dropped.
+_CSS_TOKENS = re.compile(r'/\*.*?\*/|"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'', re.S)
+_CSS_SPACE = re.compile(r'\s+')
+_CSS_PUNCT = re.compile(r'\s*([{};,>])\s*')
+_CSS_COLON = re.compile(r':\s+')
+
+
+def _minify_css_code(code):
+    code = _CSS_SPACE.sub(' ', code)
+    code = _CSS_PUNCT.sub(r'\1', code)
+    # Only strip whitespace *after* colons: "a :hover" and "a:hover" differ.
+    return _CSS_COLON.sub(':', code).replace(';}', '}')
+
+
+def minify_css(source):
+    """Collapse whitespace and drop comments outside quoted strings.
+
+    Spaces inside calc() and other values are kept (collapsed to one), so
+    "calc(100% - 2px)" survives; only space around { } ; , > and after a
+    colon goes.
+    """
+    out, code, last = [], [], 0
+    for match in _CSS_TOKENS.finditer(source):
+        code.append(source[last:match.start()])
+        last = match.end()
+        if not match.group().startswith('/*'):
+            out.extend([_minify_css_code(''.join(code)), match.group()])
+            code = []
+    code.append(source[last:])
+    out.append(_minify_css_code(''.join(code)))
+    return ''.join(out).strip()
+
+
+# A '/' after one of these starts a regex literal rather than a division.
+_REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+_REGEX_KEYWORDS = {
+    'return', 'typeof', 'instanceof', 'in', 'of', 'new', 'delete', 'void', 'throw', 'case', 'do', 'else',
+    'yield', 'await',
+}
+_TRAILING_WORD = re.compile(r'[A-Za-z_$][\w$]*$')
+
+
+def _string_end(source, i):
+    """Index just past the string or template literal starting at source[i]."""
+    quote, j, n = source[i], i + 1, len(source)
+    while j < n and source[j] != quote:
+        if source[j] == '\\':
+            j += 2
+        elif quote == '`' and source.startswith('${', j):
+            j = _expression_end(source, j + 2)
+        else:
+            j += 1
+    return j + 1
+
+
+def _expression_end(source, i):
+    """Index just past the } closing a template literal's ${ expression."""
+    depth, n = 1, len(source)
+    while i < n:
+        ch = source[i]
+        if ch in '"\'`':
+            i = _string_end(source, i)
+            continue
+        if ch == '{':
+            depth += 1
+        elif ch == '}':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return n
+
+
+def _regex_allowed(out):
+    tail = ''.join(out[-24:]).rstrip()
+    if not tail:
+        return True
+    if tail[-1] in _REGEX_PRECEDERS:
+        # "i++ / 2" divides.
+        return tail[-2:] not in ('++', '--')
+    word = _TRAILING_WORD.search(tail)
+    return word is not None and word.group() in _REGEX_KEYWORDS
+
+
+def minify_js(source):
+    """Conservative JS minifier: drops comments, indentation and blank lines.
+
+    Strings, template literals (including nested ${...} expressions) and
+    regex literals are copied verbatim and newlines are kept so automatic
+    semicolon insertion is unaffected.
+    """
+    out = []
+    i, n = 0, len(source)
+    at_line_start = True
+    while i < n:
+        ch = source[i]
+        nxt = source[i + 1] if i + 1 < n else ''
+        if ch in '"\'`':
+            j = _string_end(source, i)
+            out.append(source[i:j])
+            i = j
+            at_line_start = False
+        elif ch == '/' and nxt == '/':
+            while i < n and source[i] != '\n':
+                i += 1
+        elif ch == '/' and nxt == '*':
+            end = source.find('*/', i + 2)
+            i = n if end == -1 else end + 2
+        elif ch == '/' and _regex_allowed(out):
+            j, in_class = i + 1, False
+            while j < n and (in_class or source[j] != '/') and source[j] != '\n':
+                if source[j] == '\\':
+                    j += 1
+                elif source[j] == '[':
+                    in_class = True
+                elif source[j] == ']':
+                    in_class = False
+                j += 1
+            j += 1
+            while j < n and source[j].isalpha():
+                j += 1
+            out.append(source[i:j])
+            i = j
+            at_line_start = False
+        elif ch == '\n':
+            while out and out[-1] in (' ', '\t'):
+                out.pop()
+            if not at_line_start:
+                out.append('\n')
+            at_line_start = True
+            i += 1
+        elif ch in ' \t\r':
+            if not at_line_start and out and out[-1] not in (' ', '\n'):
+                out.append(' ')
+            i += 1
+        else:
+            out.append(ch)
+            at_line_start = False
+            i += 1
+    return ''.join(out).strip() + '\n'
+
+
+MINIFIERS = {
+    '.css': minify_css,
+    '.js': minify_js,
+}
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Content-hashed static files that are also minified and precompressed.
+
+    collectstatic writes ``name.<hash>.ext`` plus ``.gz`` and ``.br`` siblings,
+    which StaticFilesMiddleware picks from according to Accept-Encoding.
+    """
+
+    def _save(self, name, content):
+        for ext, minify in MINIFIERS.items():
+            if name.endswith(ext) and '.min.' not in name:
+                content.seek(0)
+                source = content.read()
+                if isinstance(source, bytes):
+                    source = source.decode('utf-8')
+                content = ContentFile(minify(source).encode('utf-8'))
+                break
+        return super()._save(name, content)
+
+    def post_process(self, *args, **kwargs):
+        for name, hashed_name, processed in super().post_process(*args, **kwargs):
+            if hashed_name and not isinstance(processed, Exception):
+                self.compress(hashed_name)
+            yield name, hashed_name, processed
+
+    def compress(self, name):
+        if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+            return
+        with self.open(name) as f:
+            data = f.read()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return
+        variants = {
+            '.gz': gzip.compress(data, compresslevel=9, mtime=0),
+            '.br': brotli.compress(data, quality=11),
+        }
+        for suffix, compressed in variants.items():
+            if len(compressed) >= len(data):
+                continue
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            super()._save(name + suffix, ContentFile(compressed))
+
+
+@deconstructible(path='core.storage.ContentAddressedStorage')
+class ContentAddressedStorage(FileSystemStorage):
+    """Store files under the SHA-256 of their bytes so identical uploads share one file.
+
+    ``food_images/food_12.jpg`` is saved as ``food_images/ab/cd/abcd....jpg``.
+    Saving bytes that are already stored writes nothing and returns the
+    existing name; the file is released once no row references it (see
+    core.signals.release_food_image and the gc_media command).
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = ContentFile(content)
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        sha = digest.hexdigest()
+        ext = os.path.splitext(name)[1].lower()
+        directory = posixpath.dirname(name.replace('\\', '/'))
+        name = posixpath.join(directory, sha[:2], sha[2:4], sha + ext)
+        return super().save(name, content, max_length=max_length)
+
+    def get_available_name(self, name, max_length=None):
+        # The name is derived from the content, so an existing file is the
+        # same file: reuse it instead of inventing a suffixed copy.
+        return name
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            # Refresh mtime so a concurrent release or gc_media sees it as in use.
+            os.utime(full_path)
+            return name
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        tmp_path = f'{full_path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'wb') as f:
+            for chunk in content.chunks():
+                f.write(chunk)
+        # Two writers racing on the same digest write identical bytes, so
+        # whichever replace lands last is equally correct.
+        os.replace(tmp_path, full_path)
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+        return name
+
+
+food_image_storage = ContentAddressedStorage()
@@ -0,0 +1,121 @@
+"""Delta sync for offline-capable clients.
+
+Every save or delete of a MealLog, WeightLog or QuizResult replaces that
+object's SyncChange row, so the row's auto-increment id is a per-object
+"last changed at" sequence number and a deleted object leaves a
+tombstone. A client keeps the token from its last sync and asks for
+everything since it; the answer costs one index range scan plus one
+query per kind on the page, however long the user's history is.
+
+Ids only grow (SQLite AUTOINCREMENT) and SQLite commits one writer at a
+time, so a row with a lower id can never become visible after a client
+has already read past it.
+"""
+import base64
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedMealLog, MealLog, QuizResult, SyncChange, WeightLog
+
+MEAL_FIELDS = ('id', 'logged_at', 'date', 'meal_type', 'food_name', 'serving_size',
+               'calories', 'protein', 'carbs', 'fats', 'fiber', 'food_image')
+# kind -> (models to look the row up in, fields returned to clients)
+SYNCED = {
+    'meal': ((MealLog, ArchivedMealLog), MEAL_FIELDS),
+    'weight': ((WeightLog,), ('id', 'date', 'weight', 'notes')),
+    'quiz_result': ((QuizResult,), ('id', 'quiz_id', 'score', 'total_questions', 'percentage', 'completed_at')),
+}
+KIND_BY_MODEL = {MealLog: 'meal', WeightLog: 'weight', QuizResult: 'quiz_result'}
+DEFAULT_LIMIT = 200
+MAX_LIMIT = 1000
+RECORD_BATCH = 500
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+def encode_token(seq):
+    return base64.urlsafe_b64encode(f'v1:{seq}'.encode()).decode().rstrip('=')
+
+
+def decode_token(token):
+    """The sequence number a token stands for; 0 (everything) for an empty token."""
+    if not token:
+        return 0
+    try:
+        version, seq = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode().split(':')
+        if version != 'v1':
+            raise ValueError(version)
+        return int(seq)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidToken('Invalid sync token.')
+
+
+def record_changes(kind, pairs, deleted=False):
+    """Move these (user_id, object_id) pairs to the head of their users' change feeds."""
+    owners = {object_id: user_id for user_id, object_id in pairs}
+    if not owners:
+        return
+    changed_at = timezone.now()
+    object_ids = list(owners)
+    with transaction.atomic(savepoint=False):
+        for start in range(0, len(object_ids), RECORD_BATCH):
+            batch = object_ids[start:start + RECORD_BATCH]
+            # The previous entry goes and a fresh row takes the next id. An
+            # upsert would keep the old id, and clients already past it would
+            # never see this change.
+            SyncChange.objects.filter(kind=kind, object_id__in=batch).delete()
+            SyncChange.objects.bulk_create([
+                SyncChange(user_id=owners[object_id], kind=kind, object_id=object_id, deleted=deleted,
+                           changed_at=changed_at)
+                for object_id in batch
+            ])
+
+
+def record_instances(instances, deleted=False):
+    """record_changes() for saved model instances of any synced model."""
+    by_kind = {}
+    for instance in instances:
+        by_kind.setdefault(KIND_BY_MODEL[type(instance)], []).append((instance.user_id, instance.pk))
+    for kind, pairs in by_kind.items():
+        record_changes(kind, pairs, deleted)
+
+
+def _rows(kind, ids):
+    models, fields = SYNCED[kind]
+    rows = {}
+    for model in models:
+        missing = [pk for pk in ids if pk not in rows]
+        if not missing:
+            break
+        for row in model.objects.filter(id__in=missing).values(*fields):
+            rows[row['id']] = row
+    return rows
+
+
+def changes_since(user, seq, limit=DEFAULT_LIMIT):
+    """(changes, next token, has_more) for the changes after seq, oldest first."""
+    entries = list(
+        SyncChange.objects.filter(user=user, id__gt=seq).order_by('id')
+        .values_list('id', 'kind', 'object_id', 'deleted')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    wanted = {}
+    for _, kind, object_id, deleted in entries:
+        if not deleted:
+            wanted.setdefault(kind, []).append(object_id)
+    rows = {kind: _rows(kind, ids) for kind, ids in wanted.items()}
+
+    changes = []
+    for _, kind, object_id, deleted in entries:
+        row = None if deleted else rows[kind].get(object_id)
+        if row is None:
+            changes.append({'type': kind, 'id': object_id, 'op': 'delete'})
+        else:
+            changes.append({'type': kind, 'id': object_id, 'op': 'upsert', 'data': row})
+    next_seq = entries[-1][0] if entries else seq
+    return changes, encode_token(next_seq), has_more
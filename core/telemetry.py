@@ -0,0 +1,112 @@
+"""Telemetry for outbound nutrition/recognition provider calls."""
+import time
+
+from .metrics import SIZE_BUCKETS, registry
+
+PROVIDER_LATENCY = registry.histogram(
+    'vitaltrack_provider_request_duration_seconds', 'Outbound provider call latency', ('provider',))
+PROVIDER_RESPONSES = registry.counter(
+    'vitaltrack_provider_responses_total', 'Provider calls by HTTP status, timeout or error', ('provider', 'status'))
+PROVIDER_TIMEOUTS = registry.counter(
+    'vitaltrack_provider_timeouts_total', 'Provider calls that timed out', ('provider',))
+PROVIDER_REQUEST_BYTES = registry.histogram(
+    'vitaltrack_provider_request_bytes', 'Provider request body size', ('provider',), buckets=SIZE_BUCKETS)
+PROVIDER_RESPONSE_BYTES = registry.histogram(
+    'vitaltrack_provider_response_bytes', 'Provider response body size', ('provider',), buckets=SIZE_BUCKETS)
+NUTRITION_TIER = registry.counter(
+    'vitaltrack_nutrition_tier_total', 'Which tier answered a nutrition lookup', ('tier',))
+RECOGNITION_TIER = registry.counter(
+    'vitaltrack_recognition_tier_total', 'Which tier named the food in a photo', ('tier',))
+PROVIDER_COST = registry.counter(
+    'vitaltrack_provider_cost_usd_total', 'Estimated spend on provider calls in US dollars', ('provider',))
+RECOGNIZER_LATENCY = registry.histogram(
+    'vitaltrack_local_recognizer_duration_seconds', 'Local photo recognizer latency', ())
+
+# Tiers analyze_food can answer a nutrition lookup from, cheapest first.
+NUTRITION_TIERS = ('recent_food', 'cache', 'edamam', 'api_ninjas', 'fallback')
+# Tiers that can name the food in a photo, cheapest first; 'none' means manual entry.
+RECOGNITION_TIERS = ('local', 'clarifai', 'openai', 'gemini', 'none')
+
+
+def call_provider(provider, method, url, **kwargs):
+    """requests.request() that records latency, status, timeouts and payload sizes."""
+    import requests
+
+    started = time.perf_counter()
+    try:
+        response = requests.request(method, url, **kwargs)
+    except requests.Timeout:
+        PROVIDER_TIMEOUTS.inc(provider)
+        PROVIDER_RESPONSES.inc(provider, 'timeout')
+        raise
+    except requests.RequestException:
+        PROVIDER_RESPONSES.inc(provider, 'error')
+        raise
+    finally:
+        PROVIDER_LATENCY.observe(time.perf_counter() - started, provider)
+
+    PROVIDER_RESPONSES.inc(provider, str(response.status_code))
+    record_sizes(provider, response.request.body, response.content)
+    return response
+
+
+def record_sizes(provider, request_body, response_body):
+    """Record the body sizes of one provider exchange (bytes, str or None)."""
+    PROVIDER_REQUEST_BYTES.observe(len(request_body) if request_body else 0, provider)
+    PROVIDER_RESPONSE_BYTES.observe(len(response_body) if response_body else 0, provider)
+
+
+def record_call(provider, seconds, status, cost_usd=0.0):
+    """Record a provider call made through an SDK client rather than call_provider()."""
+    PROVIDER_LATENCY.observe(seconds, provider)
+    PROVIDER_RESPONSES.inc(provider, status)
+    if status == 'timeout':
+        PROVIDER_TIMEOUTS.inc(provider)
+    if cost_usd:
+        PROVIDER_COST.inc(provider, amount=cost_usd)
+
+
+def record_tier(tier):
+    NUTRITION_TIER.inc(tier)
+
+
+def record_recognition(tier):
+    RECOGNITION_TIER.inc(tier)
+
+
+def summary():
+    """JSON-friendly view of the provider and tier counters of every worker."""
+    metrics = registry.collect()
+
+    def snapshot(metric):
+        return metrics[metric.name].snapshot()
+
+    providers = {}
+    for (provider,), (count, total) in snapshot(PROVIDER_LATENCY).items():
+        providers[provider] = {
+            'calls': count,
+            'avg_latency_ms': round(total / count * 1000, 1) if count else 0,
+            'statuses': {},
+            'timeouts': 0,
+            'request_bytes': 0,
+            'response_bytes': 0,
+            'cost_usd': 0.0,
+        }
+    for (provider, status), count in snapshot(PROVIDER_RESPONSES).items():
+        providers[provider]['statuses'][status] = count
+    for (provider,), count in snapshot(PROVIDER_TIMEOUTS).items():
+        providers[provider]['timeouts'] = count
+    for (provider,), (count, total) in snapshot(PROVIDER_REQUEST_BYTES).items():
+        providers[provider]['request_bytes'] = int(total)
+    for (provider,), (count, total) in snapshot(PROVIDER_RESPONSE_BYTES).items():
+        providers[provider]['response_bytes'] = int(total)
+    for (provider,), total in snapshot(PROVIDER_COST).items():
+        providers[provider]['cost_usd'] = round(total, 8)
+
+    tiers = {tier: 0 for tier in NUTRITION_TIERS}
+    for (tier,), count in snapshot(NUTRITION_TIER).items():
+        tiers[tier] = count
+    recognition = {tier: 0 for tier in RECOGNITION_TIERS}
+    for (tier,), count in snapshot(RECOGNITION_TIER).items():
+        recognition[tier] = count
+    return {'providers': providers, 'nutrition_tiers': tiers, 'recognition_tiers': recognition}
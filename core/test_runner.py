@@ -0,0 +1,30 @@
+"""Test runner that keeps the suite away from the development cache file."""
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """DiscoverRunner with the shared cache tier in a temporary SQLite file.
+
+    Tests clear the cache freely and must not read entries a dev server
+    left behind, so the 'shared' alias is pointed elsewhere for the run.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._cache_dir = tempfile.mkdtemp(prefix='vitaltrack-cache-')
+        path = str(Path(self._cache_dir) / 'cache.sqlite3')
+        caches = {alias: dict(config) for alias, config in settings.CACHES.items()}
+        caches['shared']['LOCATION'] = path
+        self._cache_settings = override_settings(CACHES=caches, CACHE_L2_PATH=path)
+        self._cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._cache_settings.disable()
+        shutil.rmtree(self._cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
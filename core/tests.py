@@ -1,3 +1,1531 @@
-from django.test import TestCase
+import base64
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+from datetime import date, timedelta
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connections
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+import main
+from accounts.models import UserProfile
+from .models import (
+    AccountDeletion, AdherenceScore, ArchivedMealLog, DietPlan, FoodImageFeature, FrequentFood, MealLog,
+    MealMonthlySummary, Quiz, QuizQuestion, SyncChange, WeightLog,
+)
+from . import (
+    api, archive, caching, dashboard, foods, metrics, providers, purge, recognizer, storage, sync, telemetry,
+    throttle, trends, views, weights, writebehind,
+)
+from . import media as media_module
+from .cache_backends import TieredCache
+
+
+class ConditionalApiTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alex', 'alex@example.com', 'pw')
+        UserProfile.objects.create(user=self.user)
+        MealLog.objects.create(user=self.user, meal_type='lunch', food_name='Rice', calories=200)
+        self.client.force_login(self.user)
+
+    def test_json_endpoints_send_validators(self):
+        for name in ('nutrition_data', 'progress_data'):
+            response = self.client.get(reverse(name))
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response['ETag'].startswith('"'))
+            self.assertIn('Last-Modified', response)
+
+    def test_unchanged_user_gets_304_for_one_query(self):
+        factory = RequestFactory()
+        for name, view in (('nutrition_data', views.get_nutrition_data),
+                           ('progress_data', views.get_progress_data)):
+            etag = self.client.get(reverse(name))['ETag']
+            request = factory.get(reverse(name), HTTP_IF_NONE_MATCH=etag)
+            request.user = self.user
+            with self.assertNumQueries(1):
+                response = view(request)
+            self.assertEqual(response.status_code, 304)
+
+    def test_write_changes_etag(self):
+        etag = self.client.get(reverse('nutrition_data'))['ETag']
+        self.client.post(reverse('log_meal'), {'food_name': 'Apple', 'calories': '95'})
+        response = self.client.get(reverse('nutrition_data'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['calories'], 295.0)
+
+
+class DataVersionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('dana', 'dana@example.com', 'pw')
+        UserProfile.objects.create(user=self.user)
+        self.client.force_login(self.user)
+
+    def version(self):
+        return UserProfile.objects.get(user=self.user).data_version
+
+    def assertBumps(self, write):
+        before = self.version()
+        write()
+        self.assertGreater(self.version(), before)
+
+    def test_every_user_write_bumps_data_version(self):
+        quiz = Quiz.objects.create(title='Water', description='Hydration', category='nutrition')
+        question = QuizQuestion.objects.create(quiz=quiz, question_text='Daily glasses?', option_a='8',
+                                               option_b='2', option_c='0', option_d='20', correct_answer='a')
+        self.assertBumps(lambda: self.client.post(reverse('log_meal'), {'food_name': 'Toast', 'calories': '80'}))
+        meal = MealLog.objects.get(user=self.user)
+        self.assertBumps(lambda: self.client.post(reverse('delete_meal', args=[meal.id])))
+        self.assertBumps(lambda: self.client.post(reverse('log_weight'), {'weight': '70.5'}))
+        self.assertBumps(lambda: self.client.post(reverse('quiz_submit', args=[quiz.id]),
+                                                  {f'question_{question.id}': 'a'}))
+        self.assertBumps(lambda: self.client.post(reverse('settings'), {'daily_calorie_goal': '1800'}))
+
+    def test_dashboard_fragments_show_fresh_data_after_a_write(self):
+        self.assertContains(self.client.get(reverse('dashboard_home')), '<h4 id="mealsLogged">0</h4>')
+        self.client.post(reverse('log_meal'), {'food_name': 'Soup', 'calories': '250'})
+        response = self.client.get(reverse('dashboard_home'))
+        self.assertContains(response, '<h4 id="mealsLogged">1</h4>')
+        self.assertContains(response, '<h3 id="todayCalories">250')
+        self.assertEqual(self.client.get(reverse('dashboard_api')).json()['today']['calories'], 250)
+
+    def test_unchanged_client_gets_304_until_midnight(self):
+        etag = self.client.get(reverse('dashboard_api'))['ETag']
+        self.assertEqual(self.client.get(reverse('dashboard_api'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        real_datetime = caching.datetime
+
+        class Tomorrow(real_datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return real_datetime.now(tz) + timedelta(days=1)
+
+        with mock.patch('core.caching.datetime', Tomorrow):
+            response = self.client.get(reverse('dashboard_api'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class StaticMinifierTests(SimpleTestCase):
+    STATIC = Path(__file__).resolve().parent.parent / 'static'
+
+    def test_collectstatic_writes_gzip_and_brotli_variants(self):
+        with tempfile.TemporaryDirectory() as root, override_settings(STATIC_ROOT=root, STORAGES={
+            **settings.STORAGES, 'staticfiles': {'BACKEND': 'core.storage.CompressedManifestStaticFilesStorage'},
+        }):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            css = next(Path(root, 'css').glob('style.*.css'))
+            self.assertEqual(gzip.decompress(Path(f'{css}.gz').read_bytes()), css.read_bytes())
+            self.assertEqual(storage.brotli.decompress(Path(f'{css}.br').read_bytes()), css.read_bytes())
+
+    def test_css_strings_comments_and_calc(self):
+        source = (
+            '/* banner */\n.tag::before {\n    content: "a  {  b; }";\n    width: calc(100% - 2 * 8px);\n}\n'
+            '.quote::after { content: \'/* not a comment */\' ; font-family: "Open  Sans", serif; }\n'
+        )
+        self.assertEqual(storage.minify_css(source), (
+            '.tag::before{content:"a  {  b; }";width:calc(100% - 2 * 8px)}'
+            '.quote::after{content:\'/* not a comment */\';font-family:"Open  Sans",serif}'
+        ))
+
+    def test_js_regex_division_strings_and_templates(self):
+        source = (
+            'const a = b / c / d;  // halves\n'
+            'const re = /[/"]+\\/x/g, s = "// kept", t = \'/* kept */\';\n'
+            'function f(v) {\n    return /^\\d+$/.test(v) ? i++ / 2 : `n: ${v ? `${v} / x` : "-"}`;\n}\n'
+            '/* block\n comment */\nif (typeof v === "string") x = v.split(/,\\s*/);\n'
+        )
+        self.assertEqual(storage.minify_js(source), (
+            'const a = b / c / d;\n'
+            'const re = /[/"]+\\/x/g, s = "// kept", t = \'/* kept */\';\n'
+            'function f(v) {\nreturn /^\\d+$/.test(v) ? i++ / 2 : `n: ${v ? `${v} / x` : "-"}`;\n}\n'
+            'if (typeof v === "string") x = v.split(/,\\s*/);\n'
+        ))
+
+    def test_shipped_assets_survive_minification(self):
+        string = re.compile(r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'')
+        for path in sorted(self.STATIC.rglob('*.css')) + sorted(self.STATIC.rglob('*.js')):
+            source = path.read_text()
+            minify = storage.MINIFIERS[path.suffix]
+            minified = minify(source)
+            with self.subTest(path.name):
+                self.assertLess(len(minified), len(source))
+                self.assertEqual(minify(minified), minified)
+                self.assertEqual(minified.count('{'), minified.count('}'))
+                code_lines = (line for line in source.splitlines() if not line.lstrip().startswith(('//', '/*', '*')))
+                for literal in string.findall('\n'.join(code_lines)):
+                    self.assertIn(literal, minified)
+
+    @unittest.skipUnless(shutil.which('node'), 'node is not installed')
+    def test_shipped_js_still_parses(self):
+        for path in sorted(self.STATIC.rglob('*.js')):
+            with tempfile.NamedTemporaryFile('w', suffix='.js', delete=False) as f:
+                f.write(storage.minify_js(path.read_text()))
+            self.addCleanup(os.unlink, f.name)
+            result = subprocess.run(['node', '--check', f.name], capture_output=True, text=True)
+            self.assertEqual(result.returncode, 0, f'{path.name}: {result.stderr}')
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        media, thumbnails = tempfile.TemporaryDirectory(), tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.addCleanup(thumbnails.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.enterContext(mock.patch.object(media_module, 'THUMBNAIL_ROOT', Path(thumbnails.name)))
+        self.enterContext(mock.patch.dict(media_module._cache_estimate, {'bytes': None, 'walked_at': 0.0}))
+        self.thumbnails = Path(thumbnails.name)
+        self.user = User.objects.create_user('mo', 'mo@example.com', 'pw')
+        self.meal = MealLog.objects.create(user=self.user, food_name='Salad', calories=120)
+        self.photo = _plate_photo(SALAD, 1)
+        self.meal.food_image.save('food.jpg', ContentFile(self.photo))
+        self.url = self.meal.food_image.url
+        self.client.force_login(self.user)
+
+    def get(self, url=None, **headers):
+        response = self.client.get(url or self.url, **headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response, body
+
+    def test_only_the_owner_can_fetch_a_photo(self):
+        response, body = self.get()
+        self.assertEqual((response.status_code, body), (200, self.photo))
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('public', response['Cache-Control'])
+
+        self.client.force_login(User.objects.create_user('eve', 'eve@example.com', 'pw'))
+        self.assertEqual(self.get()[0].status_code, 404)
+        self.client.logout()
+        self.assertEqual(self.get()[0].status_code, 302)
+
+    def test_byte_ranges(self):
+        size = len(self.photo)
+        response, body = self.get(HTTP_RANGE='bytes=0-9')
+        self.assertEqual((response.status_code, body), (206, self.photo[:10]))
+        self.assertEqual(response['Content-Range'], f'bytes 0-9/{size}')
+        response, body = self.get(HTTP_RANGE='bytes=-5')
+        self.assertEqual((response.status_code, body), (206, self.photo[-5:]))
+        response, body = self.get(HTTP_RANGE=f'bytes={size}-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, f'bytes */{size}'))
+
+    def test_if_range_and_revalidation(self):
+        etag = self.get()[0]['ETag']
+        self.assertEqual(self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)[0].status_code, 206)
+        response, body = self.get(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual((response.status_code, body), (200, self.photo))
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag)[0].status_code, 304)
+
+    def test_thumbnails_are_rendered_once_and_evicted(self):
+        from PIL import Image
+
+        response, body = self.get(self.url + '?w=160')
+        self.assertEqual((response.status_code, response['Content-Type']), (200, 'image/jpeg'))
+        with Image.open(io.BytesIO(body)) as image:
+            self.assertEqual(image.width, 160)
+        self.assertEqual(self.get(self.url + '?w=999')[0].status_code, 404)
+
+        with mock.patch('PIL.Image.open', side_effect=AssertionError('re-rendered')):
+            self.assertEqual(self.get(self.url + '?w=160')[1], body)
+
+        cached = list(self.thumbnails.rglob('*.jpg'))
+        self.assertEqual(len(cached), 1)
+        size = cached[0].stat().st_size
+        self.assertEqual(media_module.evict_thumbnails(max_bytes=0), size)
+        self.assertFalse(cached[0].exists())
+
+    def test_thumbnail_cache_is_not_walked_on_every_render(self):
+        with mock.patch.object(media_module, 'evict_thumbnails', wraps=media_module.evict_thumbnails) as evict:
+            self.get(self.url + '?w=160')
+            self.get(self.url + '?w=320')
+            self.assertEqual(evict.call_count, 1)
+            with mock.patch.object(media_module, 'THUMBNAIL_CACHE_MAX_BYTES', 1):
+                self.get(self.url + '?w=640')
+            self.assertEqual(evict.call_count, 2)
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.media = Path(media.name)
+        self.user = User.objects.create_user('nia', 'nia@example.com', 'pw')
+        self.photo = _plate_photo(CURRY, 1)
+
+    def meal_with_photo(self, user=None):
+        meal = MealLog.objects.create(user=user or self.user, food_name='Curry', calories=400)
+        with self.captureOnCommitCallbacks(execute=True):
+            meal.food_image.save(f'food_{meal.id}.jpg', ContentFile(self.photo))
+        return meal
+
+    def stored_files(self):
+        return sorted(p.relative_to(self.media).as_posix() for p in self.media.rglob('*') if p.is_file())
+
+    def age(self, name):
+        os.utime(self.media / name, (0, 0))
+
+    def test_identical_uploads_share_one_file(self):
+        first = self.meal_with_photo()
+        second = self.meal_with_photo(User.objects.create_user('oz', 'oz@example.com', 'pw'))
+        sha = hashlib.sha256(self.photo).hexdigest()
+        self.assertEqual(first.food_image.name, f'food_images/{sha[:2]}/{sha[2:4]}/{sha}.jpg')
+        self.assertEqual(second.food_image.name, first.food_image.name)
+        self.assertEqual(self.stored_files(), [first.food_image.name])
+
+    def test_file_is_released_by_the_last_reference_after_the_grace_period(self):
+        first, second = self.meal_with_photo(), self.meal_with_photo()
+        name = first.food_image.name
+        self.age(name)
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(self.stored_files(), [name])
+
+        def archive():
+            return ArchivedMealLog.objects.create(id=900, user=self.user, food_name='Curry', food_image=name,
+                                                  logged_at=timezone.now(), date=timezone.localdate())
+
+        archived = archive()
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertEqual(self.stored_files(), [name])
+
+        # Touched within RELEASE_GRACE_SECONDS: an upload may be deduping onto it.
+        os.utime(self.media / name)
+        with self.captureOnCommitCallbacks(execute=True):
+            archived.delete()
+        self.assertEqual(self.stored_files(), [name])
+
+        self.age(name)
+        archived = archive()
+        with self.captureOnCommitCallbacks(execute=True):
+            archived.delete()
+        self.assertEqual(self.stored_files(), [])
+
+    def test_gc_media_dry_run_reports_without_deleting(self):
+        kept = self.meal_with_photo().food_image.name
+        orphan = self.media / 'food_images' / 'orphan.jpg'
+        orphan.write_bytes(b'x' * 1234)
+        self.age('food_images/orphan.jpg')
+        self.age(kept)
+
+        out = StringIO()
+        call_command('gc_media', dry_run=True, stdout=out)
+        self.assertIn('would delete food_images/orphan.jpg (1234 bytes)', out.getvalue())
+        self.assertIn('Would reclaim 1234 bytes', out.getvalue())
+        self.assertEqual(self.stored_files(), sorted([kept, 'food_images/orphan.jpg']))
+
+        call_command('gc_media', stdout=out)
+        self.assertEqual(self.stored_files(), [kept])
+
+
+class SqliteProfileTests(SimpleTestCase):
+    @unittest.skipUnless(settings.SQLITE_PERFORMANCE_PROFILE, 'SQLITE_PERFORMANCE_PROFILE=0')
+    def test_new_connection_gets_pragmas_and_immediate_transactions(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'profile.sqlite3')
+            default = connections['default']
+            wrapper = type(default)({**default.settings_dict, 'NAME': path}, alias='profile_check')
+            try:
+                with wrapper.cursor() as cursor:
+                    pragmas = {}
+                    for name in ('journal_mode', 'synchronous', 'busy_timeout', 'temp_store'):
+                        cursor.execute(f'PRAGMA {name}')
+                        pragmas[name] = cursor.fetchone()[0]
+                # WAL, synchronous=NORMAL (1), temp_store=MEMORY (2).
+                self.assertEqual(pragmas, {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 20000,
+                                           'temp_store': 2})
+                self.assertEqual(wrapper.transaction_mode, 'IMMEDIATE')
+
+                # As in atomic(): BEGIN IMMEDIATE takes the write lock before any write.
+                wrapper.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+                with self.assertRaisesMessage(sqlite3.OperationalError, 'locked'):
+                    sqlite3.connect(path, timeout=0).execute('BEGIN IMMEDIATE')
+                wrapper.rollback()
+            finally:
+                wrapper.close()
+
+
+@override_settings(WRITE_COALESCING=True)
+class WriteBufferTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('pia', 'pia@example.com', 'pw')
+        UserProfile.objects.create(user=self.user)
+        self.buffer = writebehind.WriteBuffer(max_delay=0.2, max_batch=50)
+        self.addCleanup(self.buffer.close)
+
+    def meal(self, name, **fields):
+        return MealLog(user=self.user, meal_type='snack', food_name=name, calories=100, **fields)
+
+    def weight(self, kg):
+        return writebehind.PendingWrite(WeightLog(user=self.user, date=date(2024, 5, 1), weight=kg),
+                                        ['user', 'date'], ['weight'])
+
+    def test_concurrent_callers_share_a_batch_and_get_their_own_ids(self):
+        version = UserProfile.objects.get(user=self.user).data_version
+        names = [f'Snack {i}' for i in range(8)]
+        ids, start = {}, threading.Barrier(len(names))
+
+        def log(name):
+            start.wait()
+            ids[name] = self.buffer.save(self.meal(name)).pk
+
+        with mock.patch.object(self.buffer, '_commit', wraps=self.buffer._commit) as commit:
+            threads = [threading.Thread(target=log, args=(name,)) for name in names]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertLess(commit.call_count, len(names))
+        self.assertEqual(len(set(ids.values())), len(names))
+        self.assertEqual(dict(MealLog.objects.values_list('food_name', 'id')), ids)
+
+        # What post_save would have done, bulk_create notwithstanding.
+        self.assertEqual(set(SyncChange.objects.filter(kind='meal').values_list('object_id', flat=True)),
+                         set(ids.values()))
+        self.assertEqual(FrequentFood.objects.filter(user=self.user).count(), len(names))
+        self.assertGreater(UserProfile.objects.get(user=self.user).data_version, version)
+
+    def test_weight_upserts_in_one_batch_keep_the_last_value(self):
+        first, second = self.weight(70.0), self.weight(71.5)
+        self.buffer._commit([first, second])
+        row = WeightLog.objects.get(user=self.user)
+        self.assertEqual(row.weight, 71.5)
+        self.assertEqual((first.instance.pk, second.instance.pk), (row.pk, row.pk))
+        self.assertEqual(SyncChange.objects.filter(kind='weight').count(), 1)
+
+    def test_failing_row_does_not_sink_its_batch(self):
+        good = [writebehind.PendingWrite(self.meal(name), None, None) for name in ('Tea', 'Toast')]
+        bad = writebehind.PendingWrite(self.meal(None), None, None)
+        version = UserProfile.objects.get(user=self.user).data_version
+        self.buffer._commit([good[0], bad, good[1]])
+        # One bump per saved row, from post_save alone.
+        self.assertEqual(UserProfile.objects.get(user=self.user).data_version, version + 2)
+        self.assertIsInstance(bad.error, IntegrityError)
+        self.assertTrue(bad.done.is_set())
+        self.assertTrue(all(p.done.is_set() and p.error is None and p.instance.pk for p in good))
+        self.assertEqual(sorted(MealLog.objects.values_list('food_name', flat=True)), ['Tea', 'Toast'])
+
+    def test_close_flushes_pending_writes(self):
+        self.buffer.max_delay = 30
+        saved = []
+        writer = threading.Thread(target=lambda: saved.append(self.buffer.save(self.meal('Late snack'))))
+        writer.start()
+        # Wait until the flusher has taken the write and is holding the batch open.
+        while self.buffer._queue is None or not self.buffer._queue.unfinished_tasks or self.buffer._queue.qsize():
+            time.sleep(0.01)
+        started = time.monotonic()
+        self.buffer.close()
+        writer.join(5)
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(saved[0].pk, MealLog.objects.get(food_name='Late snack').pk)
+
+
+class ProductionLaunchTests(SimpleTestCase):
+    ROOT = Path(__file__).resolve().parent.parent
+
+    def production_settings(self, **env):
+        # A subprocess: importing settings_production here would rewrite the
+        # TEMPLATES and STORAGES dicts this test run shares with it.
+        script = ('import json, django; django.setup(); from django.conf import settings as s; '
+                  'print(json.dumps([s.DEBUG, s.SECRET_KEY, s.SESSION_COOKIE_SECURE, '
+                  's.STORAGES["staticfiles"]["BACKEND"], s.TEMPLATES[0]["OPTIONS"]["loaders"][0][0]]))')
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'vitaltrack.settings_production', **env}
+        return subprocess.run([sys.executable, '-c', script], env=env, cwd=self.ROOT, capture_output=True, text=True)
+
+    def test_production_settings_require_a_secret_key(self):
+        result = self.production_settings(SESSION_SECRET='', METRICS_TOKEN='m3trics')
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn('ImproperlyConfigured: Set SESSION_SECRET', result.stderr)
+
+        result = self.production_settings(SESSION_SECRET='s3cret', METRICS_TOKEN='')
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn('ImproperlyConfigured: Set METRICS_TOKEN', result.stderr)
+
+        result = self.production_settings(SESSION_SECRET='s3cret', METRICS_TOKEN='m3trics')
+        self.assertEqual(json.loads(result.stdout), [
+            False, 's3cret', True, 'core.storage.CompressedManifestStaticFilesStorage',
+            'django.template.loaders.cached.Loader',
+        ])
+
+    @mock.patch.dict(os.environ, {'WEB_CONCURRENCY': '3', 'WEB_THREADS': '2'})
+    def test_gunicorn_config(self):
+        from gunicorn.config import Config
+
+        options = main.gunicorn_options('127.0.0.1:8000')
+        config = Config()
+        for key, value in options.items():
+            config.set(key, value)
+        self.assertEqual((config.workers, config.threads, config.worker_class_str), (3, 2, 'gthread'))
+        self.assertTrue(config.preload_app)
+        self.assertEqual(config.address, [('127.0.0.1', 8000)])
+        self.assertIs(config.post_fork, main.post_fork)
+        self.assertIs(config.worker_exit, main.worker_exit)
+
+        with mock.patch('core.providers.warm') as warm, \
+                mock.patch('core.metrics.registry.start_flushing') as start_flushing:
+            config.post_fork(None, None)
+        warm.assert_called_once()
+        start_flushing.assert_called_once()
+
+    def test_launch_collects_static_only_when_asked(self):
+        with mock.patch('gunicorn.app.base.BaseApplication.run') as serve, \
+                mock.patch('django.core.management.call_command') as command:
+            with mock.patch.dict(os.environ, {'COLLECTSTATIC_ON_START': ''}):
+                main.run_production('127.0.0.1:0')
+            command.assert_not_called()
+            with mock.patch.dict(os.environ, {'COLLECTSTATIC_ON_START': '1'}):
+                main.run_production('127.0.0.1:0')
+            command.assert_called_once_with('collectstatic', interactive=False, verbosity=0)
+        self.assertEqual(serve.call_count, 2)
+
+
+class MetricsTests(TestCase):
+    def test_metrics_endpoint_reports_view_histograms(self):
+        user = User.objects.create_user('sam', 'sam@example.com', 'pw')
+        self.client.force_login(user)
+        self.client.get(reverse('progress'))
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('vitaltrack_http_request_duration_seconds_count{view="progress",method="GET"}', body)
+        self.assertIn('vitaltrack_http_request_db_queries_bucket{view="progress",le="+Inf"}', body)
+        self.assertNotIn('view="metrics"', body)
+
+    def test_metrics_sum_the_counters_of_every_worker(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        counter = metrics.registry.counter('vitaltrack_test_workers_total', 'Test counter', ('kind',))
+        histogram = metrics.registry.histogram('vitaltrack_test_workers_seconds', 'Test histogram', ())
+        counter.inc('a', amount=2)
+        histogram.observe(0.2)
+        # What another worker last wrote to its own file.
+        other = {'vitaltrack_test_workers_total': [[['a'], 3], [['b'], 1]],
+                 'vitaltrack_test_workers_seconds': [[[], [[0] * 5 + [1] + [0] * 6, 1, 0.25]]]}
+        Path(directory, '999-other.json').write_text(json.dumps(other))
+
+        with self.settings(METRICS_DIR=directory):
+            body = self.client.get('/metrics').content.decode()
+            metrics.clear_dir()
+            self.assertEqual(list(Path(directory).iterdir()), [])
+        self.assertIn('vitaltrack_test_workers_total{kind="a"} 5', body)
+        self.assertIn('vitaltrack_test_workers_total{kind="b"} 1', body)
+        self.assertIn('vitaltrack_test_workers_seconds_bucket{le="0.25"} 2', body)
+        self.assertIn('vitaltrack_test_workers_seconds_count 2', body)
+
+    @override_settings(METRICS_TOKEN='m3trics')
+    def test_metrics_token_is_checked(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer m3trics').status_code, 200)
+
+
+class TelemetryTests(TestCase):
+    def reply(self, status, body=b'{}'):
+        response = mock.Mock(status_code=status, content=body)
+        response.request.body = b'{"q": 1}'
+        return response
+
+    def test_call_provider_records_status_latency_and_sizes(self):
+        with mock.patch('requests.request', return_value=self.reply(200, b'x' * 50)):
+            telemetry.call_provider('stub_ok', 'POST', 'https://example.invalid')
+        with mock.patch('requests.request', return_value=self.reply(503)):
+            telemetry.call_provider('stub_ok', 'POST', 'https://example.invalid')
+        stats = telemetry.summary()['providers']['stub_ok']
+        self.assertEqual(stats['calls'], 2)
+        self.assertEqual(stats['statuses'], {'200': 1, '503': 1})
+        self.assertEqual((stats['request_bytes'], stats['response_bytes']), (16, 52))
+        self.assertGreaterEqual(stats['avg_latency_ms'], 0)
+
+    def test_call_provider_counts_timeouts_and_errors(self):
+        import requests
+
+        for error in (requests.Timeout, requests.ConnectionError):
+            with mock.patch('requests.request', side_effect=error('down')), self.assertRaises(error):
+                telemetry.call_provider('stub_down', 'GET', 'https://example.invalid')
+        stats = telemetry.summary()['providers']['stub_down']
+        self.assertEqual((stats['calls'], stats['timeouts']), (2, 1))
+        self.assertEqual(stats['statuses'], {'timeout': 1, 'error': 1})
+
+    def test_tiers_are_counted_and_exposed_to_staff(self):
+        before = telemetry.summary()
+        telemetry.record_tier('cache')
+        telemetry.record_recognition('local')
+        staff = User.objects.create_user('ops', 'ops@example.com', 'pw', is_staff=True)
+        self.client.force_login(staff)
+        data = self.client.get(reverse('provider_stats')).json()
+        self.assertEqual(data['nutrition_tiers']['cache'], before['nutrition_tiers']['cache'] + 1)
+        self.assertEqual(data['recognition_tiers']['local'], before['recognition_tiers']['local'] + 1)
+        self.assertEqual(set(data['nutrition_tiers']), set(telemetry.NUTRITION_TIERS))
+
+        self.client.force_login(User.objects.create_user('rae', 'rae@example.com', 'pw'))
+        self.assertEqual(self.client.get(reverse('provider_stats')).status_code, 302)
+
+    def test_failed_lookups_are_logged_not_printed(self):
+        cache.clear()
+        user = User.objects.create_user('lee', 'lee@example.com', 'pw')
+        self.client.force_login(user)
+        with mock.patch('core.views.call_provider', side_effect=ConnectionError('offline')), \
+                mock.patch('sys.stdout', new_callable=StringIO) as stdout, \
+                self.assertLogs('vitaltrack.views', 'WARNING') as logs:
+            data = self.client.post(reverse('analyze_food'), {'food_name': 'Kimchi'}).json()
+        self.assertEqual(data['data']['calories'], 150)
+        self.assertEqual(stdout.getvalue(), '')
+        self.assertIn('API Ninjas lookup failed', logs.output[-1])
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_generate_fake_data_backdates_history(self):
+        call_command('generate_fake_data', users=2, days=10, meals_per_day=3, stdout=StringIO())
+        user = User.objects.get(username='fake_00002')
+        self.assertIsNotNone(user.profile.target_weight)
+        self.assertEqual(MealLog.objects.filter(user=user).values('date').distinct().count(), 10)
+        self.assertLessEqual(WeightLog.objects.filter(user=user).count(), 10)
+        self.assertTrue(self.client.login(username='fake_00001', password='vitaltrack'))
+        oldest = MealLog.objects.filter(user=user).earliest('date').date
+        self.assertEqual((timezone.localdate() - oldest).days, 9)
+
+    def test_bench_views_covers_every_url_and_enforces_budget(self):
+        call_command('generate_fake_data', users=1, days=3, stdout=StringIO())
+        meals = MealLog.objects.count()
+        with tempfile.TemporaryDirectory() as tmp:
+            baseline = Path(tmp) / 'baseline.json'
+            call_command('bench_views', iterations=1, warmup=0, write_baseline=True,
+                         baseline=baseline, stdout=StringIO())
+            budget = json.loads(baseline.read_text())
+            self.assertIn('delete_meal', budget['views'])
+            self.assertEqual(MealLog.objects.count(), meals)
+
+            budget['views']['progress']['queries'] = 0
+            baseline.write_text(json.dumps(budget))
+            with self.assertRaisesMessage(CommandError, 'progress:'):
+                call_command('bench_views', iterations=1, warmup=0, check=True, only=['progress'],
+                             baseline=baseline, latency_tolerance=100, stdout=StringIO())
+
+    def test_bench_views_scales_latency_budget_to_the_machine(self):
+        from core.management.commands.bench_views import Command as BenchViews
+
+        with tempfile.TemporaryDirectory() as tmp:
+            baseline = Path(tmp) / 'baseline.json'
+            baseline.write_text(json.dumps({'calibration_ms': 1.0, 'views': {
+                'progress': {'p50_ms': 8, 'p95_ms': 10, 'queries': 3, 'peak_kib': 40},
+            }}))
+            options = {'baseline': baseline, 'latency_tolerance': 1.0, 'memory_tolerance': 0.25,
+                       'no_latency': False}
+            command = BenchViews(stdout=StringIO())
+            slow = {'progress': {'p50_ms': 30, 'p95_ms': 35, 'queries': 3, 'peak_kib': 40}}
+            # Three times slower at the calibration workload: 35ms is within 10ms * 3 * 2.
+            command.check_budget(slow, 3.0, options)
+            with self.assertRaisesMessage(CommandError, 'progress: p95'):
+                command.check_budget(slow, 1.0, options)
+            command.check_budget(slow, 1.0, {**options, 'no_latency': True})
+
+            extra_query = {'progress': {'p50_ms': 1, 'p95_ms': 1, 'queries': 4, 'peak_kib': 40}}
+            with self.assertRaisesMessage(CommandError, 'progress: 4 queries'):
+                command.check_budget(extra_query, 100.0, {**options, 'no_latency': True})
+
+
+class WeightTrendTests(TestCase):
+    def test_ewma_matches_recurrence_across_blocks(self):
+        values = [70 + (i % 7) * 0.3 for i in range(5000)]
+        expected = [values[0]]
+        for value in values[1:]:
+            expected.append(0.95 * expected[-1] + 0.05 * value)
+        self.assertAlmostEqual(max(abs(a - b) for a, b in zip(trends.ewma(values, 0.05), expected)), 0, places=9)
+
+    def test_lttb_keeps_endpoints_and_spikes(self):
+        y = [0.0] * 1000
+        y[500] = 10.0
+        keep = list(trends.lttb(range(1000), y, 20))
+        self.assertEqual(len(keep), 20)
+        self.assertEqual((keep[0], keep[-1]), (0, 999))
+        self.assertIn(500, keep)
+
+    def test_goal_projection(self):
+        start = date(2025, 1, 1)
+        entries = [(start + timedelta(days=i), 90 - 0.1 * i) for i in range(60)]
+        result = trends.weight_trend(entries, target_weight=80)
+        self.assertAlmostEqual(result['slope_per_week'], -0.7, places=3)
+        self.assertGreater(result['goal_date'], entries[-1][0].isoformat())
+        self.assertIsNone(trends.weight_trend(entries, target_weight=95)['goal_date'])
+
+    def test_progress_and_api_use_latest_entries(self):
+        cache.clear()
+        user = User.objects.create_user('kim', 'kim@example.com', 'pw')
+        UserProfile.objects.create(user=user, target_weight=60)
+        today = timezone.localdate()
+        WeightLog.objects.bulk_create(
+            [WeightLog(user=user, date=today - timedelta(days=i), weight=70 + i * 0.1) for i in range(400)]
+        )
+        self.client.force_login(user)
+
+        response = self.client.get(reverse('progress'))
+        self.assertEqual(response.context['weight_trend']['points'][-1]['date'], today.isoformat())
+
+        data = self.client.get(reverse('weight_trend'), {'points': 50}).json()
+        self.assertEqual(data['count'], 400)
+        self.assertEqual(len(data['points']), 50)
+        self.assertEqual(data['latest'], 70.0)
+
+
+class AdherenceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('lee', 'lee@example.com', 'pw')
+        UserProfile.objects.create(user=self.user, daily_calorie_goal=2000)
+        # A Monday and the Tuesday after it.
+        self.monday = date(2026, 3, 2)
+        meals = [(self.monday, 2000, 150), (self.monday + timedelta(days=1), 1000, 50)]
+        for day, calories, protein in meals:
+            meal = MealLog.objects.create(user=self.user, meal_type='lunch', food_name='Meal',
+                                          calories=calories, protein=protein)
+            MealLog.objects.filter(pk=meal.pk).update(date=day)
+
+    def score(self):
+        call_command('score_adherence', date='2026-03-03', days=2, workers=1, stdout=StringIO())
+        return {(row.period, row.start): row for row in AdherenceScore.objects.filter(user=self.user)}
+
+    def test_scores_against_profile_goal_and_averages_weeks(self):
+        rows = self.score()
+        self.assertEqual(rows['day', self.monday].score, 100.0)
+        self.assertEqual(rows['day', self.monday + timedelta(days=1)].score, 50.0)
+        week = rows['week', self.monday]
+        self.assertEqual((week.score, week.days_logged, week.calories), (75.0, 2, 1500.0))
+
+        self.score()
+        self.assertEqual(AdherenceScore.objects.filter(user=self.user).count(), 3)
+
+    def test_active_diet_plan_macros_share_the_score(self):
+        DietPlan.objects.create(user=self.user, name='Cut', target_calories=2000, target_protein=100)
+        rows = self.score()
+        # Calories exact, protein 50% over target: 0.5 * 1 + 0.5 * 0.5.
+        self.assertEqual(rows['day', self.monday].score, 75.0)
+
+
+@override_settings(MEAL_ARCHIVE_AFTER_DAYS=60)
+class MealArchiveTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ari', 'ari@example.com', 'pw')
+        UserProfile.objects.create(user=self.user)
+        self.today = timezone.localdate()
+        self.old_day = archive.archive_cutoff() - timedelta(days=40)
+        for day, calories in ((self.old_day, 300), (self.old_day, 200), (self.today, 100)):
+            meal = MealLog.objects.create(user=self.user, meal_type='lunch', food_name='Soup', calories=calories)
+            MealLog.objects.filter(pk=meal.pk).update(date=day)
+
+    def test_old_months_move_to_archive_and_reads_merge_tiers(self):
+        call_command('archive_meals', pause_ms=0, stdout=StringIO())
+        self.assertEqual(MealLog.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(ArchivedMealLog.objects.filter(user=self.user).count(), 2)
+        summary = MealMonthlySummary.objects.get(user=self.user)
+        self.assertEqual((summary.month, summary.meals, summary.days_logged, summary.calories),
+                         (self.old_day.replace(day=1), 2, 1, 500.0))
+
+        totals = archive.daily_totals(self.user, self.old_day, self.today)
+        self.assertEqual((totals[self.old_day]['calories'], totals[self.today]['calories']), (500.0, 100.0))
+        self.assertEqual(dashboard.lifetime_counts(self.user.profile), (3, 0))
+
+        call_command('archive_meals', pause_ms=0, stdout=StringIO())
+        self.assertEqual(MealMonthlySummary.objects.get(user=self.user).meals, 2)
+
+    def test_discard_raw_keeps_only_summaries(self):
+        call_command('archive_meals', pause_ms=0, discard_raw=True, stdout=StringIO())
+        self.assertFalse(ArchivedMealLog.objects.exists())
+        self.assertEqual(MealMonthlySummary.objects.get(user=self.user).calories, 500.0)
+
+    def test_dashboard_counts_archived_meals(self):
+        self.client.force_login(self.user)
+        call_command('archive_meals', pause_ms=0, discard_raw=True, stdout=StringIO())
+        response = self.client.get(reverse('dashboard_home'))
+        self.assertContains(response, '<h4 id="mealsLogged">3</h4>', html=False)
+        self.assertEqual(self.client.get(reverse('dashboard_api')).json()['counts']['meals_logged'], 3)
+
+
+class MealHistoryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('rio', 'rio@example.com', 'pw')
+        UserProfile.objects.create(user=self.user)
+        stamp = timezone.now()
+        for i in range(7):
+            meal = MealLog.objects.create(user=self.user, meal_type='dinner' if i % 2 else 'lunch',
+                                          food_name=f'Dish {i}', calories=100 + i)
+            # Pairs of meals share a timestamp so the id tiebreak is exercised.
+            MealLog.objects.filter(pk=meal.pk).update(logged_at=stamp - timedelta(minutes=i // 2))
+        self.client.force_login(self.user)
+
+    def walk(self, **params):
+        ids, cursor = [], None
+        while True:
+            query = dict(params, limit=2, **({'cursor': cursor} if cursor else {}))
+            data = self.client.get(reverse('meal_history_api'), query).json()
+            ids.extend(meal['id'] for meal in data['results'])
+            cursor = data['next_cursor']
+            if not cursor:
+                return ids
+
+    def test_cursor_walk_visits_every_meal_once_newest_first(self):
+        expected = list(MealLog.objects.filter(user=self.user).order_by('-logged_at', '-id').values_list('id', flat=True))
+        self.assertEqual(self.walk(), expected)
+
+    def test_walk_continues_into_the_archive(self):
+        expected = list(MealLog.objects.filter(user=self.user).order_by('-logged_at', '-id').values_list('id', flat=True))
+        oldest = MealLog.objects.filter(pk__in=expected[-3:])
+        oldest.update(date=date(2020, 1, 15))
+        archive.archive_groups([(self.user.id, date(2020, 1, 1))])
+        self.assertEqual(ArchivedMealLog.objects.count(), 3)
+        self.assertEqual(self.walk(), expected)
+
+    def test_filters_and_bad_input(self):
+        self.assertEqual(len(self.walk(meal_type='dinner')), 3)
+        self.assertEqual(len(self.walk(q='dish 4')), 1)
+        self.assertEqual(self.client.get(reverse('meal_history_api'), {'cursor': 'nope'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('meal_history_api'), {'date_from': '2024-13-01'}).status_code, 400)
+        response = self.client.get(reverse('meal_history'), {'meal_type': 'lunch'})
+        self.assertEqual(len(response.context['meals']), 4)
+
+
+class FrequentFoodTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('ivy', 'ivy@example.com', 'pw')
+        UserProfile.objects.create(user=self.user)
+        self.client.force_login(self.user)
+
+    def test_meal_saves_update_index_with_latest_values(self):
+        for calories in ('90', '95'):
+            self.client.post(reverse('log_meal'), {'food_name': ' Green  apple', 'calories': calories})
+        food = FrequentFood.objects.get(user=self.user)
+        self.assertEqual((food.name_key, food.times_logged, food.calories), ('green apple', 2, 95.0))
+
+    def test_decayed_rank_prefers_recent_over_stale_frequency(self):
+        now = timezone.now()
+        old = [MealLog(user=self.user, meal_type='lunch', food_name='Stew', logged_at=now - timedelta(days=60))
+               for _ in range(3)]
+        foods.record_meals(old + [MealLog(user=self.user, meal_type='lunch', food_name='Tacos', logged_at=now)])
+        self.assertEqual([f.food_name for f in foods.top_foods(self.user)], ['Tacos', 'Stew'])
+        self.assertEqual(FrequentFood.objects.get(name_key='stew').times_logged, 3)
+
+    def test_quick_add_and_analyze_skip_external_lookups(self):
+        self.client.post(reverse('log_meal'), {'food_name': 'Oat Bowl', 'calories': '320', 'protein': '12'})
+        food = FrequentFood.objects.get(user=self.user)
+        with mock.patch('core.views.call_provider', side_effect=AssertionError('network')):
+            response = self.client.post(reverse('quick_add', args=[food.id]), HTTP_ACCEPT='application/json')
+            meal = MealLog.objects.get(id=response.json()['meal_id'])
+            self.assertEqual((meal.food_name, meal.calories, meal.protein), ('Oat Bowl', 320.0, 12.0))
+
+            data = self.client.post(reverse('analyze_food'), {'food_name': 'oat bowl'}).json()
+            self.assertEqual(data['data']['calories'], 320.0)
+        self.assertEqual(FrequentFood.objects.get(user=self.user).times_logged, 2)
+
+    def test_deleting_meals_rolls_the_index_back(self):
+        now = timezone.now()
+        first = MealLog.objects.create(user=self.user, meal_type='lunch', food_name='Ramen', calories=450)
+        MealLog.objects.filter(pk=first.pk).update(logged_at=now - timedelta(days=1))
+        self.client.post(reverse('log_meal'), {'food_name': 'ramen ', 'calories': '600', 'meal_type': 'dinner'})
+        latest = MealLog.objects.latest('id')
+        self.assertEqual(FrequentFood.objects.get(user=self.user).times_logged, 2)
+
+        self.client.post(reverse('delete_meal', args=[latest.id]))
+        food = FrequentFood.objects.get(user=self.user)
+        self.assertEqual((food.times_logged, food.calories, food.meal_type, food.food_name),
+                         (1, 450.0, 'lunch', 'Ramen'))
+        self.assertAlmostEqual(food.rank, foods.log_weight(now - timedelta(days=1)))
+
+        first.delete()
+        self.assertFalse(FrequentFood.objects.filter(user=self.user).exists())
+
+    def test_purging_archived_meals_rolls_the_index_back(self):
+        meal = MealLog.objects.create(user=self.user, meal_type='lunch', food_name='Pho', calories=400)
+        ArchivedMealLog.objects.create(**MealLog.objects.filter(pk=meal.pk).values(*archive.ARCHIVED_FIELDS).get())
+        meal.delete()
+        self.assertEqual(FrequentFood.objects.get(user=self.user).times_logged, 1)
+
+        ArchivedMealLog.objects.filter(user=self.user).delete()
+        self.assertFalse(FrequentFood.objects.filter(user=self.user).exists())
+
+
+class TieredCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def worker_cache(self):
+        """A second TieredCache on the same L2, standing in for another worker process."""
+        return TieredCache('', {'OPTIONS': {'L2': 'shared', 'STAMP_INTERVAL': 0}})
+
+    def test_l2_is_shared_and_invalidation_reaches_other_workers(self):
+        first, second = self.worker_cache(), self.worker_cache()
+        first.set('quiz:demo', {'questions': 3})
+        self.assertEqual(second.get('quiz:demo'), {'questions': 3})
+        self.assertEqual(second.get('quiz:demo'), {'questions': 3})
+
+        first.invalidate('quiz')
+        self.assertIsNone(second.get('quiz:demo'))
+        stats = second.stats()['quiz']
+        self.assertGreaterEqual(stats['l1'], 1)
+        self.assertGreaterEqual(stats['l2'], 1)
+
+    def test_get_or_set_recomputes_once_under_concurrency(self):
+        calls = []
+
+        def build():
+            calls.append(1)
+            time.sleep(0.1)
+            return 'fresh'
+
+        workers = [self.worker_cache() for _ in range(3)]
+        results = []
+        threads = [
+            threading.Thread(target=lambda c=c: results.append(c.get_or_set('vt:slow', build)))
+            for c in workers for _ in range(2)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['fresh'] * 6)
+        self.assertEqual(len(calls), 1)
+
+    def test_get_or_set_caches_none(self):
+        calls = []
+        for _ in range(2):
+            self.assertIsNone(self.worker_cache().get_or_set('quiz:404', lambda: calls.append(1)))
+        self.assertEqual(len(calls), 1)
+
+    def test_failed_nutrition_lookups_are_not_cached(self):
+        user = User.objects.create_user('cal', 'cal@example.com', 'pw')
+        self.client.force_login(user)
+        reply = mock.Mock(status_code=200)
+        reply.json.return_value = [{'name': 'miso soup', 'calories': 84}]
+        with mock.patch('core.views.call_provider', side_effect=[ConnectionError('offline'), reply]), \
+                self.assertLogs('vitaltrack.views', 'WARNING'):
+            first = self.client.post(reverse('analyze_food'), {'food_name': 'Miso Soup'}).json()['data']
+            second = self.client.post(reverse('analyze_food'), {'food_name': 'Miso Soup'}).json()['data']
+        self.assertEqual((first['calories'], second['calories']), (150, 84))
+
+    def test_suite_keeps_off_the_development_cache_file(self):
+        self.assertNotEqual(Path(settings.CACHES['shared']['LOCATION']), settings.BASE_DIR / 'cache.sqlite3')
+        self.assertEqual(caches['shared'].path, settings.CACHE_L2_PATH)
+
+    def test_nutrition_answers_are_shared_between_users(self):
+        reply = mock.Mock(status_code=200)
+        reply.json.return_value = [{'name': 'lentil soup', 'calories': 230, 'protein_g': 18}]
+        with mock.patch('core.views.call_provider', return_value=reply) as provider:
+            for name in ('ann', 'ben'):
+                user = User.objects.create_user(name, f'{name}@example.com', 'pw')
+                self.client.force_login(user)
+                data = self.client.post(reverse('analyze_food'), {'food_name': 'Lentil Soup'}).json()['data']
+                self.assertEqual((data['food_name'], data['calories']), ('Lentil Soup', 230))
+        self.assertEqual(provider.call_count, 1)
+
+    def test_quiz_pages_see_new_questions(self):
+        user = User.objects.create_user('cal', 'cal@example.com', 'pw')
+        self.client.force_login(user)
+        quiz = Quiz.objects.create(title='Fibre', description='Fibre facts', category='nutrition')
+        self.assertContains(self.client.get(reverse('quiz_list')), '0 Questions')
+        QuizQuestion.objects.create(quiz=quiz, question_text='Oats or rice?', option_a='Oats', option_b='Rice',
+                                    option_c='Both', option_d='Neither', correct_answer='a')
+        self.assertContains(self.client.get(reverse('quiz_list')), '1 Questions')
+        self.assertContains(self.client.get(reverse('quiz_detail', args=[quiz.id])), 'Oats or rice?')
+
+
+@override_settings(ADMISSION_CONTROL={'analyze_food': {
+    'rate_per_minute': 60, 'burst': 2, 'max_in_flight_per_user': 1, 'max_in_flight': 4,
+}})
+class AdmissionControlTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('dee', 'dee@example.com', 'pw')
+        self.client.force_login(self.user)
+
+    def analyze(self):
+        with mock.patch('core.views._fetch_nutrition', side_effect=views.NutritionUnavailable('toast')):
+            return self.client.post(reverse('analyze_food'), {'food_name': 'toast'})
+
+    def test_token_bucket_refills_at_the_configured_rate(self):
+        store = caches['shared']
+        self.assertIsNone(throttle.take_token(store, 'bucket', 60, 2, now=100))
+        self.assertIsNone(throttle.take_token(store, 'bucket', 60, 2, now=100))
+        self.assertAlmostEqual(throttle.take_token(store, 'bucket', 60, 2, now=100.25), 0.75)
+        self.assertIsNone(throttle.take_token(store, 'bucket', 60, 2, now=101))
+
+    def test_burst_over_the_rate_gets_429_with_retry_after(self):
+        self.assertEqual([self.analyze().status_code for _ in range(2)], [200, 200])
+        response = self.analyze()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(response.json()['success'])
+
+    def test_user_in_flight_cap_rejects_until_the_slot_frees(self):
+        prefix = f'admission:analyze_food:user:{self.user.pk}'
+        slot = throttle.acquire_slot(caches['shared'], prefix, 1, 60)
+        self.assertEqual(self.analyze().status_code, 429)
+        throttle.release_slot(caches['shared'], slot)
+        self.assertEqual(self.analyze().status_code, 200)
+        # The admitted request released its slot on the way out.
+        self.assertIsNotNone(throttle.acquire_slot(caches['shared'], prefix, 1, 60))
+
+    def test_request_past_its_lease_does_not_free_another_requests_slot(self):
+        store = caches['shared']
+        stale = throttle.acquire_slot(store, 'admission:test', 1, 60)
+        # The lease ran out and another request took the slot.
+        store.delete(stale[0])
+        current = throttle.acquire_slot(store, 'admission:test', 1, 60)
+        self.assertEqual(current[0], stale[0])
+        self.assertFalse(throttle.release_slot(store, stale))
+        self.assertIsNone(throttle.acquire_slot(store, 'admission:test', 1, 60))
+        self.assertTrue(throttle.release_slot(store, current))
+
+    @override_settings(ADMISSION_CONTROL={'analyze_food': {
+        'rate_per_minute': 600, 'burst': 5, 'max_in_flight_per_user': 1, 'max_in_flight': 1, 'lease_seconds': 60}})
+    def test_saturated_analyze_food_leaves_other_views_answering(self):
+        other = User.objects.create_user('eli', 'eli@example.com', 'pw')
+        UserProfile.objects.create(user=other)
+        browser, flooder = Client(), Client()
+        browser.force_login(other)
+        flooder.force_login(other)
+        seen = {}
+
+        def slow_lookup(food_name):
+            # While this request holds the only global slot, everyone else's
+            # analyze_food is turned away and every other view still answers.
+            seen['analyze'] = flooder.post(reverse('analyze_food'), {'food_name': 'rice'}).status_code
+            seen['pages'] = {name: browser.get(reverse(name)).status_code
+                             for name in ('dashboard_home', 'progress', 'meal_history', 'dashboard_api', 'sync')}
+            raise views.NutritionUnavailable(food_name)
+
+        with mock.patch('core.views._fetch_nutrition', slow_lookup):
+            self.assertEqual(self.client.post(reverse('analyze_food'), {'food_name': 'toast'}).status_code, 200)
+        self.assertEqual(seen['analyze'], 429)
+        self.assertEqual(set(seen['pages'].values()), {200})
+
+        # A burst from one user exhausts their bucket; nobody else is throttled.
+        with mock.patch('core.views._fetch_nutrition', side_effect=views.NutritionUnavailable('toast')):
+            codes = [self.client.post(reverse('analyze_food'), {'food_name': 'toast'}).status_code for _ in range(20)]
+            self.assertIn(429, codes)
+            self.assertEqual(browser.post(reverse('analyze_food'), {'food_name': 'rice'}).status_code, 200)
+        for name in ('dashboard_home', 'progress', 'dashboard_api'):
+            self.assertEqual(browser.get(reverse(name)).status_code, 200)
+
+
+class AccountDeletionTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=self.media.name))
+        self.user = User.objects.create_user('eve', 'eve@example.com', 'secret-pw')
+        UserProfile.objects.create(user=self.user)
+
+    def test_every_user_owned_model_is_purged(self):
+        purged = {model for model, _ in purge.PURGE_ORDER}
+        for model in apps.get_models():
+            if model._meta.app_label in ('core', 'accounts') and any(
+                    field.related_model is User for field in model._meta.fields):
+                self.assertIn(model, purged)
+
+    def test_delete_disables_at_once_and_purge_resumes_in_batches(self):
+        for i in range(5):
+            MealLog.objects.create(user=self.user, food_name=f'Meal {i}', calories=100)
+        meal = MealLog.objects.first()
+        meal.food_image.save('plate.jpg', ContentFile(b'jpeg bytes'))
+        image = meal.food_image.path
+        os.utime(image, (0, 0))
+        WeightLog.objects.create(user=self.user, weight=70, date=date.today())
+        self.client.force_login(self.user)
+
+        response = self.client.post(reverse('delete_account'), {'password': 'wrong'})
+        self.assertRedirects(response, reverse('settings'))
+        self.assertTrue(User.objects.get(pk=self.user.pk).is_active)
+
+        response = self.client.post(reverse('delete_account'), {'password': 'secret-pw'})
+        self.assertRedirects(response, reverse('landing'))
+        self.assertFalse(User.objects.get(pk=self.user.pk).is_active)
+        self.assertEqual(self.client.get(reverse('progress')).status_code, 302)
+
+        # Two batches, then a "crash": the command picks up from the saved stage.
+        deletion = AccountDeletion.objects.get(account_id=self.user.pk)
+        purge.purge_batch(deletion, 2)
+        purge.purge_batch(deletion, 2)
+        self.assertEqual(AccountDeletion.objects.get(pk=deletion.pk).deleted_rows, 4)
+        call_command('purge_accounts', batch_size=2, pause_ms=0, stdout=StringIO())
+
+        deletion.refresh_from_db()
+        self.assertIsNotNone(deletion.finished_at)
+        # 5 meals, their 5 FrequentFood entries, a weight, 6 sync entries and the profile.
+        self.assertEqual((deletion.deleted_rows, deletion.deleted_files), (18, 1))
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        self.assertFalse(MealLog.objects.exists())
+        self.assertFalse(os.path.exists(image))
+
+
+class DashboardBundleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('fay', 'fay@example.com', 'pw')
+        UserProfile.objects.create(user=self.user, daily_calorie_goal=2000)
+        self.client.force_login(self.user)
+        today = timezone.localdate()
+        MealLog.objects.create(user=self.user, food_name='Oats', calories=500, protein=20, carbs=60, fats=10)
+        WeightLog.objects.create(user=self.user, weight=71.5, date=today - timedelta(days=1))
+        WeightLog.objects.create(user=self.user, weight=71.0, date=today)
+
+    def test_bundle_has_everything_in_a_fixed_number_of_queries(self):
+        # session, user, change marker, profile, 7-day totals, weights, counts
+        with self.assertNumQueries(7):
+            bundle = self.client.get(reverse('dashboard_api')).json()
+        self.assertEqual(bundle['today'], {'calories': 500.0, 'protein': 20.0, 'carbs': 60.0, 'fats': 10.0})
+        self.assertEqual(bundle['calorie_percentage'], 25)
+        self.assertEqual([day['calories'] for day in bundle['week']], [0.0] * 6 + [500.0])
+        self.assertEqual([w['weight'] for w in bundle['weights']], [71.5, 71.0])
+        self.assertEqual(bundle['counts'], {'meals_logged': 1, 'quizzes_completed': 0})
+        self.assertIn(bundle['quote'], dashboard.QUOTES)
+
+        with self.assertNumQueries(4):
+            self.client.get(reverse('dashboard_api'))
+
+    def test_dashboard_page_embeds_the_same_bundle(self):
+        bundle = self.client.get(reverse('dashboard_api')).json()
+        response = self.client.get(reverse('dashboard_home'))
+        self.assertContains(response, 'id="dashboard-bundle"')
+        self.assertEqual(response.context['bundle'], bundle)
+
+
+class SyncTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('gus', 'gus@example.com', 'pw')
+        self.client.force_login(self.user)
+        self.meal = MealLog.objects.create(user=self.user, food_name='Oats', calories=300)
+        self.weight = WeightLog.objects.create(user=self.user, weight=70.0, date=date(2024, 1, 1))
+
+    def sync(self, since='', **params):
+        return self.client.get(reverse('sync'), {'since': since, **params}).json()
+
+    def test_changes_since_token_include_updates_and_tombstones(self):
+        first = self.sync()
+        self.assertEqual([(c['type'], c['id'], c['op']) for c in first['changes']],
+                         [('meal', self.meal.pk, 'upsert'), ('weight', self.weight.pk, 'upsert')])
+        self.assertEqual(first['changes'][0]['data']['food_name'], 'Oats')
+        self.assertEqual(self.sync(first['token'])['changes'], [])
+
+        self.meal.calories = 350
+        self.meal.save()
+        weight_id = self.weight.pk
+        self.weight.delete()
+        # Another user's changes never show up.
+        other = User.objects.create_user('hal', 'hal@example.com', 'pw')
+        MealLog.objects.create(user=other, food_name='Toast', calories=100)
+
+        second = self.sync(first['token'])
+        self.assertEqual([(c['type'], c['id'], c['op']) for c in second['changes']],
+                         [('meal', self.meal.pk, 'upsert'), ('weight', weight_id, 'delete')])
+        self.assertEqual(second['changes'][0]['data']['calories'], 350)
+        self.assertFalse(second['has_more'])
+
+    def test_pages_follow_the_token(self):
+        for day in range(2, 6):
+            WeightLog.objects.create(user=self.user, weight=70.0, date=date(2024, 1, day))
+        page = self.sync(limit=4)
+        self.assertEqual(len(page['changes']), 4)
+        self.assertTrue(page['has_more'])
+        rest = self.sync(page['token'], limit=4)
+        self.assertEqual(len(rest['changes']), 2)
+        self.assertFalse(rest['has_more'])
+
+    def test_archived_meals_stay_synced_and_dropped_ones_become_tombstones(self):
+        token = self.sync()['token']
+        month = self.meal.date.replace(day=1)
+        archive.archive_groups([(self.user.pk, month)])
+        self.assertEqual(self.sync(token)['changes'], [])
+        self.assertEqual(self.sync()['changes'][0]['data']['food_name'], 'Oats')
+
+        other = MealLog.objects.create(user=self.user, food_name='Soup', calories=200)
+        token = self.sync()['token']
+        archive.archive_groups([(self.user.pk, month)], discard_raw=True)
+        self.assertEqual(self.sync(token)['changes'], [{'type': 'meal', 'id': other.pk, 'op': 'delete'}])
+
+    def test_deleting_the_user_drops_the_feed(self):
+        self.user.delete()
+        self.assertFalse(sync.SyncChange.objects.exists())
+
+    def test_token_is_accepted_as_an_alias_for_since(self):
+        first = self.sync(limit=1)
+        legacy = self.client.get(reverse('sync'), {'token': first['token']}).json()
+        self.assertEqual(legacy, self.sync(first['token']))
+        self.assertEqual([c['type'] for c in legacy['changes']], ['weight'])
+
+    def test_resaving_an_object_in_one_batch_records_it_once(self):
+        sync.record_changes('meal', [(self.user.pk, self.meal.pk), (self.user.pk, self.meal.pk)])
+        self.assertEqual(sync.SyncChange.objects.filter(kind='meal', object_id=self.meal.pk).count(), 1)
+        self.assertEqual(self.sync()['changes'][-1]['id'], self.meal.pk)
+
+    def test_bad_token_is_rejected(self):
+        response = self.client.get(reverse('sync'), {'since': 'not-a-token'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.json())
+
+
+class ApiResponseTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('ida', 'ida@example.com', 'pw')
+        UserProfile.objects.create(user=self.user)
+        self.client.force_login(self.user)
+        for day in range(1, 31):
+            WeightLog.objects.create(user=self.user, weight=70 + day / 10, date=date(2024, 1, day))
+
+    def test_accept_header_quality(self):
+        self.assertEqual(api.media_quality('application/json;q=0.5, */*;q=0.1', 'application/json'), 0.5)
+        self.assertEqual(api.media_quality('text/html, */*;q=0.1', 'application/msgpack'), 0.1)
+        self.assertEqual(api.media_quality('text/html', 'application/json'), 0.0)
+
+    def test_msgpack_when_preferred(self):
+        response = self.client.get(reverse('sync'), HTTP_ACCEPT='application/msgpack, application/json;q=0.5')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertIn('Accept', response['Vary'])
+        changes = api.msgpack.unpackb(response.content)['changes']
+        self.assertEqual(changes[0]['data']['date'], '2024-01-01')
+
+        response = self.client.get(reverse('sync'), HTTP_ACCEPT='application/json, application/msgpack;q=0.5')
+        self.assertEqual(response.json()['changes'][0]['data']['date'], '2024-01-01')
+
+    def test_large_bodies_are_compressed(self):
+        plain = self.client.get(reverse('sync'))
+        self.assertNotIn('Content-Encoding', plain)
+        response = self.client.get(reverse('sync'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertLess(len(response.content), len(plain.content))
+
+        small = self.client.get(reverse('nutrition_data'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', small)
+
+    def test_json_and_msgpack_have_distinct_etags(self):
+        json_etag = self.client.get(reverse('weight_trend'))['ETag']
+        accept = 'application/msgpack'
+        response = self.client.get(reverse('weight_trend'), HTTP_ACCEPT=accept, HTTP_IF_NONE_MATCH=json_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertTrue(response['ETag'].endswith('-msgpack"'))
+        again = self.client.get(reverse('weight_trend'), HTTP_ACCEPT=accept, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+    def test_compressed_etag_still_revalidates(self):
+        response = self.client.get(reverse('weight_trend'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertTrue(response['ETag'].startswith('W/'))
+        again = self.client.get(reverse('weight_trend'), HTTP_ACCEPT_ENCODING='gzip',
+                                HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+
+class WeightImportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('jo', 'jo@example.com', 'pw')
+        UserProfile.objects.create(user=self.user, weight=80)
+        self.client.force_login(self.user)
+
+    def test_csv_upload_dedupes_days_and_sets_profile_weight_once(self):
+        WeightLog.objects.create(user=self.user, weight=75, date=date(2024, 1, 1))
+        export = (
+            'Date,Weight (lb),Comments\n'
+            '2024-01-01 07:00:00,154.0,\n'
+            '2024-01-01 21:00:00,156.0,evening\n'
+            '2024-01-02,not a number,\n'
+            '2024-01-03,150.0,\n'
+        )
+        upload = SimpleUploadedFile('scale.csv', export.encode(), content_type='text/csv')
+        with mock.patch.object(UserProfile, 'save', autospec=True, side_effect=UserProfile.save) as save:
+            summary = self.client.post(reverse('import_weights'), {'file': upload}).json()
+        self.assertEqual(save.call_count, 1)
+        self.assertEqual((summary['rows'], summary['imported'], summary['skipped']), (4, 2, 1))
+        self.assertIn('Row 3', summary['errors'][0])
+        readings = {log.date: (log.weight, log.notes) for log in WeightLog.objects.filter(user=self.user)}
+        self.assertEqual(readings, {date(2024, 1, 1): (70.76, 'evening'), date(2024, 1, 3): (68.04, '')})
+        self.assertEqual(UserProfile.objects.get(user=self.user).weight, 68.04)
+
+    def test_json_body_is_streamed_in_batches(self):
+        readings = [{'date': f'2024-02-{day:02d}', 'weight': 70 + day / 10} for day in range(1, 11)]
+        body = json.dumps(readings)
+        with mock.patch.object(weights, 'READ_CHUNK', 16):
+            records = list(weights.read_records(io.BytesIO(body.encode()), 'json'))
+        self.assertEqual(records, readings)
+        lines = '\n'.join(json.dumps(reading) for reading in readings)
+        self.assertEqual(list(weights.iter_json(io.StringIO(lines))), readings)
+
+        # Per batch: savepoint, upsert, old sync entries out, new ones in, release;
+        # then the profile weight and data version.
+        with self.assertNumQueries(4 * 5 + 3):
+            summary = weights.import_weights(self.user, readings, batch_size=3)
+        self.assertEqual(summary['imported'], 10)
+        self.assertEqual(WeightLog.objects.filter(user=self.user).count(), 10)
+        self.assertEqual(len(sync.changes_since(self.user, 0)[0]), 10)
+
+    def test_out_of_range_timestamp_is_skipped_like_other_bad_rows(self):
+        export = 'timestamp,weight\n99999999999999999999,70\n1704096000,72.5\n'
+        summary = self.client.post(reverse('import_weights'), export, content_type='text/csv').json()
+        self.assertEqual((summary['imported'], summary['skipped']), (1, 1))
+        self.assertIn('out of range', summary['errors'][0])
+
+    def test_multipart_post_without_a_file_is_rejected(self):
+        response = self.client.post(reverse('import_weights'), {'note': 'forgot the file'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('file', response.json()['error'])
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as export:
+            export.write('{"timestamp": 1704096000, "weight_kg": 72.5}\n{"broken": ')
+        self.addCleanup(os.unlink, export.name)
+        with self.assertRaisesMessage(CommandError, 'could not be read to the end'):
+            call_command('import_weights', 'jo', export.name, stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(WeightLog.objects.get(user=self.user).weight, 72.5)
+
+
+def _plate_photo(colours, seed, size=(320, 240)):
+    """A plate of coloured blobs on a white table, as JPEG bytes."""
+    from PIL import Image, ImageDraw
+
+    rng = np.random.default_rng(seed)
+    image = Image.new('RGB', size, (240, 240, 235))
+    draw = ImageDraw.Draw(image)
+    for _ in range(120):
+        x, y, r = rng.integers(60, 260), rng.integers(40, 200), rng.integers(4, 14)
+        colour = tuple(int(c) for c in np.clip(np.array(colours[rng.integers(len(colours))]) + rng.normal(0, 12, 3), 0, 255))
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=colour)
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+SALAD = [(60, 140, 50), (120, 180, 60), (200, 40, 40)]
+CURRY = [(200, 120, 30), (240, 200, 100), (160, 70, 20)]
+
+
+class LocalRecognizerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Rolled-back tests reuse feature ids, which the worker cache keys on.
+        recognizer._indexes.clear()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.user = User.objects.create_user('kim', 'kim@example.com', 'pw')
+        UserProfile.objects.create(user=self.user)
+        self.client.force_login(self.user)
+
+    def log_photo(self, food_name, photo):
+        meal = MealLog.objects.create(user=self.user, food_name=food_name, calories=320)
+        with self.captureOnCommitCallbacks(execute=True):
+            meal.food_image.save(f'{food_name}.jpg', ContentFile(photo))
+        return meal
+
+    def analyze(self, photo):
+        image_data = 'data:image/jpeg;base64,' + base64.b64encode(photo).decode()
+        return self.client.post(reverse('analyze_food'), {'image_data': image_data}).json()
+
+    @override_settings(RECOGNITION_PROVIDERS={})
+    def test_known_dish_is_named_offline(self):
+        self.log_photo('Garden Salad', _plate_photo(SALAD, 1))
+        self.log_photo('Chicken Curry', _plate_photo(CURRY, 2))
+
+        with mock.patch('core.providers.recognize') as provider:
+            data = self.analyze(_plate_photo(SALAD, 3))
+        provider.assert_not_called()
+        self.assertTrue(data['success'])
+        self.assertEqual(data['data']['food_name'], 'Garden Salad')
+        self.assertEqual(data['data']['recognized_by'], 'local')
+
+    @override_settings(RECOGNITION_PROVIDERS={})
+    def test_unfamiliar_photo_is_not_guessed(self):
+        self.log_photo('Garden Salad', _plate_photo(SALAD, 1))
+        match = recognizer.recognize(self.user, _plate_photo(CURRY, 4))
+        self.assertFalse(match['confident'])
+        self.assertFalse(self.analyze(_plate_photo(CURRY, 4))['success'])
+
+    def test_index_refreshes_incrementally_and_forgets_deleted_meals(self):
+        salad = self.log_photo('Garden Salad', _plate_photo(SALAD, 1))
+        self.assertEqual(recognizer.user_index(self.user.pk).names, ['Garden Salad'])
+        self.log_photo('Chicken Curry', _plate_photo(CURRY, 2))
+        self.assertEqual(recognizer.user_index(self.user.pk).names, ['Garden Salad', 'Chicken Curry'])
+        salad.delete()
+        self.assertEqual(recognizer.user_index(self.user.pk).names, ['Chicken Curry'])
+
+    def test_unreadable_photo_is_logged_and_skipped(self):
+        with mock.patch('sys.stdout', new_callable=StringIO) as stdout, \
+                self.assertLogs('vitaltrack.recognizer', 'WARNING') as logs:
+            meal = self.log_photo('Toast', b'not a jpeg')
+        self.assertFalse(FoodImageFeature.objects.filter(meal_id=meal.pk).exists())
+        self.assertEqual(stdout.getvalue(), '')
+        self.assertIn(f'Could not index the photo for meal {meal.pk}', logs.output[0])
+
+    def test_backfill_command_indexes_only_new_photos(self):
+        meal = self.log_photo('Garden Salad', _plate_photo(SALAD, 1))
+        FoodImageFeature.objects.all().delete()
+        out = StringIO()
+        call_command('index_food_images', stdout=out)
+        self.assertIn('Indexed 1 photos', out.getvalue())
+        self.assertEqual(FoodImageFeature.objects.get().meal_id, meal.pk)
+        call_command('index_food_images', stdout=out)
+        self.assertIn('Indexed 0 photos', out.getvalue())
+
+
+class StubProviderHandler(BaseHTTPRequestHandler):
+    """Answers like the OpenAI, Gemini and Clarifai APIs; paths containing 'slow' stall."""
+    answers = {
+        '/v1/chat/completions': {
+            'id': 'chatcmpl-1', 'object': 'chat.completion', 'created': 0, 'model': 'gpt-4o-mini',
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': 'Pad Thai.'}}],
+            'usage': {'prompt_tokens': 1000, 'completion_tokens': 4, 'total_tokens': 1004},
+        },
+        '/v1beta/models/gemini-2.5-flash:generateContent': {
+            'candidates': [{'content': {'role': 'model', 'parts': [{'text': 'unknown'}]}, 'finishReason': 'STOP'}],
+            'usageMetadata': {'promptTokenCount': 300, 'candidatesTokenCount': 1, 'totalTokenCount': 301},
+        },
+        '/v2/models/food-item-recognition/outputs': {
+            'outputs': [{'data': {'concepts': [{'name': 'ramen', 'value': 0.97}]}}],
+        },
+    }
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.server.requests.append(self.path)
+        if 'slow' in self.path:
+            time.sleep(1)
+        body = json.dumps(self.answers.get(self.path.replace('slow-', '').split('?')[0], {})).encode()
+        try:
+            self.send_response(200 if body != b'{}' else 404)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except ConnectionError:
+            pass  # the client already gave up on a slow answer
+
+    def log_message(self, *args):
+        pass
+
+
+class RecognitionProviderTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        recognizer._indexes.clear()
+        server = ThreadingHTTPServer(('127.0.0.1', 0), StubProviderHandler)
+        server.requests = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.server = server
+        self.url = f'http://127.0.0.1:{server.server_port}'
+        self.user = User.objects.create_user('lou', 'lou@example.com', 'pw')
+        self.client.force_login(self.user)
+
+    def configure(self, **overrides):
+        config = {
+            'gemini': {'backend': 'core.providers.GeminiProvider', 'api_key': 'g', 'model': 'gemini-2.5-flash',
+                       'base_url': self.url + '/', 'timeout': 0.5,
+                       'input_cost_per_mtok': 0.30, 'output_cost_per_mtok': 2.50},
+            'openai': {'backend': 'core.providers.OpenAIProvider', 'api_key': 'o', 'model': 'gpt-4o-mini',
+                       'base_url': self.url + '/v1', 'timeout': 0.5,
+                       'input_cost_per_mtok': 0.15, 'output_cost_per_mtok': 0.60},
+            'clarifai': {'backend': 'core.providers.ClarifaiProvider', 'api_key': '', 'base_url': self.url,
+                         'model': 'food-item-recognition', 'cost_per_call': 0.0012},
+        }
+        for name, options in overrides.items():
+            config[name].update(options)
+        return self.enterContext(override_settings(RECOGNITION_PROVIDERS=config))
+
+    def test_providers_are_tried_in_order_and_report_cost(self):
+        self.configure()
+        before = telemetry.summary()['providers'].get('openai', {}).get('cost_usd', 0)
+        image_data = 'data:image/png;base64,' + base64.b64encode(_plate_photo(SALAD, 1)).decode()
+        with mock.patch('core.views.call_provider', side_effect=AssertionError('network')):
+            data = self.client.post(reverse('analyze_food'), {'image_data': image_data}).json()
+        self.assertEqual((data['data']['food_name'], data['data']['recognized_by']), ('Pad Thai', 'openai'))
+        # Gemini saw no food; Clarifai has no key and is not configured at all.
+        self.assertEqual([p.name for p in providers.registry()], ['gemini', 'openai'])
+        self.assertEqual(self.server.requests, [
+            '/v1beta/models/gemini-2.5-flash:generateContent', '/v1/chat/completions'])
+        openai_stats = telemetry.summary()['providers']['openai']
+        self.assertAlmostEqual(openai_stats['cost_usd'] - before, (1000 * 0.15 + 4 * 0.60) / 1e6)
+        self.assertGreaterEqual(openai_stats['statuses']['200'], 1)
+
+    def test_clients_are_built_once_and_reused(self):
+        self.configure(clarifai={'api_key': 'c'})
+        first = [p.connect() for p in providers.warm()]
+        for _ in range(3):
+            self.assertEqual(providers.recognize(b'photo')[0], 'Pad Thai')
+        self.assertEqual([p.connect() for p in providers.warm()], first)
+        clarifai = providers.registry()[2]
+        self.assertEqual((clarifai.name, clarifai.recognize(b'photo')), ('clarifai', 'ramen'))
+
+    def test_payload_sizes_are_recorded_for_every_provider(self):
+        self.configure(clarifai={'api_key': 'c'})
+        names = ('gemini', 'openai', 'clarifai')
+
+        def sizes():
+            stats = telemetry.summary()['providers']
+            return {name: (stats.get(name, {}).get('request_bytes', 0), stats.get(name, {}).get('response_bytes', 0))
+                    for name in names}
+
+        before = sizes()
+        photo = _plate_photo(SALAD, 1)
+        for provider in providers.registry():
+            provider.recognize(photo)
+        after = sizes()
+        for name in names:
+            # Each request carries the photo base64-encoded.
+            self.assertGreater(after[name][0] - before[name][0], len(photo))
+            self.assertGreater(after[name][1] - before[name][1], 0)
+
+    def test_slow_provider_times_out_and_the_next_one_answers(self):
+        self.configure(gemini={'base_url': self.url + '/slow-'}, openai={'timeout': 5})
+        before = telemetry.summary()['providers'].get('gemini', {}).get('timeouts', 0)
+        started = time.perf_counter()
+        with mock.patch('sys.stdout', new_callable=StringIO) as stdout, \
+                self.assertLogs('vitaltrack.providers', 'WARNING') as logs:
+            self.assertEqual(providers.recognize(b'photo'), ('Pad Thai', 'openai'))
+        self.assertLess(time.perf_counter() - started, 1)
+        self.assertEqual(stdout.getvalue(), '')
+        self.assertIn('gemini recognition failed', logs.output[0])
+        self.assertEqual(telemetry.summary()['providers']['gemini']['timeouts'], before + 1)
+
+    def test_provider_that_cannot_start_is_logged_and_skipped(self):
+        self.configure()
+        with mock.patch.object(providers.GeminiProvider, 'build_client', side_effect=RuntimeError('bad key')), \
+                self.assertLogs('vitaltrack.providers', 'WARNING') as logs:
+            self.assertEqual([p.name for p in providers.warm()], ['gemini', 'openai'])
+        self.assertIn('Recognition provider gemini could not start', logs.output[0])
+        self.assertIn('RuntimeError: bad key', logs.output[0])
+
+    def test_sdks_are_imported_only_for_configured_providers(self):
+        script = ('import sys, django; django.setup(); from core import providers, views; providers.warm(); '
+                  'print(sorted(m for m in ("openai", "google.genai") if m in sys.modules))')
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'vitaltrack.settings',
+               'OPENAI_API_KEY': '', 'GEMINI_API_KEY': '', 'CLARIFAI_API_KEY': ''}
+        output = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True, check=True,
+                                cwd=Path(__file__).resolve().parent.parent).stdout
+        self.assertEqual(output.strip(), '[]')
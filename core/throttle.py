@@ -0,0 +1,154 @@
+"""Admission control for endpoints that hold a worker on external calls.
+
+Each scope in settings.ADMISSION_CONTROL gets a per-user token bucket
+(rate_per_minute refill, burst capacity) and per-user and global caps on
+requests in flight. The state lives in the ADMISSION_CACHE alias (the
+SQLite cache every worker on the host shares), so the limits hold across
+processes. A request over any limit is answered at once with 429 and
+Retry-After instead of queueing for a worker; if the cache itself fails,
+requests are let through.
+
+The bucket is stored in its GCRA form, one "theoretical arrival time" per
+user, so taking a token is a single atomic read-modify-write. In-flight
+slots are add()-only keys with a lease, so a worker that dies mid-request
+frees its slot when the lease runs out. Each slot holds its request's
+random token and is only released while it still holds it: a request that
+outlives its lease must not free a slot another request has since taken.
+"""
+import logging
+import math
+import time
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .api import ApiResponse
+from .metrics import registry
+
+logger = logging.getLogger('vitaltrack.admission')
+
+ADMISSION_REJECTIONS = registry.counter(
+    'vitaltrack_admission_rejections_total', 'Requests turned away by admission control', ('scope', 'reason'))
+
+REJECTION_MESSAGES = {
+    'rate': 'You are sending requests too quickly. Please try again in {seconds} seconds.',
+    'user_in_flight': 'Your previous request is still being processed. Please wait for it to finish.',
+    'in_flight': 'The service is busy right now. Please try again in {seconds} seconds.',
+}
+
+
+def _store():
+    return caches[getattr(settings, 'ADMISSION_CACHE', 'shared')]
+
+
+def _update(store, key, func, timeout):
+    update = getattr(store, 'update', None)
+    if update is not None:
+        return update(key, func, timeout)
+    # Backends without an atomic update may over-admit under races.
+    value = func(store.get(key))
+    store.set(key, value, timeout)
+    return value
+
+
+def take_token(store, key, rate_per_minute, burst, now=None):
+    """None if a token was taken, else seconds until the bucket has one."""
+    now = time.time() if now is None else now
+    interval = 60.0 / rate_per_minute
+    capacity = burst * interval
+    wait = []
+
+    def step(tat):
+        tat = max(tat or now, now)
+        if tat + interval - now > capacity:
+            wait.append(tat + interval - now - capacity)
+            return tat
+        return tat + interval
+
+    # Once the stored time is in the past the bucket is full, so it may expire.
+    _update(store, key, step, math.ceil(capacity) + 1)
+    return wait[0] if wait else None
+
+
+def acquire_slot(store, prefix, limit, lease_seconds):
+    """(key, token) of a free in-flight slot under prefix, or None when all limit are taken."""
+    token = uuid.uuid4().hex
+    for index in range(limit):
+        key = f'{prefix}:{index}'
+        if store.add(key, token, lease_seconds):
+            return key, token
+    return None
+
+
+def release_slot(store, slot):
+    """Free a slot from acquire_slot() unless its lease ran out and someone else took it."""
+    key, token = slot
+    delete_if = getattr(store, 'delete_if', None)
+    if delete_if is not None:
+        return delete_if(key, token)
+    # Backends without an atomic compare-and-delete leave a small window.
+    if store.get(key) != token:
+        return False
+    return store.delete(key)
+
+
+def reset(scope, user_id):
+    """Forget a user's bucket and in-flight slots for scope (tests and benchmarks)."""
+    limits = getattr(settings, 'ADMISSION_CONTROL', {}).get(scope, {})
+    store = _store()
+    store.delete(f'admission:{scope}:rate:{user_id}')
+    for index in range(limits.get('max_in_flight_per_user', 0)):
+        store.delete(f'admission:{scope}:user:{user_id}:{index}')
+
+
+def _reject(scope, reason, retry_after):
+    ADMISSION_REJECTIONS.inc(scope, reason)
+    seconds = max(1, math.ceil(retry_after))
+    response = ApiResponse(
+        {'success': False, 'error': REJECTION_MESSAGES[reason].format(seconds=seconds)}, status=429)
+    response['Retry-After'] = str(seconds)
+    return response
+
+
+def admission_control(scope):
+    """Apply settings.ADMISSION_CONTROL[scope] to a view; a missing entry disables it."""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            limits = getattr(settings, 'ADMISSION_CONTROL', {}).get(scope)
+            if not limits:
+                return view(request, *args, **kwargs)
+            user_id = request.user.pk
+            lease = limits.get('lease_seconds', 60)
+            retry = limits.get('retry_after', 2)
+            store, held = None, []
+            try:
+                store = _store()
+                wait = take_token(store, f'admission:{scope}:rate:{user_id}',
+                                  limits['rate_per_minute'], limits['burst'])
+                if wait is not None:
+                    return _reject(scope, 'rate', wait)
+                for prefix, limit, reason in (
+                    (f'admission:{scope}:user:{user_id}', limits.get('max_in_flight_per_user'), 'user_in_flight'),
+                    (f'admission:{scope}:global', limits.get('max_in_flight'), 'in_flight'),
+                ):
+                    if not limit:
+                        continue
+                    slot = acquire_slot(store, prefix, limit, lease)
+                    if slot is None:
+                        for taken in held:
+                            release_slot(store, taken)
+                        held = []
+                        return _reject(scope, reason, retry)
+                    held.append(slot)
+            except Exception:
+                logger.warning('Admission control unavailable for %s; admitting request', scope, exc_info=True)
+            try:
+                return view(request, *args, **kwargs)
+            finally:
+                for slot in held:
+                    release_slot(store, slot)
+        return wrapped
+    return decorator
@@ -0,0 +1,154 @@
+"""Weight trend analytics over a user's WeightLog history.
+
+Logs are irregular (people skip days), so the series is first laid on a
+daily grid by linear interpolation; smoothing and rolling windows are then
+measured in days rather than in entries.
+"""
+from datetime import timedelta
+
+import numpy as np
+
+DEFAULT_ALPHA = 0.1
+DEFAULT_WINDOW_DAYS = 7
+DEFAULT_SLOPE_DAYS = 28
+DEFAULT_CHART_POINTS = 120
+# Projections further out than this are noise, not a forecast.
+MAX_PROJECTION_DAYS = 3 * 365
+
+
+def ewma(values, alpha=DEFAULT_ALPHA):
+    """Exponentially weighted moving average, y[t] = (1 - alpha) * y[t-1] + alpha * x[t].
+
+    Vectorised with the cumulative-sum form of the recurrence. That form
+    divides by (1 - alpha)**t, so the series is processed in blocks short
+    enough for the powers to stay within float64 range.
+    """
+    values = np.asarray(values, dtype=float)
+    out = np.empty_like(values)
+    if not values.size:
+        return out
+    decay = 1.0 - alpha
+    if decay <= 0:
+        return values.copy()
+    block = max(1, int(150 / -np.log10(decay))) if decay < 1 else values.size
+    previous = values[0]
+    for start in range(0, values.size, block):
+        chunk = values[start:start + block]
+        powers = decay ** np.arange(1, chunk.size + 1)
+        out[start:start + chunk.size] = powers * (previous + alpha * np.cumsum(chunk / powers))
+        previous = out[start + chunk.size - 1]
+    return out
+
+
+def rolling_min_max(values, window):
+    """Trailing min and max over `window` samples (shorter at the start)."""
+    values = np.asarray(values, dtype=float)
+    window = max(1, min(window, values.size))
+    padded = np.concatenate([np.full(window - 1, values[0]), values])
+    windows = np.lib.stride_tricks.sliding_window_view(padded, window)
+    return windows.min(axis=1), windows.max(axis=1)
+
+
+def regression_slope(days, values):
+    """Least-squares slope in units per day; 0.0 when it is undefined."""
+    days = np.asarray(days, dtype=float)
+    values = np.asarray(values, dtype=float)
+    if days.size < 2 or np.ptp(days) == 0:
+        return 0.0
+    centred = days - days.mean()
+    return float(np.dot(centred, values - values.mean()) / np.dot(centred, centred))
+
+
+def lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets downsampling; returns the indices to keep.
+
+    Keeps the first and last points and, from each bucket in between, the
+    point forming the largest triangle with the previous pick and the mean
+    of the next bucket, which preserves peaks and dips far better than
+    striding.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = x.size
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    keep = np.empty(threshold, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    picked = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[end:next_end].mean() if next_end > end else x[-1]
+        next_y = y[end:next_end].mean() if next_end > end else y[-1]
+        areas = np.abs(
+            (x[picked] - next_x) * (y[start:end] - y[picked])
+            - (x[picked] - x[start:end]) * (next_y - y[picked])
+        )
+        picked = start + int(areas.argmax())
+        keep[i + 1] = picked
+    return keep
+
+
+def weight_trend(entries, target_weight=None, alpha=DEFAULT_ALPHA, window_days=DEFAULT_WINDOW_DAYS,
+                 slope_days=DEFAULT_SLOPE_DAYS, chart_points=DEFAULT_CHART_POINTS):
+    """Summarise (date, weight) pairs, oldest first, for the progress chart and API."""
+    if not entries:
+        return {
+            'count': 0, 'points': [], 'latest': None, 'trend': None, 'rolling_min': None,
+            'rolling_max': None, 'slope_per_week': None, 'goal_date': None,
+        }
+
+    first = entries[0][0]
+    days = np.fromiter(((d - first).days for d, _ in entries), dtype=float, count=len(entries))
+    weights = np.fromiter((w for _, w in entries), dtype=float, count=len(entries))
+
+    grid = np.arange(int(days[-1]) + 1)
+    daily = np.interp(grid, days, weights)
+    smoothed = ewma(daily, alpha)
+    low, high = rolling_min_max(daily, window_days)
+
+    recent = days >= days[-1] - slope_days
+    slope = regression_slope(days[recent], weights[recent])
+
+    keep = lttb(days, weights, chart_points)
+    day_index = days[keep].astype(int)
+    points = [
+        {
+            'date': (first + timedelta(days=int(day))).isoformat(),
+            'weight': round(float(weight), 2),
+            'trend': round(float(trend), 2),
+            'min': round(float(lo), 2),
+            'max': round(float(hi), 2),
+        }
+        for day, weight, trend, lo, hi in zip(
+            day_index, weights[keep], smoothed[day_index], low[day_index], high[day_index]
+        )
+    ]
+
+    return {
+        'count': len(entries),
+        'points': points,
+        'latest': round(float(weights[-1]), 2),
+        'trend': round(float(smoothed[-1]), 2),
+        'rolling_min': round(float(low[-1]), 2),
+        'rolling_max': round(float(high[-1]), 2),
+        'slope_per_week': round(slope * 7, 3),
+        'goal_date': project_goal_date(entries[-1][0], float(smoothed[-1]), slope, target_weight),
+    }
+
+
+def project_goal_date(last_date, current, slope, target_weight):
+    """Date the trend reaches target_weight at the current slope, or None."""
+    if target_weight is None:
+        return None
+    remaining = target_weight - current
+    if abs(remaining) < 0.05:
+        return last_date.isoformat()
+    if slope == 0 or (remaining > 0) != (slope > 0):
+        return None
+    days = remaining / slope
+    if days > MAX_PROJECTION_DAYS:
+        return None
+    return (last_date + timedelta(days=int(np.ceil(days)))).isoformat()
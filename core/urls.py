@@ -14,9 +14,19 @@ urlpatterns = [
     path('analyze-food/', views.analyze_food, name='analyze_food'),
     path('diet-plan/', views.diet_plan, name='diet_plan'),
     path('log-meal/', views.log_meal, name='log_meal'),
+    path('quick-add/<int:food_id>/', views.quick_add, name='quick_add'),
     path('delete-meal/<int:meal_id>/', views.delete_meal, name='delete_meal'),
+    path('history/', views.meal_history, name='meal_history'),
     path('settings/', views.settings_view, name='settings'),
+    path('settings/delete-account/', views.delete_account, name='delete_account'),
     path('log-weight/', views.log_weight, name='log_weight'),
+    path('import-weights/', views.import_weights, name='import_weights'),
     path('api/nutrition-data/', views.get_nutrition_data, name='nutrition_data'),
     path('api/progress-data/', views.get_progress_data, name='progress_data'),
+    path('api/dashboard/', views.get_dashboard, name='dashboard_api'),
+    path('api/frequent-foods/', views.get_frequent_foods, name='frequent_foods'),
+    path('api/meals/', views.get_meal_history, name='meal_history_api'),
+    path('api/sync/', views.get_sync, name='sync'),
+    path('api/weight-trend/', views.get_weight_trend, name='weight_trend'),
+    path('api/provider-stats/', views.provider_stats, name='provider_stats'),
 ]
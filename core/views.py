@@ -1,16 +1,35 @@
 import json
 import base64
+import hashlib
+import logging
 import os
 from datetime import datetime, timedelta
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
-from django.http import JsonResponse
-from django.db.models import Sum, Avg
+from django.contrib.auth import logout
+from django.http import Http404
+from django.core.cache import cache
+from django.db.models import Count, Sum, Avg
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
 from django.core.files.base import ContentFile
-from .models import MealLog, WeightLog, DietPlan, Quiz, QuizQuestion, QuizResult, HealthQuote
+from .models import MealLog, WeightLog, DietPlan, FrequentFood, Quiz, QuizQuestion, QuizResult, HealthQuote
 from accounts.models import UserProfile
+from .api import ApiResponse
+from .telemetry import call_provider, record_recognition, record_tier, summary as provider_summary
+from .throttle import admission_control
+from .writebehind import write_buffer
+from .caching import DASHBOARD_CACHE_TIMEOUT, cached_user_data, user_data_etag, user_data_last_modified
+from . import trends
+from .adherence import latest_adherence
+from .archive import daily_totals
+from . import foods, history, providers, recognizer, sync, weights
+from .purge import request_deletion
+from .dashboard import build_bundle
+
+logger = logging.getLogger('vitaltrack.views')
 
 def landing(request):
     if request.user.is_authenticated:
@@ -31,70 +50,72 @@ def dashboard_home(request):
     today = datetime.now().date()
 
     profile, created = UserProfile.objects.get_or_create(user=request.user)
-
-    today_meals = MealLog.objects.filter(user=request.user, date=today)
-    today_calories = today_meals.aggregate(total=Sum('calories'))['total'] or 0
-    today_protein = today_meals.aggregate(total=Sum('protein'))['total'] or 0
-    today_carbs = today_meals.aggregate(total=Sum('carbs'))['total'] or 0
-    today_fats = today_meals.aggregate(total=Sum('fats'))['total'] or 0
-
-    quotes = [
-        {"quote": "Take care of your body. It's the only place you have to live.", "author": "Jim Rohn"},
-        {"quote": "The groundwork for all happiness is good health.", "author": "Leigh Hunt"},
-        {"quote": "Health is not about the weight you lose, but about the life you gain.", "author": "Josh Axe"},
-        {"quote": "Your body hears everything your mind says.", "author": "Naomi Judd"},
-        {"quote": "A healthy outside starts from the inside.", "author": "Robert Urich"},
-    ]
-    import random
-    quote = random.choice(quotes)
-
-    quiz_count = QuizResult.objects.filter(user=request.user).count()
-    meals_logged = MealLog.objects.filter(user=request.user).count()
+    bundle = cached_user_data(profile, 'dashboard', lambda: build_bundle(request.user, profile, today), today)
 
     context = {
         'profile': profile,
-        'today_calories': round(today_calories, 1),
-        'today_protein': round(today_protein, 1),
-        'today_carbs': round(today_carbs, 1),
-        'today_fats': round(today_fats, 1),
-        'calorie_goal': profile.daily_calorie_goal,
-        'calorie_percentage': min(100, round((today_calories / profile.daily_calorie_goal) * 100)) if profile.daily_calorie_goal > 0 else 0,
-        'quote': quote,
-        'quiz_count': quiz_count,
-        'meals_logged': meals_logged,
+        'today': today,
+        'today_calories': bundle['today']['calories'],
+        'today_protein': bundle['today']['protein'],
+        'today_carbs': bundle['today']['carbs'],
+        'today_fats': bundle['today']['fats'],
+        'calorie_goal': bundle['calorie_goal'],
+        'calorie_percentage': bundle['calorie_percentage'],
+        'quote': bundle['quote'],
+        'quiz_count': bundle['counts']['quizzes_completed'],
+        'meals_logged': bundle['counts']['meals_logged'],
+        'bundle': bundle,
+        'cache_timeout': DASHBOARD_CACHE_TIMEOUT,
     }
     return render(request, 'core/dashboard_home.html', context)
 
+def _quiz_catalog():
+    """Every quiz with its question count; shared by all users, dropped when quizzes change."""
+    return cache.get_or_set(
+        'quiz:catalog',
+        lambda: list(Quiz.objects.annotate(question_count=Count('questions')).order_by('id')),
+    )
+
+
+def _quiz_content(quiz_id):
+    """(quiz, questions) from the shared cache, or Http404."""
+    def build():
+        quiz = Quiz.objects.filter(id=quiz_id).first()
+        return (quiz, list(quiz.questions.all())) if quiz else None
+
+    content = cache.get_or_set(f'quiz:{quiz_id}', build)
+    if content is None:
+        raise Http404('No Quiz matches the given query.')
+    return content
+
 @login_required
 def quiz_list(request):
-    quizzes = Quiz.objects.all()
-    user_results = QuizResult.objects.filter(user=request.user)
+    latest_results = {}
+    for result in QuizResult.objects.filter(user=request.user):
+        latest_results.setdefault(result.quiz_id, result)
 
     quiz_data = []
-    for quiz in quizzes:
-        result = user_results.filter(quiz=quiz).first()
+    for quiz in _quiz_catalog():
         quiz_data.append({
             'quiz': quiz,
-            'result': result,
-            'question_count': quiz.questions.count()
+            'result': latest_results.get(quiz.id),
+            'question_count': quiz.question_count
         })
 
     return render(request, 'core/quiz_list.html', {'quiz_data': quiz_data})
 
 @login_required
 def quiz_detail(request, quiz_id):
-    quiz = get_object_or_404(Quiz, id=quiz_id)
-    questions = quiz.questions.all()
+    quiz, questions = _quiz_content(quiz_id)
     return render(request, 'core/quiz_detail.html', {'quiz': quiz, 'questions': questions})
 
 @login_required
 def quiz_submit(request, quiz_id):
     if request.method == 'POST':
-        quiz = get_object_or_404(Quiz, id=quiz_id)
-        questions = quiz.questions.all()
+        quiz, questions = _quiz_content(quiz_id)
 
         correct = 0
-        total = questions.count()
+        total = len(questions)
 
         for question in questions:
             answer = request.POST.get(f'question_{question.id}')
@@ -119,28 +140,38 @@ def quiz_submit(request, quiz_id):
 @login_required
 def progress(request):
     profile, created = UserProfile.objects.get_or_create(user=request.user)
-
-    weight_logs = WeightLog.objects.filter(user=request.user).order_by('date')[:30]
-
-    last_7_days = []
     today = datetime.now().date()
-    for i in range(6, -1, -1):
-        date = today - timedelta(days=i)
-        meals = MealLog.objects.filter(user=request.user, date=date)
-        calories = meals.aggregate(total=Sum('calories'))['total'] or 0
-        last_7_days.append({
-            'date': date.strftime('%a'),
-            'calories': round(calories, 1)
-        })
 
-    quiz_results = QuizResult.objects.filter(user=request.user).order_by('-completed_at')[:10]
+    def build():
+        weight_trend = trends.weight_trend(
+            list(WeightLog.objects.filter(user=request.user).order_by('date').values_list('date', 'weight')),
+            target_weight=profile.target_weight,
+        )
 
-    context = {
+        totals = daily_totals(request.user, today - timedelta(days=6), today)
+        last_7_days = []
+        for i in range(6, -1, -1):
+            date = today - timedelta(days=i)
+            last_7_days.append({
+                'date': date.strftime('%a'),
+                'calories': round(totals[date]['calories'], 1)
+            })
+
+        quiz_results = list(
+            QuizResult.objects.filter(user=request.user).select_related('quiz').order_by('-completed_at')[:10]
+        )
+        return {
+            'weight_trend': weight_trend,
+            'last_7_days': last_7_days,
+            'quiz_results': quiz_results,
+        }
+
+    context = cached_user_data(profile, 'progress', build, today).copy()
+    context.update({
         'profile': profile,
-        'weight_logs': weight_logs,
-        'last_7_days': last_7_days,
-        'quiz_results': quiz_results,
-    }
+        'today': today,
+        'cache_timeout': DASHBOARD_CACHE_TIMEOUT,
+    })
     return render(request, 'core/progress.html', context)
 
 @login_required
@@ -148,139 +179,171 @@ def ai_cam(request):
     recent_analyses = MealLog.objects.filter(user=request.user, food_image__isnull=False).order_by('-logged_at')[:5]
     return render(request, 'core/ai_cam.html', {'recent_analyses': recent_analyses})
 
+class NutritionUnavailable(Exception):
+    """No nutrition provider answered; raised so the miss is not cached."""
+
+
+def _fetch_nutrition(food_name):
+    """{'data': ..., 'tier': ...} from the first external provider that answers.
+
+    Raises NutritionUnavailable when none does.
+    """
+    # Use Edamam Food Database API for nutrition data
+    edamam_app_id = os.environ.get('EDAMAM_APP_ID', '')
+    edamam_app_key = os.environ.get('EDAMAM_APP_KEY', '')
+
+    nutrition_data = None
+    tier = None
+
+    if edamam_app_id and edamam_app_key:
+        # Use Edamam Nutrition Analysis API
+        try:
+            edamam_url = 'https://api.edamam.com/api/nutrition-details'
+            params = {
+                'app_id': edamam_app_id,
+                'app_key': edamam_app_key
+            }
+            payload = {
+                'title': food_name,
+                'ingr': [f'1 serving of {food_name}']
+            }
+
+            response = call_provider('edamam', 'POST', edamam_url, params=params, json=payload, timeout=10)
+
+            if response.status_code == 200:
+                api_data = response.json()
+                total_nutrients = api_data.get('totalNutrients', {})
+
+                nutrition_data = {
+                    'food_name': food_name.title(),
+                    'calories': round(api_data.get('calories', 0), 1),
+                    'protein': round(total_nutrients.get('PROCNT', {}).get('quantity', 0), 1),
+                    'carbs': round(total_nutrients.get('CHOCDF', {}).get('quantity', 0), 1),
+                    'fats': round(total_nutrients.get('FAT', {}).get('quantity', 0), 1),
+                    'fiber': round(total_nutrients.get('FIBTG', {}).get('quantity', 0), 1),
+                    'serving_size': '1 serving',
+                    'health_tips': f'This meal contains {round(total_nutrients.get("SUGAR", {}).get("quantity", 0), 1)}g of sugar.'
+                }
+                tier = 'edamam'
+        except Exception:
+            logger.warning('Edamam lookup failed for %r', food_name, exc_info=True)
+
+    # Fallback to API Ninjas if Edamam not configured or failed
+    if not nutrition_data:
+        try:
+            api_url = f'https://api.api-ninjas.com/v1/nutrition?query={food_name}'
+            api_key = os.environ.get('NUTRITION_API_KEY', '')
+
+            headers = {'X-Api-Key': api_key} if api_key else {}
+            response = call_provider('api_ninjas', 'GET', api_url, headers=headers, timeout=10)
+
+            if response.status_code == 200:
+                api_data = response.json()
+                if api_data and len(api_data) > 0:
+                    item = api_data[0]
+                    nutrition_data = {
+                        'food_name': item.get('name', food_name).title(),
+                        'calories': round(item.get('calories', 0), 1),
+                        'protein': round(item.get('protein_g', 0), 1),
+                        'carbs': round(item.get('carbohydrates_total_g', 0), 1),
+                        'fats': round(item.get('fat_total_g', 0), 1),
+                        'fiber': round(item.get('fiber_g', 0), 1),
+                        'serving_size': f"{item.get('serving_size_g', 100)}g",
+                        'health_tips': f'Contains {round(item.get("sugar_g", 0), 1)}g of sugar.'
+                    }
+                    tier = 'api_ninjas'
+        except Exception:
+            logger.warning('API Ninjas lookup failed for %r', food_name, exc_info=True)
+
+    if not nutrition_data:
+        raise NutritionUnavailable(food_name)
+    return {'data': nutrition_data, 'tier': tier}
+
 @login_required
+@admission_control('analyze_food')
 def analyze_food(request):
     if request.method == 'POST':
         try:
-            import os
-            import requests
-
             food_name = request.POST.get('food_name', '').strip()
             image_data = request.POST.get('image_data', '').strip()
             meal_type = request.POST.get('meal_type', 'snack')
 
-            # If image is provided, detect food from image using Clarifai
+            # If image is provided, detect food from image: the user's own
+            # labeled photos first, then the configured providers in order.
+            recognized_by = None
             if image_data and not food_name:
                 try:
-                    # Use Clarifai Food Recognition API
-                    clarifai_api_key = os.environ.get('CLARIFAI_API_KEY', '')
-
-                    if clarifai_api_key:
-                        # Convert base64 to clean format
-                        if ',' in image_data:
-                            image_data_clean = image_data.split(',')[1]
-                        else:
-                            image_data_clean = image_data
-
-                        clarifai_url = 'https://api.clarifai.com/v2/models/food-item-recognition/outputs'
-                        headers = {
-                            'Authorization': f'Key {clarifai_api_key}',
-                            'Content-Type': 'application/json'
-                        }
-                        payload = {
-                            'inputs': [{
-                                'data': {
-                                    'image': {
-                                        'base64': image_data_clean
-                                    }
-                                }
-                            }]
-                        }
-
-                        recognition_response = requests.post(clarifai_url, json=payload, headers=headers, timeout=10)
-
-                        if recognition_response.status_code == 200:
-                            recognition_data = recognition_response.json()
-                            # Extract detected food name from Clarifai response
-                            if 'outputs' in recognition_data and len(recognition_data['outputs']) > 0:
-                                concepts = recognition_data['outputs'][0].get('data', {}).get('concepts', [])
-                                if concepts and len(concepts) > 0:
-                                    food_name = concepts[0].get('name', '')
+                    # Convert base64 to clean format
+                    if ',' in image_data:
+                        image_data_clean = image_data.split(',')[1]
+                    else:
+                        image_data_clean = image_data
+
+                    image = base64.b64decode(image_data_clean)
+                    match = recognizer.recognize(request.user, image)
+                    if match and match['confident']:
+                        food_name = match['food_name']
+                        recognized_by = 'local'
+
+                    if not food_name:
+                        mime_type = image_data.split(';')[0][5:] if image_data.startswith('data:') else 'image/jpeg'
+                        food_name, recognized_by = providers.recognize(image, mime_type)
+
+                    record_recognition(recognized_by or 'none')
 
                     # If still no food name, ask user to enter manually
                     if not food_name:
-                        return JsonResponse({
+                        return ApiResponse({
                             'success': False,
-                            'error': 'Could not detect food from image. Please enter the food name manually or add CLARIFAI_API_KEY to Secrets.'
+                            'error': 'Could not detect food from image. Please enter the food name manually or add OPENAI_API_KEY, GEMINI_API_KEY or CLARIFAI_API_KEY to Secrets.'
                         })
 
-                except Exception as e:
-                    print(f"Food recognition error: {str(e)}")
-                    return JsonResponse({
+                except Exception:
+                    logger.warning('Food recognition failed', exc_info=True)
+                    return ApiResponse({
                         'success': False,
                         'error': 'Could not detect food from image. Please enter the food name manually.'
                     })
 
             # Validate input - food name is required for nutrition lookup
             if not food_name:
-                return JsonResponse({
+                return ApiResponse({
                     'success': False,
                     'error': 'Please upload an image or enter the food name'
                 })
 
-            # Use Edamam Food Database API for nutrition data
-            edamam_app_id = os.environ.get('EDAMAM_APP_ID', '')
-            edamam_app_key = os.environ.get('EDAMAM_APP_KEY', '')
-
             nutrition_data = None
+            tier = 'fallback'
 
-            if edamam_app_id and edamam_app_key:
-                # Use Edamam Nutrition Analysis API
-                try:
-                    edamam_url = 'https://api.edamam.com/api/nutrition-details'
-                    params = {
-                        'app_id': edamam_app_id,
-                        'app_key': edamam_app_key
-                    }
-                    payload = {
-                        'title': food_name,
-                        'ingr': [f'1 serving of {food_name}']
-                    }
+            # Foods the user has logged before need no external lookup.
+            known = foods.lookup(request.user, food_name)
+            if known:
+                nutrition_data = {
+                    'food_name': known.food_name,
+                    'calories': known.calories,
+                    'protein': known.protein,
+                    'carbs': known.carbs,
+                    'fats': known.fats,
+                    'fiber': known.fiber,
+                    'serving_size': known.serving_size,
+                    'health_tips': f'Same values as the last {known.times_logged} time{"s" if known.times_logged != 1 else ""} you logged it.'
+                }
+                tier = 'recent_food'
 
-                    response = requests.post(edamam_url, params=params, json=payload, timeout=10)
-
-                    if response.status_code == 200:
-                        api_data = response.json()
-                        total_nutrients = api_data.get('totalNutrients', {})
-
-                        nutrition_data = {
-                            'food_name': food_name.title(),
-                            'calories': round(api_data.get('calories', 0), 1),
-                            'protein': round(total_nutrients.get('PROCNT', {}).get('quantity', 0), 1),
-                            'carbs': round(total_nutrients.get('CHOCDF', {}).get('quantity', 0), 1),
-                            'fats': round(total_nutrients.get('FAT', {}).get('quantity', 0), 1),
-                            'fiber': round(total_nutrients.get('FIBTG', {}).get('quantity', 0), 1),
-                            'serving_size': '1 serving',
-                            'health_tips': f'This meal contains {round(total_nutrients.get("SUGAR", {}).get("quantity", 0), 1)}g of sugar.'
-                        }
-                except Exception as e:
-                    print(f"Edamam API error: {str(e)}")
-
-            # Fallback to API Ninjas if Edamam not configured or failed
             if not nutrition_data:
+                # Provider answers are shared by every user; concurrent
+                # lookups of one food make a single round of calls.
+                fetched = []
                 try:
-                    api_url = f'https://api.api-ninjas.com/v1/nutrition?query={food_name}'
-                    api_key = os.environ.get('NUTRITION_API_KEY', '')
-
-                    headers = {'X-Api-Key': api_key} if api_key else {}
-                    response = requests.get(api_url, headers=headers, timeout=10)
-
-                    if response.status_code == 200:
-                        api_data = response.json()
-                        if api_data and len(api_data) > 0:
-                            item = api_data[0]
-                            nutrition_data = {
-                                'food_name': item.get('name', food_name).title(),
-                                'calories': round(item.get('calories', 0), 1),
-                                'protein': round(item.get('protein_g', 0), 1),
-                                'carbs': round(item.get('carbohydrates_total_g', 0), 1),
-                                'fats': round(item.get('fat_total_g', 0), 1),
-                                'fiber': round(item.get('fiber_g', 0), 1),
-                                'serving_size': f"{item.get('serving_size_g', 100)}g",
-                                'health_tips': f'Contains {round(item.get("sugar_g", 0), 1)}g of sugar.'
-                            }
-                except Exception as e:
-                    print(f"API Ninjas error: {str(e)}")
+                    found = cache.get_or_set(
+                        f'nutrition:{hashlib.sha1(foods.name_key(food_name).encode()).hexdigest()}',
+                        lambda: fetched.append(True) or _fetch_nutrition(food_name),
+                    )
+                except NutritionUnavailable:
+                    found = None
+                if found:
+                    nutrition_data = dict(found['data'])
+                    tier = found['tier'] if fetched else 'cache'
 
             # Final fallback with estimated values
             if not nutrition_data:
@@ -295,10 +358,14 @@ def analyze_food(request):
                     'health_tips': 'Nutrition data unavailable. Values shown are estimates. Consider adding API keys to Secrets.'
                 }
 
+            record_tier(tier)
+            if recognized_by:
+                nutrition_data['recognized_by'] = recognized_by
+
             # Save meal if requested
             save_meal = request.POST.get('save_meal', 'false') == 'true'
             if save_meal:
-                meal = MealLog.objects.create(
+                meal = write_buffer.save(MealLog(
                     user=request.user,
                     meal_type=meal_type,
                     food_name=nutrition_data.get('food_name', food_name),
@@ -308,7 +375,7 @@ def analyze_food(request):
                     fats=float(nutrition_data.get('fats', 0)),
                     fiber=float(nutrition_data.get('fiber', 0)),
                     serving_size=nutrition_data.get('serving_size', '1 serving')
-                )
+                ))
 
                 # Save image if provided
                 if image_data and ',' in image_data:
@@ -317,75 +384,78 @@ def analyze_food(request):
                         ext = format.split('/')[-1]
                         img_data = ContentFile(base64.b64decode(imgstr), name=f'food_{meal.id}.{ext}')
                         meal.food_image.save(f'food_{meal.id}.{ext}', img_data, save=True)
-                    except Exception as img_error:
-                        print(f"Image save error: {img_error}")
+                    except Exception:
+                        logger.warning('Could not save the photo for meal %s', meal.id, exc_info=True)
 
                 nutrition_data['saved'] = True
                 nutrition_data['meal_id'] = meal.id
 
-            return JsonResponse({'success': True, 'data': nutrition_data})
+            return ApiResponse({'success': True, 'data': nutrition_data})
 
         except Exception as e:
-            import traceback
-            print(f"Error in analyze_food: {str(e)}")
-            print(traceback.format_exc())
-            return JsonResponse({
+            logger.exception('analyze_food failed')
+            return ApiResponse({
                 'success': False,
                 'error': f'An error occurred: {str(e)}'
             })
 
-    return JsonResponse({'success': False, 'error': 'Invalid request method'})
+    return ApiResponse({'success': False, 'error': 'Invalid request method'})
 
 @login_required
 def diet_plan(request):
     profile, created = UserProfile.objects.get_or_create(user=request.user)
 
     today = datetime.now().date()
-    today_meals = MealLog.objects.filter(user=request.user, date=today).order_by('logged_at')
 
-    today_totals = today_meals.aggregate(
-        calories=Sum('calories'),
-        protein=Sum('protein'),
-        carbs=Sum('carbs'),
-        fats=Sum('fats')
-    )
+    def build():
+        today_meals = list(MealLog.objects.filter(user=request.user, date=today).order_by('logged_at'))
 
-    last_7_days = []
-    for i in range(6, -1, -1):
-        date = today - timedelta(days=i)
-        meals = MealLog.objects.filter(user=request.user, date=date)
-        totals = meals.aggregate(
+        today_totals = MealLog.objects.filter(user=request.user, date=today).aggregate(
             calories=Sum('calories'),
             protein=Sum('protein'),
             carbs=Sum('carbs'),
             fats=Sum('fats')
         )
-        last_7_days.append({
-            'date': date,
-            'day': date.strftime('%a'),
-            'calories': round(totals['calories'] or 0, 1),
-            'protein': round(totals['protein'] or 0, 1),
-            'carbs': round(totals['carbs'] or 0, 1),
-            'fats': round(totals['fats'] or 0, 1),
-        })
 
-    context = {
+        week_totals = daily_totals(request.user, today - timedelta(days=6), today)
+        last_7_days = []
+        for i in range(6, -1, -1):
+            date = today - timedelta(days=i)
+            totals = week_totals[date]
+            last_7_days.append({
+                'date': date,
+                'day': date.strftime('%a'),
+                'calories': round(totals['calories'], 1),
+                'protein': round(totals['protein'], 1),
+                'carbs': round(totals['carbs'], 1),
+                'fats': round(totals['fats'], 1),
+            })
+
+        return {
+            'today_meals': today_meals,
+            'today_totals': {
+                'calories': round(today_totals['calories'] or 0, 1),
+                'protein': round(today_totals['protein'] or 0, 1),
+                'carbs': round(today_totals['carbs'] or 0, 1),
+                'fats': round(today_totals['fats'] or 0, 1),
+            },
+            'last_7_days': last_7_days,
+            'adherence': latest_adherence(request.user),
+        }
+
+    context = cached_user_data(profile, 'diet_plan', build, today).copy()
+    context.update({
         'profile': profile,
-        'today_meals': today_meals,
-        'today_totals': {
-            'calories': round(today_totals['calories'] or 0, 1),
-            'protein': round(today_totals['protein'] or 0, 1),
-            'carbs': round(today_totals['carbs'] or 0, 1),
-            'fats': round(today_totals['fats'] or 0, 1),
-        },
-        'last_7_days': last_7_days,
-    }
+        'today': today,
+        'frequent_foods': foods.top_foods(request.user),
+        'cache_timeout': DASHBOARD_CACHE_TIMEOUT,
+    })
     return render(request, 'core/diet_plan.html', context)
 
 @login_required
 def log_meal(request):
     if request.method == 'POST':
-        MealLog.objects.create(
+        write_buffer.save(MealLog(
             user=request.user,
             meal_type=request.POST.get('meal_type', 'snack'),
             food_name=request.POST.get('food_name'),
@@ -396,10 +466,44 @@ def log_meal(request):
             fiber=float(request.POST.get('fiber', 0)),
             serving_size=request.POST.get('serving_size', '1 serving'),
             notes=request.POST.get('notes', '')
-        )
+        ))
         messages.success(request, 'Meal logged successfully!')
     return redirect('diet_plan')
 
+@login_required
+def quick_add(request, food_id):
+    food = get_object_or_404(FrequentFood, id=food_id, user=request.user)
+    if request.method != 'POST':
+        return redirect('diet_plan')
+    meal_type = request.POST.get('meal_type') or food.meal_type
+    if meal_type not in dict(MealLog.MEAL_TYPES):
+        meal_type = food.meal_type
+    meal = write_buffer.save(MealLog(
+        user=request.user,
+        meal_type=meal_type,
+        food_name=food.food_name,
+        calories=food.calories,
+        protein=food.protein,
+        carbs=food.carbs,
+        fats=food.fats,
+        fiber=food.fiber,
+        serving_size=food.serving_size,
+    ))
+    if 'application/json' in request.headers.get('Accept', ''):
+        return ApiResponse({'success': True, 'meal_id': meal.id, 'food_name': meal.food_name})
+    messages.success(request, f'{food.food_name} logged!')
+    return redirect('diet_plan')
+
+@login_required
+def get_frequent_foods(request):
+    limit = _int_param(request, 'limit', 8, 1, 50)
+    return ApiResponse({'results': list(
+        FrequentFood.objects.filter(user=request.user).order_by('-rank').values(
+            'id', 'food_name', 'meal_type', 'calories', 'protein', 'carbs', 'fats', 'fiber',
+            'serving_size', 'times_logged', 'last_logged_at',
+        )[:limit]
+    )})
+
 @login_required
 def delete_meal(request, meal_id):
     meal = get_object_or_404(MealLog, id=meal_id, user=request.user)
@@ -459,6 +563,19 @@ def settings_view(request):
 
     return render(request, 'core/settings.html', {'profile': profile})
 
+@login_required
+def delete_account(request):
+    if request.method != 'POST':
+        return redirect('settings')
+    if not request.user.check_password(request.POST.get('password', '')):
+        messages.error(request, 'Incorrect password. Your account was not deleted.')
+        return redirect('settings')
+    # Disabled now; purge_accounts removes the data in the background.
+    request_deletion(request.user)
+    logout(request)
+    messages.info(request, 'Your account has been deleted. Your data will be removed shortly.')
+    return redirect('landing')
+
 @login_required
 def log_weight(request):
     if request.method == 'POST':
@@ -470,10 +587,10 @@ def log_weight(request):
         else:
             date = datetime.now().date()
 
-        WeightLog.objects.update_or_create(
-            user=request.user,
-            date=date,
-            defaults={'weight': weight}
+        write_buffer.save(
+            WeightLog(user=request.user, date=date, weight=weight),
+            unique_fields=['user', 'date'],
+            update_fields=['weight'],
         )
 
         profile = request.user.profile
@@ -485,6 +602,29 @@ def log_weight(request):
     return redirect('progress')
 
 @login_required
+def import_weights(request):
+    """Bulk-import weight readings from a smart-scale CSV/JSON export.
+
+    Takes a multipart `file` upload or the export as the raw request body.
+    """
+    if request.method != 'POST':
+        return ApiResponse({'error': 'POST a CSV or JSON export.'}, status=405)
+    upload = request.FILES.get('file')
+    if upload is not None:
+        stream, fmt = upload, weights.guess_format(upload.name, upload.content_type or '')
+    elif request.content_type == 'multipart/form-data':
+        # Parsing the form consumed the body; there is nothing left to read.
+        return ApiResponse({'error': 'Upload the export as the "file" field.'}, status=400)
+    else:
+        stream, fmt = request, weights.guess_format(content_type=request.content_type or '')
+    try:
+        records = weights.read_records(stream, request.GET.get('format', fmt))
+    except weights.InvalidImport as e:
+        return ApiResponse({'error': str(e)}, status=400)
+    return ApiResponse(weights.import_weights(request.user, records))
+
+@login_required
+@condition(etag_func=user_data_etag, last_modified_func=user_data_last_modified)
 def get_nutrition_data(request):
     today = datetime.now().date()
     meals = MealLog.objects.filter(user=request.user, date=today)
@@ -496,7 +636,7 @@ def get_nutrition_data(request):
         fats=Sum('fats')
     )
 
-    return JsonResponse({
+    return ApiResponse({
         'calories': round(totals['calories'] or 0, 1),
         'protein': round(totals['protein'] or 0, 1),
         'carbs': round(totals['carbs'] or 0, 1),
@@ -504,17 +644,97 @@ def get_nutrition_data(request):
     })
 
 @login_required
+@condition(etag_func=user_data_etag, last_modified_func=user_data_last_modified)
+def get_dashboard(request):
+    today = datetime.now().date()
+    profile, created = UserProfile.objects.get_or_create(user=request.user)
+    return ApiResponse(
+        cached_user_data(profile, 'dashboard', lambda: build_bundle(request.user, profile, today), today))
+
+@login_required
+@condition(etag_func=user_data_etag, last_modified_func=user_data_last_modified)
 def get_progress_data(request):
     today = datetime.now().date()
+    totals = daily_totals(request.user, today - timedelta(days=6), today)
     data = []
 
     for i in range(6, -1, -1):
         date = today - timedelta(days=i)
-        meals = MealLog.objects.filter(user=request.user, date=date)
-        calories = meals.aggregate(total=Sum('calories'))['total'] or 0
         data.append({
             'date': date.strftime('%a'),
-            'calories': round(calories, 1)
+            'calories': round(totals[date]['calories'], 1)
         })
 
-    return JsonResponse({'data': data})
\ No newline at end of file
+    return ApiResponse({'data': data})
+
+@login_required
+def meal_history(request):
+    try:
+        filters = history.parse_filters(request.GET)
+        meals, next_cursor = history.meal_page(request.user, filters, request.GET.get('cursor'))
+    except history.InvalidQuery as e:
+        messages.error(request, str(e))
+        filters, (meals, next_cursor) = {}, history.meal_page(request.user, {})
+
+    next_query = None
+    if next_cursor:
+        params = request.GET.copy()
+        params['cursor'] = next_cursor
+        next_query = params.urlencode()
+
+    return render(request, 'core/meal_history.html', {
+        'meals': meals,
+        'next_query': next_query,
+        'meal_types': MealLog.MEAL_TYPES,
+        'params': request.GET,
+    })
+
+@login_required
+@condition(etag_func=user_data_etag, last_modified_func=user_data_last_modified)
+def get_meal_history(request):
+    try:
+        filters = history.parse_filters(request.GET)
+        meals, next_cursor = history.meal_page(
+            request.user, filters, request.GET.get('cursor'),
+            limit=_int_param(request, 'limit', history.DEFAULT_LIMIT, 1, history.MAX_LIMIT),
+            fields=history.API_FIELDS,
+        )
+    except history.InvalidQuery as e:
+        return ApiResponse({'error': str(e)}, status=400)
+    return ApiResponse({'results': meals, 'next_cursor': next_cursor})
+
+@login_required
+def get_sync(request):
+    # The token already says what the client has, so no ETag round trip.
+    # 'token' is the parameter's original name and still accepted.
+    try:
+        seq = sync.decode_token(request.GET.get('since', request.GET.get('token', '')))
+    except sync.InvalidToken as e:
+        return ApiResponse({'error': str(e)}, status=400)
+    changes, token, has_more = sync.changes_since(
+        request.user, seq, limit=_int_param(request, 'limit', sync.DEFAULT_LIMIT, 1, sync.MAX_LIMIT))
+    return ApiResponse({'changes': changes, 'token': token, 'has_more': has_more})
+
+def _int_param(request, name, default, low, high):
+    try:
+        value = int(request.GET.get(name, default))
+    except ValueError:
+        return default
+    return max(low, min(high, value))
+
+@login_required
+@condition(etag_func=user_data_etag, last_modified_func=user_data_last_modified)
+def get_weight_trend(request):
+    profile, created = UserProfile.objects.get_or_create(user=request.user)
+    entries = list(WeightLog.objects.filter(user=request.user).order_by('date').values_list('date', 'weight'))
+    return ApiResponse(trends.weight_trend(
+        entries,
+        target_weight=profile.target_weight,
+        window_days=_int_param(request, 'window', trends.DEFAULT_WINDOW_DAYS, 1, 365),
+        slope_days=_int_param(request, 'slope_days', trends.DEFAULT_SLOPE_DAYS, 7, 3650),
+        chart_points=_int_param(request, 'points', trends.DEFAULT_CHART_POINTS, 3, 2000),
+    ))
+
+@staff_member_required
+def provider_stats(request):
+    return ApiResponse(provider_summary())
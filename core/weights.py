@@ -0,0 +1,185 @@
+"""Bulk weight import from smart-scale exports.
+
+Rows are streamed from CSV, a JSON array or JSON Lines and written with
+one upsert per batch, so years of daily readings cost a few dozen
+statements instead of one update_or_create each. A day with several
+readings keeps the latest one; the profile weight is set once at the end.
+"""
+import codecs
+import csv
+import json
+from datetime import date, datetime
+
+from django.db import transaction
+
+from .models import WeightLog
+from .sync import record_instances
+
+BATCH_SIZE = 500
+MAX_ERRORS = 20
+MIN_WEIGHT_KG = 20
+MAX_WEIGHT_KG = 500
+LB_TO_KG = 0.45359237
+READ_CHUNK = 64 * 1024
+
+# Column (or JSON key) names seen in scale exports -> kilograms per unit.
+WEIGHT_COLUMNS = {
+    'weight': 1.0, 'weight_kg': 1.0, 'weight (kg)': 1.0, 'weight(kg)': 1.0,
+    'weight_lb': LB_TO_KG, 'weight (lb)': LB_TO_KG, 'weight (lbs)': LB_TO_KG, 'weight(lb)': LB_TO_KG,
+}
+DATE_COLUMNS = ('date', 'timestamp', 'datetime', 'time', 'measured_at')
+NOTES_COLUMNS = ('notes', 'note', 'comments')
+FORMATS = ('csv', 'json')
+
+
+class InvalidImport(ValueError):
+    pass
+
+
+def parse_when(value):
+    """A date, or a datetime when the value carries a time of day."""
+    value = str(value).strip()
+    if not value:
+        raise ValueError('missing date')
+    if value.isdigit():
+        # Unix timestamps, in seconds or milliseconds.
+        seconds = int(value)
+        try:
+            return datetime.fromtimestamp(seconds / 1000 if seconds > 10 ** 11 else seconds)
+        except (OverflowError, OSError):
+            raise ValueError(f'timestamp {value} out of range')
+    value = value.replace('Z', '+00:00')
+    if len(value) == 10:
+        return date.fromisoformat(value)
+    return datetime.fromisoformat(value)
+
+
+def normalize(record):
+    """(when, weight in kg, notes) from one CSV row or JSON object."""
+    fields = {str(key).strip().lower(): value for key, value in record.items() if key is not None}
+    when = next((fields[name] for name in DATE_COLUMNS if fields.get(name) not in (None, '')), None)
+    if when is None:
+        raise ValueError('missing date')
+    for name, factor in WEIGHT_COLUMNS.items():
+        if fields.get(name) not in (None, ''):
+            weight = round(float(fields[name]) * factor, 2)
+            break
+    else:
+        raise ValueError('missing weight')
+    if not MIN_WEIGHT_KG <= weight <= MAX_WEIGHT_KG:
+        raise ValueError(f'weight {weight} kg out of range')
+    notes = next((str(fields[name]) for name in NOTES_COLUMNS if fields.get(name)), '')
+    return parse_when(when), weight, notes
+
+
+def iter_csv(stream):
+    yield from csv.DictReader(stream)
+
+
+def iter_json(stream):
+    """Objects from a JSON array or JSON Lines, decoded chunk by chunk."""
+    decoder = json.JSONDecoder()
+    buffer, pos, in_array, eof = '', 0, None, False
+    while True:
+        # Skip whitespace and the array's punctuation between objects.
+        while pos < len(buffer) and (buffer[pos].isspace() or (in_array and buffer[pos] in ',]')):
+            pos += 1
+        if pos < len(buffer) and in_array is None:
+            in_array = buffer[pos] == '['
+            pos += in_array
+            continue
+        if pos < len(buffer):
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                yield record
+                pos = end
+                continue
+        if eof:
+            return
+        chunk = stream.read(READ_CHUNK)
+        eof = not chunk
+        buffer, pos = buffer[pos:] + chunk, 0
+
+
+def read_records(stream, fmt):
+    """Records from a binary stream in the given format ('csv' or 'json')."""
+    if fmt not in FORMATS:
+        raise InvalidImport(f'Unsupported format {fmt!r}; use csv or json.')
+    text = codecs.getreader('utf-8-sig')(stream)
+    return iter_csv(text) if fmt == 'csv' else iter_json(text)
+
+
+def guess_format(name='', content_type=''):
+    if name.lower().endswith(('.json', '.jsonl', '.ndjson')) or 'json' in content_type:
+        return 'json'
+    return 'csv'
+
+
+def _flush(user, batch):
+    readings = [WeightLog(user=user, date=day, weight=weight, notes=notes) for day, (weight, notes) in batch.items()]
+    with transaction.atomic():
+        WeightLog.objects.bulk_create(
+            readings, update_conflicts=True, unique_fields=['user', 'date'], update_fields=['weight', 'notes'])
+        # bulk_create skips post_save; keep delta sync clients in step.
+        record_instances(readings)
+
+
+def import_weights(user, records, batch_size=BATCH_SIZE):
+    """Upsert readings for user, one statement per batch; returns a summary dict.
+
+    Rows are deduplicated by day (unique_together on user and date): the
+    reading with the latest time wins, and the later row for equal times.
+    Invalid rows are skipped and reported by row number; a file that stops
+    parsing keeps the batches already written.
+    """
+    latest = {}
+    batch = {}
+    summary = {'rows': 0, 'imported': 0, 'skipped': 0, 'errors': [], 'complete': True}
+
+    records = iter(records)
+    while True:
+        number = summary['rows'] + 1
+        try:
+            record = next(records)
+        except StopIteration:
+            break
+        except (csv.Error, UnicodeDecodeError, json.JSONDecodeError) as exc:
+            summary['complete'] = False
+            summary['errors'].append(f'Stopped at row {number}: {exc}')
+            break
+        summary['rows'] = number
+        try:
+            if not isinstance(record, dict):
+                raise ValueError('not an object')
+            when, weight, notes = normalize(record)
+        except (TypeError, ValueError) as exc:
+            summary['skipped'] += 1
+            if len(summary['errors']) < MAX_ERRORS:
+                summary['errors'].append(f'Row {number}: {exc}')
+            continue
+
+        day = when.date() if isinstance(when, datetime) else when
+        # A timed reading beats an undated one on the same day.
+        order = (when.time().isoformat() if isinstance(when, datetime) else '', number)
+        if day in latest and latest[day] > order:
+            continue
+        latest[day] = order
+        batch[day] = (weight, notes)
+        if len(batch) >= batch_size:
+            _flush(user, batch)
+            batch = {}
+    if batch:
+        _flush(user, batch)
+
+    summary['imported'] = len(latest)
+    if latest:
+        profile = user.profile
+        # The newest reading overall, which an older export must not override.
+        profile.weight = WeightLog.objects.filter(user=user).order_by('-date').values_list('weight', flat=True).first()
+        # One save: its post_save bumps the data version for the whole import.
+        profile.save(update_fields=['weight'])
+    return summary
@@ -0,0 +1,201 @@
+"""Opt-in group commit for high-frequency MealLog/WeightLog inserts.
+
+With WRITE_COALESCING enabled, request threads hand their unsaved instance
+to a per-process flusher thread and block. The flusher gathers writes for up
+to WRITE_COALESCING_MAX_DELAY_MS (or WRITE_COALESCING_MAX_BATCH rows) and
+commits them with bulk_create in a single transaction, so a burst of meal
+logs takes the SQLite write lock once instead of once per row.
+
+Durability: save() returns only after the batch holding the instance has
+committed, so every id handed back to a client is already on disk. A crash
+can lose only writes whose requests have not returned yet. Remaining writes
+are flushed when the process exits normally.
+
+bulk_create does not send post_save, so the flusher bumps the affected
+users' data versions and updates the frequent-foods index and the sync
+change feed itself, inside the same transaction.
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .caching import bump_data_versions
+from .foods import record_meals
+from .models import MealLog
+from .sync import KIND_BY_MODEL, record_instances
+
+_STOP = object()
+
+
+class PendingWrite:
+    __slots__ = ('instance', 'unique_fields', 'update_fields', 'done', 'error')
+
+    def __init__(self, instance, unique_fields, update_fields):
+        self.instance = instance
+        self.unique_fields = tuple(unique_fields or ())
+        self.update_fields = tuple(update_fields or ())
+        self.done = threading.Event()
+        self.error = None
+
+
+def _unique_key(instance, unique_fields):
+    opts = instance._meta
+    return tuple(getattr(instance, opts.get_field(name).attname) for name in unique_fields)
+
+
+def save_now(instance, unique_fields=None, update_fields=None):
+    """Save one instance the ordinary way; an upsert when unique_fields is given."""
+    if unique_fields:
+        model = type(instance)
+        obj, created = model.objects.update_or_create(
+            **{name: getattr(instance, name) for name in unique_fields},
+            defaults={name: getattr(instance, name) for name in update_fields or ()},
+        )
+        instance.pk = obj.pk
+        instance._state.adding = False
+    else:
+        instance.save()
+    return instance
+
+
+class WriteBuffer:
+    def __init__(self, max_delay=0.005, max_batch=100, timeout=30):
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return getattr(settings, 'WRITE_COALESCING', False)
+
+    def save(self, instance, unique_fields=None, update_fields=None):
+        """Persist instance and return it with its primary key set."""
+        # Writes inside the caller's transaction must stay inside it.
+        if not self.enabled or connection.in_atomic_block:
+            return save_now(instance, unique_fields, update_fields)
+        pending = PendingWrite(instance, unique_fields, update_fields)
+        self._ensure_started().put(pending)
+        if not pending.done.wait(self.timeout):
+            raise TimeoutError('write buffer did not commit in time')
+        if pending.error is not None:
+            raise pending.error
+        return instance
+
+    def _ensure_started(self):
+        with self._lock:
+            # A forked worker inherits the parent's queue but not its thread.
+            if self._pid != os.getpid() or self._thread is None or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(target=self._run, name='write-buffer', daemon=True)
+                self._thread.start()
+            return self._queue
+
+    def close(self):
+        """Flush everything queued so far and stop the flusher thread."""
+        with self._lock:
+            thread, q = self._thread, self._queue
+            self._thread = None
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            q.put(_STOP)
+            thread.join(self.timeout)
+
+    def _run(self):
+        q = self._queue
+        try:
+            stopping = False
+            while not stopping:
+                first = q.get()
+                if first is _STOP:
+                    break
+                batch = [first]
+                deadline = time.monotonic() + self.max_delay
+                while len(batch) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = q.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+                self._commit(batch)
+        finally:
+            connection.close()
+
+    def _commit(self, batch):
+        try:
+            try:
+                with transaction.atomic():
+                    self._bulk_write(batch)
+            except Exception:
+                # One bad row must not fail its neighbours: retry one by one
+                # so only the offending request sees the error. save() sends
+                # post_save, which bumps the data version and records sync.
+                for pending in batch:
+                    pending.instance.pk = None
+                    pending.instance._state.adding = True
+                    try:
+                        with transaction.atomic():
+                            save_now(pending.instance, pending.unique_fields, pending.update_fields)
+                    except Exception as exc:
+                        pending.error = exc
+        finally:
+            for pending in batch:
+                pending.done.set()
+
+    def _bulk_write(self, batch):
+        groups = OrderedDict()
+        for pending in batch:
+            key = (type(pending.instance), pending.unique_fields, pending.update_fields)
+            groups.setdefault(key, []).append(pending)
+
+        for (model, unique_fields, update_fields), items in groups.items():
+            if unique_fields:
+                # The last write for a key wins; earlier duplicates share its row.
+                latest = OrderedDict()
+                for pending in items:
+                    latest[_unique_key(pending.instance, unique_fields)] = pending
+                winners = list(latest.values())
+                model.objects.bulk_create(
+                    [p.instance for p in winners],
+                    update_conflicts=True,
+                    unique_fields=unique_fields,
+                    update_fields=update_fields,
+                )
+                by_key = {k: p.instance.pk for k, p in latest.items()}
+                for pending in items:
+                    pending.instance.pk = by_key[_unique_key(pending.instance, unique_fields)]
+                    pending.instance._state.adding = False
+                if model in KIND_BY_MODEL:
+                    record_instances([p.instance for p in winners])
+            else:
+                model.objects.bulk_create([p.instance for p in items])
+                for pending in items:
+                    pending.instance._state.adding = False
+                if model is MealLog:
+                    record_meals([p.instance for p in items])
+                if model in KIND_BY_MODEL:
+                    record_instances([p.instance for p in items])
+
+        bump_data_versions({pending.instance.user_id for pending in batch})
+
+
+write_buffer = WriteBuffer(
+    max_delay=getattr(settings, 'WRITE_COALESCING_MAX_DELAY_MS', 5) / 1000,
+    max_batch=getattr(settings, 'WRITE_COALESCING_MAX_BATCH', 100),
+)
+atexit.register(write_buffer.close)
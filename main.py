@@ -1,8 +1,111 @@
+import multiprocessing
 import os
 import sys
 
+
+def workers_from_env():
+    return int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+
+
+def threads_from_env():
+    return int(os.environ.get('WEB_THREADS', 4))
+
+
+def post_fork(server, worker):
+    # Connection pools must not be shared across processes, and the first
+    # photo should not wait for the clients to be built.
+    from core import providers
+    from core.metrics import registry
+
+    providers.warm()
+    registry.start_flushing()
+
+
+def worker_exit(server, worker):
+    # Keep the last second of this worker's counters in the totals.
+    from core.metrics import registry
+
+    registry.write()
+
+
+def gunicorn_options(bind):
+    return {
+        'bind': bind,
+        'workers': workers_from_env(),
+        'threads': threads_from_env(),
+        'worker_class': 'gthread',
+        'preload_app': True,
+        'timeout': int(os.environ.get('WORKER_TIMEOUT', 60)),
+        'graceful_timeout': int(os.environ.get('GRACEFUL_TIMEOUT', 30)),
+        'keepalive': 5,
+        # Recycle workers now and then so slow leaks cannot accumulate.
+        'max_requests': int(os.environ.get('MAX_REQUESTS', 2000)),
+        'max_requests_jitter': 200,
+        'accesslog': '-',
+        'post_fork': post_fork,
+        'worker_exit': worker_exit,
+    }
+
+
+def collect_static():
+    """The build step: minify, hash and precompress static files into STATIC_ROOT."""
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command('collectstatic', interactive=False, verbosity=1)
+
+
+def run_production(bind):
+    """Serve with pre-forking gunicorn workers.
+
+    The Django app is loaded once in the master (preload_app) and forked, so
+    workers start instantly and share imported code copy-on-write. SIGHUP
+    replaces workers gracefully; SIGTERM lets in-flight requests finish
+    within GRACEFUL_TIMEOUT seconds. Each worker builds its recognition
+    provider clients right after the fork. Metrics files of the previous run
+    are cleared before any worker starts.
+
+    Static files are collected by the build step (`main.py --collectstatic`),
+    not here: several instances starting at once would race on STATIC_ROOT.
+    COLLECTSTATIC_ON_START=1 collects them first anyway, for single-instance
+    setups without a build step.
+    """
+    from gunicorn.app.base import BaseApplication
+
+    import django
+    django.setup()
+    from core.metrics import clear_dir
+    clear_dir()
+    if os.environ.get('COLLECTSTATIC_ON_START') == '1':
+        from django.core.management import call_command
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    from django.core.wsgi import get_wsgi_application
+
+    class VitalTrackServer(BaseApplication):
+        def __init__(self, app, options):
+            self.application = app
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+    VitalTrackServer(get_wsgi_application(), gunicorn_options(bind)).run()
+
+
 def main():
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vitaltrack.settings')
+    collect = '--collectstatic' in sys.argv
+    production = collect or '--production' in sys.argv or os.environ.get('VITALTRACK_ENV') == 'production'
+    os.environ.setdefault(
+        'DJANGO_SETTINGS_MODULE',
+        'vitaltrack.settings_production' if production else 'vitaltrack.settings'
+    )
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
@@ -11,7 +114,12 @@ def main():
             "available on your PYTHONPATH environment variable? Did you "
             "forget to activate a virtual environment?"
         ) from exc
-    execute_from_command_line(['manage.py', 'runserver', '0.0.0.0:5000'])
+    if collect:
+        collect_static()
+    elif production:
+        run_production(os.environ.get('BIND', '0.0.0.0:5000'))
+    else:
+        execute_from_command_line(['manage.py', 'runserver', '0.0.0.0:5000'])
 
 
 if __name__ == "__main__":
@@ -22,6 +22,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.StaticFilesMiddleware',
+    'core.middleware.RequestMetricsMiddleware',
+    'core.middleware.ApiResponseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -50,6 +53,12 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'vitaltrack.wsgi.application'
 
+# SQLite performance profile: WAL journaling, a busy timeout instead of
+# instant "database is locked" errors, IMMEDIATE write transactions and
+# persistent, health-checked connections. SQLITE_PERFORMANCE_PROFILE=0
+# restores Django's defaults (see `manage.py bench_sqlite`).
+SQLITE_PERFORMANCE_PROFILE = os.environ.get('SQLITE_PERFORMANCE_PROFILE', '1') != '0'
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
@@ -57,6 +66,142 @@ DATABASES = {
     }
 }
 
+SQLITE_PERFORMANCE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'cache_size': -20000,
+    'mmap_size': 134217728,
+    'temp_store': 'MEMORY',
+}
+SQLITE_PRAGMAS = {}
+
+if SQLITE_PERFORMANCE_PROFILE:
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+        },
+    })
+    # Applied to each new connection by core.db.configure_sqlite.
+    SQLITE_PRAGMAS = SQLITE_PERFORMANCE_PRAGMAS
+
+# Requests slower than this are logged to vitaltrack.slow_requests with
+# their SQL; METRICS_TOKEN, when set, guards /metrics with a bearer token.
+# With METRICS_DIR set, /metrics sums the counters of every worker process
+# (core.metrics); without it, it reports only the worker that answers.
+SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 1000)) or None
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+
+# API responses (core.api.ApiResponse) at least this big are brotli- or
+# gzip-compressed per request by core.middleware.ApiResponseMiddleware.
+API_COMPRESS_MIN_BYTES = 1024
+API_GZIP_LEVEL = 6
+API_BROTLI_QUALITY = 4
+
+# Opt-in group commit of MealLog/WeightLog writes (core.writebehind).
+WRITE_COALESCING = os.environ.get('WRITE_COALESCING', '0') == '1'
+WRITE_COALESCING_MAX_DELAY_MS = int(os.environ.get('WRITE_COALESCING_MAX_DELAY_MS', 5))
+WRITE_COALESCING_MAX_BATCH = int(os.environ.get('WRITE_COALESCING_MAX_BATCH', 100))
+
+# Two-tier cache (core.cache_backends): a per-process LRU in front of a
+# SQLite file shared by every worker on the host. Namespaces are the first
+# segment of a key; 'timeout' is how long an entry lives in the shared tier
+# and 'l1_timeout' how stale a worker's private copy may get. The test
+# runner moves the shared tier to a throwaway file.
+CACHE_L2_PATH = os.environ.get('CACHE_L2_PATH', str(BASE_DIR / 'cache.sqlite3'))
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'core.cache_backends.TieredCache',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'L2': 'shared',
+            'L1_MAX_ENTRIES': int(os.environ.get('CACHE_L1_MAX_ENTRIES', 2000)),
+            'L1_TIMEOUT': 60,
+            'NAMESPACES': {
+                # Per-user payloads and fragments carry data_version in their keys.
+                'vt': {'l1_timeout': 300},
+                'template': {'l1_timeout': 300},
+                'nutrition': {'timeout': 7 * 86400, 'l1_timeout': 3600},
+                'quiz': {'timeout': 3600, 'l1_timeout': 300},
+            },
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache_backends.SQLiteCache',
+        'LOCATION': CACHE_L2_PATH,
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
+}
+
+# Admission control (core.throttle) for views that block a worker on
+# external calls: a per-user token bucket plus per-user and global caps on
+# requests in flight, shared by all workers through ADMISSION_CACHE.
+# Requests over a limit get an immediate 429 with Retry-After.
+ADMISSION_CACHE = 'shared'
+ADMISSION_CONTROL = {
+    'analyze_food': {
+        'rate_per_minute': int(os.environ.get('ANALYZE_FOOD_RATE_PER_MINUTE', 12)),
+        'burst': int(os.environ.get('ANALYZE_FOOD_BURST', 4)),
+        'max_in_flight_per_user': int(os.environ.get('ANALYZE_FOOD_MAX_IN_FLIGHT_PER_USER', 1)),
+        'max_in_flight': int(os.environ.get('ANALYZE_FOOD_MAX_IN_FLIGHT', 8)),
+        # Longer than the slowest analyze_food (5 provider calls x 10s).
+        'lease_seconds': 60,
+    },
+}
+
+# analyze_food names photos from the user's own labeled meal photos
+# (core.recognizer) before calling RECOGNITION_PROVIDERS, when the nearest photo is at
+# least min_similarity alike and min_margin ahead of any other dish.
+LOCAL_RECOGNIZER = {
+    'min_similarity': float(os.environ.get('LOCAL_RECOGNIZER_MIN_SIMILARITY', 0.95)),
+    'min_margin': float(os.environ.get('LOCAL_RECOGNIZER_MIN_MARGIN', 0.02)),
+    'max_per_user': 2000,
+    'cached_users': 256,
+}
+
+# External photo recognition (core.providers), tried in this order after the
+# local recognizer. A provider without an API key is skipped. Costs are USD
+# list prices, used only for the vitaltrack_provider_cost_usd_total metric.
+RECOGNITION_PROVIDERS = {
+    'clarifai': {
+        'backend': 'core.providers.ClarifaiProvider',
+        'api_key': os.environ.get('CLARIFAI_API_KEY', ''),
+        'model': 'food-item-recognition',
+        'base_url': os.environ.get('CLARIFAI_BASE_URL') or None,
+        'timeout': float(os.environ.get('CLARIFAI_TIMEOUT', 10)),
+        'cost_per_call': 0.0012,
+    },
+    'openai': {
+        'backend': 'core.providers.OpenAIProvider',
+        'api_key': os.environ.get('OPENAI_API_KEY', ''),
+        'model': os.environ.get('OPENAI_VISION_MODEL', 'gpt-4o-mini'),
+        'base_url': os.environ.get('OPENAI_BASE_URL') or None,
+        'timeout': float(os.environ.get('OPENAI_TIMEOUT', 10)),
+        'input_cost_per_mtok': 0.15,
+        'output_cost_per_mtok': 0.60,
+    },
+    'gemini': {
+        'backend': 'core.providers.GeminiProvider',
+        'api_key': os.environ.get('GEMINI_API_KEY', ''),
+        'model': os.environ.get('GEMINI_VISION_MODEL', 'gemini-2.5-flash'),
+        'base_url': os.environ.get('GEMINI_BASE_URL') or None,
+        'timeout': float(os.environ.get('GEMINI_TIMEOUT', 10)),
+        'input_cost_per_mtok': 0.30,
+        'output_cost_per_mtok': 2.50,
+    },
+}
+
+# archive_meals moves whole months of meals older than this out of the hot
+# MealLog table into ArchivedMealLog plus per-user MealMonthlySummary rows.
+MEAL_ARCHIVE_AFTER_DAYS = int(os.environ.get('MEAL_ARCHIVE_AFTER_DAYS', 365))
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -71,10 +216,30 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# collectstatic minifies, content-hashes and precompresses (gzip, plus brotli
+# when installed) assets; core.middleware.StaticFilesMiddleware serves them.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+        else 'core.storage.CompressedManifestStaticFilesStorage',
+    },
+}
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Media is served only to the user whose rows reference it, by
+# core.media.serve_media, with resized food images for ?w=<width>.
+MEDIA_THUMBNAIL_ROOT = BASE_DIR / 'media_cache'
+MEDIA_THUMBNAIL_WIDTHS = (160, 320, 640)
+MEDIA_THUMBNAIL_CACHE_MAX_BYTES = 256 * 1024 * 1024
+MEDIA_THUMBNAIL_EVICT_INTERVAL = 300
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_URL = 'login'
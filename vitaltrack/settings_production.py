@@ -0,0 +1,42 @@
+"""Production settings: `VITALTRACK_ENV=production python main.py` selects these."""
+import os
+import tempfile
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import *  # noqa: F401,F403
+from .settings import METRICS_DIR, STORAGES, TEMPLATES
+
+DEBUG = False
+
+# Never fall back to the development key: sessions and password reset
+# tokens would be forgeable.
+SECRET_KEY = os.environ.get('SESSION_SECRET', '')
+if not SECRET_KEY:
+    raise ImproperlyConfigured('Set SESSION_SECRET before running with production settings.')
+
+# /metrics exposes request volumes and provider spend.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+if not METRICS_TOKEN:
+    raise ImproperlyConfigured('Set METRICS_TOKEN before running with production settings.')
+
+# gunicorn workers share one port; each writes its counters here so any
+# of them can answer a scrape with the totals of all of them.
+METRICS_DIR = METRICS_DIR or os.path.join(tempfile.gettempdir(), 'vitaltrack-metrics')
+
+ALLOWED_HOSTS = [h.strip() for h in os.environ.get('ALLOWED_HOSTS', '*').split(',') if h.strip()]
+
+STORAGES['staticfiles']['BACKEND'] = 'core.storage.CompressedManifestStaticFilesStorage'
+
+# Compile each template once per worker process instead of on every render.
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+
+SESSION_COOKIE_SECURE = os.environ.get('SECURE_COOKIES', '1') == '1'
+CSRF_COOKIE_SECURE = SESSION_COOKIE_SECURE
+SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')